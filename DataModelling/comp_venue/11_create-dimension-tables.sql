@@ -121,6 +121,19 @@ CREATE TABLE IF NOT EXISTS dim_non_comp_facs (
     is_current BOOLEAN NOT NULL
 );
 
+-- Point-in-time lookups: GiST indexes on each row's validity period, so "as of" queries
+-- (tsrange(...) @> timestamp) don't scan the whole history. GREATEST keeps a row expired in
+-- the instant it was created a valid (empty) range.
+CREATE INDEX IF NOT EXISTS idx_dim_regions_validity ON dim_regions USING gist (tsrange(valid_from, GREATEST(valid_from, valid_to), '[)'));
+CREATE INDEX IF NOT EXISTS idx_dim_zones_validity ON dim_zones USING gist (tsrange(valid_from, GREATEST(valid_from, valid_to), '[)'));
+CREATE INDEX IF NOT EXISTS idx_dim_clusters_validity ON dim_clusters USING gist (tsrange(valid_from, GREATEST(valid_from, valid_to), '[)'));
+CREATE INDEX IF NOT EXISTS idx_dim_status_validity ON dim_status USING gist (tsrange(valid_from, GREATEST(valid_from, valid_to), '[)'));
+CREATE INDEX IF NOT EXISTS idx_dim_venues_validity ON test.dim_venues USING gist (tsrange(valid_from, GREATEST(valid_from, valid_to), '[)'));
+CREATE INDEX IF NOT EXISTS idx_dim_subvenues_validity ON dim_subvenues USING gist (tsrange(valid_from, GREATEST(valid_from, valid_to), '[)'));
+CREATE INDEX IF NOT EXISTS idx_dim_sports_validity ON dim_sports USING gist (tsrange(valid_from, GREATEST(valid_from, valid_to), '[)'));
+CREATE INDEX IF NOT EXISTS idx_dim_calendar_validity ON dim_calendar USING gist (tsrange(valid_from, GREATEST(valid_from, valid_to), '[)'));
+CREATE INDEX IF NOT EXISTS idx_dim_non_comp_facs_validity ON dim_non_comp_facs USING gist (tsrange(valid_from, GREATEST(valid_from, valid_to), '[)'));
+
 /****************************************************
 ** Create Dimension Tables for Games Route Network **
 *****************************************************/
\ No newline at end of file
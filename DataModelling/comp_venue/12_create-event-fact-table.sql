@@ -131,6 +131,8 @@ CREATE INDEX idx_event_session_date ON fct_event_session(day_id);
 CREATE INDEX idx_event_session_venue ON fct_event_session(venue_id);
 CREATE INDEX idx_event_session_sport ON fct_event_session(sport_id);
 CREATE INDEX idx_event_change_version ON event_version_changes(schedule_version_id);
+-- Point-in-time lookups on the validity period (see 16_sample_queries.sql, query 3)
+CREATE INDEX idx_event_session_validity ON fct_event_session USING gist (tsrange(valid_from, GREATEST(valid_from, valid_to), '[)'));
 
 -- Partitioning
 -- Partition fct_event_session by schedule_version_key
@@ -82,9 +82,14 @@ WHERE 3 = ANY(version_array);
 SELECT * FROM fct_event_session
 WHERE is_current = TRUE;
 -- 3. Get events as they were at a specific date:
+-- Written as a range containment so idx_event_session_validity (GiST) is used;
+-- the expression has to match the index definition exactly
 SELECT * FROM fct_event_session
-WHERE valid_from <= '2023-01-03 00:00:00'
-  AND valid_to > '2023-01-03 00:00:00';
+WHERE tsrange(valid_from, GREATEST(valid_from, valid_to), '[)') @> '2023-01-03 00:00:00'::TIMESTAMP;
+-- 3a. A dimension as it was at that date (the SCD2 functions give every version its own id,
+-- so facts join to the exact row they were resolved against without a date filter):
+SELECT * FROM dim_venues
+WHERE tsrange(valid_from, GREATEST(valid_from, valid_to), '[)') @> '2023-01-03 00:00:00'::TIMESTAMP;
 -- 4. Get events that were part of multiple versions:
 SELECT * FROM fct_event_session
 WHERE array_length(version_array, 1) > 1;
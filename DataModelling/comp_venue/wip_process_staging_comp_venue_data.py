@@ -1,155 +1,205 @@
-import psycopg2
 import pandas as pd
 import os
-import json
+import sys
 from datetime import datetime
+from psycopg2.extensions import register_adapter
+from psycopg2.extras import Json
 
-# Database connection parameters
-DB_PARAMS = {
-    'dbname': os.getenv('DB_NAME'),
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASSWORD'),
-    'host': os.getenv('DB_HOST'),
-    'port': os.getenv('DB_PORT')
-}
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'development'))
+from audit_writer import AuditWriter
+from bulk_apply import EVENT_VALUE_COLUMNS, apply_changes_bulk
+from change_detection import detect_changes
+from db_connection import DEFAULT_ITERSIZE, connection, transaction, read_sql, table_columns
+from dimension_refresh import refresh_dimensions
+from instrumentation import get_logger, span
+from partitioned_apply import DEFAULT_WORKERS, process_staging_partitioned
+from staging_diff import add_hash_keys, build_bulk_change_sets, identify_changes, resolve_staging_keys
+from streaming_diff import iter_merge_windows, iter_sorted_by_hash_key
 
-def get_db_connection():
-    return psycopg2.connect(**DB_PARAMS)
+# additional_attributes comes back from JSONB as a dict; send it back the same way
+register_adapter(dict, Json)
+
+# Connection parameters and pool settings are read from DB_* environment variables by db_connection
+# Phase timings, row counts and DB round trips are logged as JSON spans (ETL_LOG_* settings)
+logger = get_logger('process_staging')
 
 def load_data(query):
-    with get_db_connection() as conn:
-        return pd.read_sql(query, conn)
+    return read_sql(query)
 
 def execute_query(query, params=None):
-    with get_db_connection() as conn:
+    with transaction() as conn:
         with conn.cursor() as cursor:
             cursor.execute(query, params)
-            conn.commit()
 
 def log_event_change(event_session_id, schedule_version_id, change_type, changed_fields, previous_values):
-    query = """
-    INSERT INTO event_audit (
-        event_session_id, schedule_version_id, change_type, changed_fields, previous_values, change_timestamp
-    ) VALUES (%s, %s, %s, %s, %s, %s)
-    """
-    execute_query(query, (
-        event_session_id, schedule_version_id, change_type, 
-        json.dumps(changed_fields), json.dumps(previous_values), datetime.now()
-    ))
+    # One-off audit record in its own transaction; batch loops should use an AuditWriter instead
+    with transaction() as conn:
+        with AuditWriter(conn) as audit:
+            audit.log(event_session_id, schedule_version_id, change_type, changed_fields, previous_values)
 
-def get_changed_columns(old_row, new_row):
-    changed_fields = {}
-    previous_values = {}
-    for column in old_row.index:
-        if old_row[column] != new_row[column]:
-            changed_fields[column] = new_row[column]
-            previous_values[column] = old_row[column]
-    return changed_fields, previous_values
+def load_and_hash():
+    # Steps 2-4 up to the diff: both sides loaded and keyed by hash_key
+    with span('load_staging') as phase:
+        staging_df = load_data("SELECT * FROM staging_event_session")
+        phase.set(rows=len(staging_df))
+    staging_df = resolve_staging_keys(staging_df)
+    with span('load_current') as phase:
+        current_df = load_data("SELECT * FROM fct_event_session WHERE is_current = TRUE")
+        phase.set(rows=len(current_df))
+    with span('hash', rows=len(staging_df) + len(current_df)):
+        add_hash_keys(staging_df)
+        add_hash_keys(current_df)
+    return staging_df, current_df
 
-def process_staging_data(new_version_number):
-    # Step 1: Create new schedule version
-    query = """
-    INSERT INTO dim_schedule_version (version_number, valid_from, valid_to)
-    VALUES (%s, %s, %s) RETURNING schedule_version_id
-    """
-    schedule_version_id = None
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(query, (new_version_number, datetime.now(), '9999-12-31 23:59:59'))
-            schedule_version_id = cursor.fetchone()[0]
-    
-    # Step 2: Load staging data
-    staging_data_query = "SELECT * FROM staging_event_session"
-    staging_df = load_data(staging_data_query)
-    
-    # Step 3: Load current data
-    current_data_query = "SELECT * FROM fct_event_session WHERE is_current = TRUE"
-    current_df = load_data(current_data_query)
+def iter_streaming_change_sets(conn, chunksize):
+    # Both sides come back in hash_key order, so each window can be diffed independently
+    staging_chunks = iter_sorted_by_hash_key(conn, 'staging_event_session', chunksize=chunksize)
+    current_chunks = iter_sorted_by_hash_key(conn, 'fct_event_session', 'WHERE src.is_current = TRUE', chunksize)
+    for staging_df, current_df in iter_merge_windows(staging_chunks, current_chunks):
+        yield build_bulk_change_sets(*identify_changes(staging_df, current_df))
+
+def process_staging_data_bulk(new_version_number, streaming=False, chunksize=DEFAULT_ITERSIZE):
+    with connection() as conn:
+        if streaming:
+            # Both cursors and the apply share one snapshot; client memory is bounded by chunksize
+            with conn.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                # HASH_KEY_SQL orders staging by its id columns; names are only resolved in memory
+                if 'venue_id' not in table_columns(cursor, 'staging_event_session'):
+                    raise ValueError("staging_event_session has no venue_id; streaming runs need id-based "
+                                     "staging (run without --streaming to resolve names through the dimension cache)")
+            change_batches = iter_streaming_change_sets(conn, chunksize)
+        else:
+            # Steps 2-4 as process_staging_data, then apply everything set-based on one connection
+            staging_df, current_df = load_and_hash()
+            with span('diff') as phase:
+                change_batches = [build_bulk_change_sets(*identify_changes(staging_df, current_df))]
+                phase.set(inserts=len(change_batches[0][0]), updates=len(change_batches[0][1]),
+                          deletes=len(change_batches[0][2]))
+
+        # Streaming reads, hashes and diffs inside this span, batch by batch as the COPY consumes them
+        with span('apply') as phase:
+            schedule_version_id, report = apply_changes_bulk(conn, new_version_number, change_batches)
+            copied = report['copy']
+            phase.set(schedule_version_id=schedule_version_id, rows=copied['rows'], inserts=copied['inserts'],
+                      updates=copied['updates'], deletes=copied['deletes'], batches=copied['batches'],
+                      phases=report)
+    return schedule_version_id, report
+
+def process_staging_data(new_version_number, bulk=False, streaming=False, chunksize=DEFAULT_ITERSIZE,
+                         partition_by=None, workers=DEFAULT_WORKERS):
+    mode = 'partitioned' if partition_by else 'streaming' if streaming else 'bulk' if bulk else 'rows'
+    with span('process_staging_data', version_number=new_version_number, mode=mode):
+        if partition_by:
+            # Shards by venue_id or day_id, diffed and applied by a pool of worker processes
+            return process_staging_partitioned(new_version_number, partition_by, workers)
+        if bulk or streaming:
+            return process_staging_data_bulk(new_version_number, streaming, chunksize)
+        return process_staging_data_rows(new_version_number)
+
+def process_staging_data_rows(new_version_number):
+    # Steps 2-3: Load staging and current data, then hash both
+    staging_df, current_df = load_and_hash()
     
     # Step 4: Identify inserts, updates, and deletes
-    staging_df['hash_key'] = staging_df.apply(
-        lambda row: pd.util.hash_pandas_object(row[['venue_id', 'sport_id', 'day_id', 'event_date', 'event_type', 'start_time', 'date_start']]).sum(), axis=1
-    )
-    current_df['hash_key'] = current_df.apply(
-        lambda row: pd.util.hash_pandas_object(row[['venue_id', 'sport_id', 'day_id', 'event_date', 'event_type', 'start_time', 'date_start']]).sum(), axis=1
-    )
-    
-    # Identify inserts and updates
-    merged_df = staging_df.merge(current_df, on='hash_key', how='left', suffixes=('_new', '_old'))
-    inserts_df = merged_df[merged_df['event_session_id_old'].isna()]
-    updates_df = merged_df[~merged_df['event_session_id_old'].isna()]
-    
-    # Identify deletes
-    deletes_df = current_df[~current_df['hash_key'].isin(staging_df['hash_key'])]
+    with span('diff') as phase:
+        inserts_df, updates_df, deletes_df = identify_changes(staging_df, current_df)
+        changes = detect_changes(updates_df, EVENT_VALUE_COLUMNS)
+        phase.set(inserts=len(inserts_df), updates=len(changes), deletes=len(deletes_df))
     
-    # Step 5: Process inserts
-    for index, row in inserts_df.iterrows():
-        insert_query = """
-        INSERT INTO fct_event_session (
-            hash_key, schedule_version_id, current_version_id, version_array, sport_id, venue_id, day_id, 
-            event_date, start_time, end_time, date_start, date_end, event_type, 
-            gross_seats, seat_kill, est_ticket_sold, net_seats, est_sold_seats, workforce_count, 
-            valid_from, valid_to, is_current, additional_attributes
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    # Steps 1 and 5-7 share one transaction, so a failed apply leaves no empty version behind;
+    # audit records are batched on the same connection
+    with span('write'), transaction() as conn, conn.cursor() as cursor, AuditWriter(conn) as audit:
+        # Step 1: Create new schedule version
+        query = """
+        INSERT INTO dim_schedule_version (version_number, valid_from, valid_to)
+        VALUES (%s, %s, %s) RETURNING schedule_version_id
         """
-        params = (
-            row['hash_key'], schedule_version_id, schedule_version_id, [schedule_version_id], row['sport_id_new'], row['venue_id_new'], row['day_id_new'],
-            row['event_date_new'], row['start_time_new'], row['end_time_new'], row['date_start_new'], row['date_end_new'], row['event_type_new'],
-            row['gross_seats_new'], row['seat_kill_new'], row['est_ticket_sold_new'], row['net_seats_new'], row['est_sold_seats_new'], row['workforce_count_new'],
-            datetime.now(), '9999-12-31 23:59:59', True, row['additional_attributes_new']
-        )
-        execute_query(insert_query, params)
-        log_event_change(None, schedule_version_id, 'INSERT', row.to_dict(), None)
+        with span('create_version') as phase:
+            cursor.execute(query, (new_version_number, datetime.now(), '9999-12-31 23:59:59'))
+            schedule_version_id = cursor.fetchone()[0]
+            phase.set(schedule_version_id=schedule_version_id)
+
+        # Step 5: Process inserts
+        with span('inserts', rows=len(inserts_df)):
+            for index, row in inserts_df.iterrows():
+                insert_query = """
+                INSERT INTO fct_event_session (
+                    hash_key, schedule_version_id, current_version_id, version_array, sport_id, venue_id, day_id, 
+                    session_id, competition_type, event_date, start_time, end_time, date_start, date_end, event_type, 
+                    gross_seats, seat_kill, est_ticket_sold, net_seats, est_sold_seats, workforce_count, 
+                    valid_from, valid_to, is_current, additional_attributes
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """
+                params = (
+                    row['hash_key'], schedule_version_id, schedule_version_id, [schedule_version_id], row['sport_id_new'], row['venue_id_new'], row['day_id_new'],
+                    row['session_id_new'], row['competition_type_new'], row['event_date_new'], row['start_time_new'], row['end_time_new'], row['date_start_new'], row['date_end_new'], row['event_type_new'],
+                    row['gross_seats_new'], row['seat_kill_new'], row['est_ticket_sold_new'], row['net_seats_new'], row['est_sold_seats_new'], row['workforce_count_new'],
+                    datetime.now(), '9999-12-31 23:59:59', True, row['additional_attributes_new']
+                )
+                cursor.execute(insert_query, params)
+                audit.log(None, schedule_version_id, 'INSERT', {'hash_key': row['hash_key'], **{c: row[f'{c}_new'] for c in EVENT_VALUE_COLUMNS}}, None)
     
-    # Step 6: Process updates
-    for index, row in updates_df.iterrows():
-        old_row = row.filter(like='_old')
-        new_row = row.filter(like='_new')
-        changed_fields, previous_values = get_changed_columns(old_row, new_row)
-        
-        if changed_fields:
-            update_query = """
-            UPDATE fct_event_session
-            SET is_current = FALSE, valid_to = %s
-            WHERE event_session_id = %s
-            """
-            execute_query(update_query, (datetime.now(), row['event_session_id_old']))
-            log_event_change(row['event_session_id_old'], row['schedule_version_id_old'], 'UPDATE', changed_fields, previous_values)
+        # Step 6: Process updates (only rows whose event columns actually changed)
+        with span('updates', rows=len(changes)):
+            for index, row in updates_df.loc[changes.index].iterrows():
+                changed_fields, previous_values = changes.at[index, 'changed_fields'], changes.at[index, 'previous_values']
+                if changed_fields:
+                    update_query = """
+                    UPDATE fct_event_session
+                    SET is_current = FALSE, valid_to = %s
+                    WHERE event_session_id = %s
+                    """
+                    cursor.execute(update_query, (datetime.now(), row['event_session_id_old']))
+                    audit.log(row['event_session_id_old'], row['schedule_version_id_old'], 'UPDATE', changed_fields, previous_values)
             
-            insert_query = """
-            INSERT INTO fct_event_session (
-                hash_key, schedule_version_id, current_version_id, version_array, sport_id, venue_id, day_id, 
-                event_date, start_time, end_time, date_start, date_end, event_type, 
-                gross_seats, seat_kill, est_ticket_sold, net_seats, est_sold_seats, workforce_count, 
-                valid_from, valid_to, is_current, additional_attributes
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            params = (
-                row['hash_key'], schedule_version_id, schedule_version_id, row['version_array_old'] + [schedule_version_id], row['sport_id_new'], row['venue_id_new'], row['day_id_new'],
-                row['event_date_new'], row['start_time_new'], row['end_time_new'], row['date_start_new'], row['date_end_new'], row['event_type_new'],
-                row['gross_seats_new'], row['seat_kill_new'], row['est_ticket_sold_new'], row['net_seats_new'], row['est_sold_seats_new'], row['workforce_count_new'],
-                datetime.now(), '9999-12-31 23:59:59', True, row['additional_attributes_new']
-            )
-            execute_query(insert_query, params)
+                    insert_query = """
+                    INSERT INTO fct_event_session (
+                        hash_key, schedule_version_id, current_version_id, version_array, sport_id, venue_id, day_id, 
+                        session_id, competition_type, event_date, start_time, end_time, date_start, date_end, event_type, 
+                        gross_seats, seat_kill, est_ticket_sold, net_seats, est_sold_seats, workforce_count, 
+                        valid_from, valid_to, is_current, additional_attributes
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """
+                    params = (
+                        row['hash_key'], schedule_version_id, schedule_version_id, row['version_array_old'] + [schedule_version_id], row['sport_id_new'], row['venue_id_new'], row['day_id_new'],
+                        row['session_id_new'], row['competition_type_new'], row['event_date_new'], row['start_time_new'], row['end_time_new'], row['date_start_new'], row['date_end_new'], row['event_type_new'],
+                        row['gross_seats_new'], row['seat_kill_new'], row['est_ticket_sold_new'], row['net_seats_new'], row['est_sold_seats_new'], row['workforce_count_new'],
+                        datetime.now(), '9999-12-31 23:59:59', True, row['additional_attributes_new']
+                    )
+                    cursor.execute(insert_query, params)
     
-    # Step 7: Process deletes
-    for index, row in deletes_df.iterrows():
-        old_values = {
-            'sport_id': row['sport_id'], 'venue_id': row['venue_id'], 'day_id': row['day_id'],
-            'event_date': row['event_date'], 'start_time': row['start_time'], 'end_time': row['end_time'],
-            'date_start': row['date_start'], 'date_end': row['date_end'], 'event_type': row['event_type'],
-            'gross_seats': row['gross_seats'], 'seat_kill': row['seat_kill'], 'est_ticket_sold': row['est_ticket_sold'],
-            'net_seats': row['net_seats'], 'est_sold_seats': row['est_sold_seats'], 'workforce_count': row['workforce_count'],
-            'additional_attributes': row['additional_attributes']
-        }
+        # Step 7: Process deletes
+        with span('deletes', rows=len(deletes_df)):
+            for index, row in deletes_df.iterrows():
+                old_values = {
+                    'sport_id': row['sport_id'], 'venue_id': row['venue_id'], 'day_id': row['day_id'],
+                    'session_id': row['session_id'], 'competition_type': row['competition_type'],
+                    'event_date': row['event_date'], 'start_time': row['start_time'], 'end_time': row['end_time'],
+                    'date_start': row['date_start'], 'date_end': row['date_end'], 'event_type': row['event_type'],
+                    'gross_seats': row['gross_seats'], 'seat_kill': row['seat_kill'], 'est_ticket_sold': row['est_ticket_sold'],
+                    'net_seats': row['net_seats'], 'est_sold_seats': row['est_sold_seats'], 'workforce_count': row['workforce_count'],
+                    'additional_attributes': row['additional_attributes']
+                }
         
-        update_query = """
-        UPDATE fct_event_session
-        SET is_current = FALSE, valid_to = %s, current_version_id = %s, version_array = array_append(version_array, %s)
-        WHERE event_session_id = %s
-        """
-        execute_query(update_query, (datetime.now(), schedule_version_id, schedule_version_id, row['event_session_id']))
-        log_event_change(row['event_session_id'], row['schedule_version_id'], 'DELETE', None, old_values)
+                update_query = """
+                UPDATE fct_event_session
+                SET is_current = FALSE, valid_to = %s, current_version_id = %s, version_array = array_append(version_array, %s)
+                WHERE event_session_id = %s
+                """
+                cursor.execute(update_query, (datetime.now(), schedule_version_id, schedule_version_id, row['event_session_id']))
+                audit.log(row['event_session_id'], row['schedule_version_id'], 'DELETE', None, old_values)
+
+    audit_metrics = audit.metrics()
+    logger.info("audit records written", extra={'fields': {'event': 'audit', **audit_metrics}})
+    return schedule_version_id
 
 if __name__ == "__main__":
-    process_staging_data('v1')
+    if '--refresh-dimensions' in sys.argv:
+        with span('refresh_dimensions') as phase:
+            report = refresh_dimensions()
+            phase.set(**report)
+    partition_by = sys.argv[sys.argv.index('--partition-by') + 1] if '--partition-by' in sys.argv else None
+    workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else DEFAULT_WORKERS
+    process_staging_data('v1', bulk='--bulk' in sys.argv, streaming='--streaming' in sys.argv,
+                         partition_by=partition_by, workers=workers)
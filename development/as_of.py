@@ -0,0 +1,181 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from db_connection import connection, print_metrics, read_sql, table_columns, transaction
+from dimension_cache import LOOKUPS
+
+# A row's validity period. GREATEST keeps a row expired in the instant it was created a valid
+# (empty) range. Queries must use this exact expression for the GiST index to apply.
+VALIDITY_PERIOD_SQL = "tsrange({alias}valid_from, GREATEST({alias}valid_from, {alias}valid_to), '[)')"
+
+FACT_TABLE = 'fct_event_session'
+DIMENSION_TABLES = [
+    'dim_regions', 'dim_zones', 'dim_clusters', 'dim_status', 'dim_venues', 'dim_subvenues', 'dim_sports', 'dim_calendar'
+]
+
+VALIDITY_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_{name}_validity ON {table} USING gist ({period})
+"""
+
+# Version N as it stood just before version N + 1 started; the latest version is the current schedule.
+# Rows written by version N + 1 (row-by-row or bulk) all have timestamps at or after its valid_from.
+VERSION_BOUNDS_QUERY = """
+SELECT schedule_version_id, version_number, valid_from, next_valid_from
+FROM (
+    SELECT schedule_version_id, version_number, valid_from,
+           lead(valid_from) OVER (ORDER BY valid_from, schedule_version_id) AS next_valid_from
+    FROM dim_schedule_version
+) v
+WHERE {version_filter}
+"""
+
+
+def _table(schema, name):
+    return f'{schema}.{name}' if schema else name
+
+
+def validity_period(alias=''):
+    return VALIDITY_PERIOD_SQL.format(alias=f'{alias}.' if alias else '')
+
+
+def create_validity_indexes(conn, tables, schema=None):
+    """GiST index on the validity period of every table that exists in ``tables``; the caller commits."""
+    created = []
+    with conn.cursor() as cursor:
+        for name in tables:
+            table = _table(schema, name)
+            cursor.execute("SELECT to_regclass(%s)", (table,))
+            if cursor.fetchone()[0] is None:
+                continue
+            # idx_event_session_validity for the fact table, as 12_ names it
+            index_name = name[len('fct_'):] if name.startswith('fct_') else name
+            cursor.execute(VALIDITY_INDEX_DDL.format(name=index_name, table=table, period=validity_period()))
+            cursor.execute(f"ANALYZE {table}")
+            created.append(table)
+    return created
+
+
+def version_timestamp(conn, version):
+    """
+    The point in time that reproduces ``version`` (a schedule_version_id, or a version_number
+    string), or None when it is the latest version and the current rows are wanted.
+    """
+    if isinstance(version, int):
+        version_filter, params = "schedule_version_id = %(version)s", {'version': version}
+    else:
+        version_filter, params = "version_number = %(version)s", {'version': str(version)}
+    with conn.cursor() as cursor:
+        cursor.execute(VERSION_BOUNDS_QUERY.format(version_filter=version_filter), params)
+        rows = cursor.fetchall()
+    if not rows:
+        raise ValueError(f"Unknown schedule version: {version}")
+    if len(rows) > 1:
+        raise ValueError(f"Version number {version} is ambiguous; pass its schedule_version_id")
+    next_valid_from = rows[0][3]
+    return None if next_valid_from is None else next_valid_from - timedelta(microseconds=1)
+
+
+def as_of_query(table, dimension_schema=None, columns=None):
+    """
+    SELECT of ``table`` rows valid at %(as_of)s, joined to the names of every dimension
+    whose id column ``table`` has. Facts reference one SCD2 row by id, so the dimension
+    joins need no date filter.
+    """
+    selects, joins = ['f.*'], []
+    for name, lookup in LOOKUPS.items():
+        if columns is not None and lookup['id'] not in columns:
+            continue
+        alias, key = f'd_{name}', lookup['keys'][0]
+        # Prefixed when the fact table has a column of the same name
+        label = f'{name}_{key}' if key in (columns or ()) else key
+        selects.append(f"{alias}.{key} AS {label}")
+        joins.append(f"LEFT JOIN {_table(dimension_schema, lookup['table'])} {alias} "
+                     f"ON f.{lookup['id']} = {alias}.{lookup['id']}")
+    return (
+        f"SELECT {', '.join(selects)}\nFROM {table} f\n" + '\n'.join(joins)
+        + f"\nWHERE {validity_period('f')} @> %(as_of)s::TIMESTAMP"
+    )
+
+
+def get_schedule_as_of(as_of=None, version=None, fact_table=FACT_TABLE, dimension_schema=None, with_names=True):
+    """
+    The schedule exactly as it was at ``as_of`` (a datetime) or at ``version``: the fact rows
+    valid at that instant, with venue, sport, ... names when ``with_names``. Neither given
+    means now. Returns (DataFrame, as_of timestamp used).
+    """
+    with connection() as conn:
+        if version is not None:
+            as_of = version_timestamp(conn, version)
+        as_of = as_of or datetime.now()
+        if with_names:
+            with conn.cursor() as cursor:
+                columns = table_columns(cursor, fact_table)
+            query = as_of_query(fact_table, dimension_schema, columns)
+        else:
+            query = f"SELECT f.* FROM {fact_table} f WHERE {validity_period('f')} @> %(as_of)s::TIMESTAMP"
+        df = read_sql(query, {'as_of': as_of}, conn=conn)
+    return df, as_of
+
+
+def get_dimension_as_of(table, as_of=None, schema=None):
+    """An SCD2 dimension's rows as they were at ``as_of`` (default now)."""
+    return read_sql(
+        f"SELECT * FROM {_table(schema, table)} WHERE {validity_period()} @> %(as_of)s::TIMESTAMP",
+        {'as_of': as_of or datetime.now()}
+    )
+
+
+def get_event_history(hash_key, fact_table=FACT_TABLE):
+    """Every stored row of one event, oldest first."""
+    return read_sql(f"SELECT * FROM {fact_table} WHERE hash_key = %s ORDER BY valid_from", (hash_key,))
+
+
+def explain_as_of(as_of, fact_table=FACT_TABLE):
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM {fact_table} f WHERE {validity_period('f')} @> %s::TIMESTAMP",
+                (as_of,)
+            )
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        conn.rollback()
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Point-in-time reads of the schedule and the SCD2 dimensions.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    indexes = subparsers.add_parser('indexes', help="Create the validity-period GiST indexes")
+    indexes.add_argument('--fact-table', default=FACT_TABLE)
+    indexes.add_argument('--dimension-schema')
+    schedule = subparsers.add_parser('schedule', help="Print or save the schedule as of a time or version")
+    schedule.add_argument('--as-of', type=datetime.fromisoformat)
+    schedule.add_argument('--version', help="schedule_version_id (digits) or version_number")
+    schedule.add_argument('--fact-table', default=FACT_TABLE)
+    schedule.add_argument('--dimension-schema')
+    schedule.add_argument('--out', help="Write the rows to this CSV file")
+    schedule.add_argument('--explain', action='store_true', help="Show the plan of the fact lookup")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'indexes':
+            with transaction() as conn:
+                created = create_validity_indexes(conn, [args.fact_table], None)
+                created += create_validity_indexes(conn, DIMENSION_TABLES, args.dimension_schema)
+            print(f"Validity indexes on: {', '.join(created)}")
+        else:
+            version = int(args.version) if args.version and args.version.isdigit() else args.version
+            start = time.perf_counter()
+            df, as_of = get_schedule_as_of(args.as_of, version, args.fact_table, args.dimension_schema)
+            print(f"{len(df)} events as of {as_of} in {time.perf_counter() - start:.3f}s")
+            if args.out:
+                df.to_csv(args.out, index=False)
+            if args.explain:
+                print(explain_as_of(as_of, args.fact_table))
+    finally:
+        print_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import csv
+import io
+import json
+import math
+import os
+import time
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+DEFAULT_AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '5000'))
+
+AUDIT_COLUMNS = [
+    'event_session_id', 'schedule_version_id', 'change_type', 'changed_fields', 'previous_values', 'change_timestamp'
+]
+
+
+def _json_value(value):
+    # NaN/NaT become null; numpy, Decimal and temporal values become plain JSON scalars
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date, time_of_day)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _json_value(item) for key, item in value.items()}
+    return value
+
+
+def to_json(values):
+    if values is None:
+        return None
+    return json.dumps({key: _json_value(value) for key, value in values.items()}, default=str, allow_nan=False)
+
+
+def _same(old, new):
+    old, new = _json_value(old), _json_value(new)
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        return math.isclose(old, new, rel_tol=0, abs_tol=1e-9)
+    return old == new
+
+
+class AuditWriter:
+    """
+    Buffers event_audit records and writes them in batches on the caller's connection,
+    inside the caller's transaction (it never commits). ``method`` is 'values'
+    (execute_values) or 'copy' (COPY FROM STDIN). UPDATE records keep only the
+    columns whose value actually changed.
+
+    Call flush() before committing, or close() / use it as a context manager; records
+    still buffered when close() is skipped are not written.
+    """
+
+    def __init__(self, conn, batch_size=DEFAULT_AUDIT_BATCH_SIZE, method='values'):
+        if method not in ('values', 'copy'):
+            raise ValueError(f"Unknown audit write method: {method}")
+        self.conn = conn
+        self.batch_size = batch_size
+        self.method = method
+        self.closed = False
+        self._buffer = []
+        self.rows_written = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    def log(self, event_session_id, schedule_version_id, change_type, changed_fields, previous_values, change_timestamp=None):
+        if self.closed:
+            raise RuntimeError("AuditWriter is closed")
+        if change_type == 'UPDATE' and changed_fields and previous_values:
+            changed = [key for key in changed_fields if not _same(previous_values.get(key), changed_fields[key])]
+            changed_fields = {key: changed_fields[key] for key in changed}
+            previous_values = {key: previous_values.get(key) for key in changed}
+        self._buffer.append((
+            _json_value(event_session_id), _json_value(schedule_version_id), change_type,
+            to_json(changed_fields), to_json(previous_values), change_timestamp or datetime.now()
+        ))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return 0
+        start = time.perf_counter()
+        rows = self._buffer
+        with self.conn.cursor() as cursor:
+            if self.method == 'copy':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    "COPY event_audit ({}) FROM STDIN WITH (FORMAT csv)".format(', '.join(AUDIT_COLUMNS)), buffer
+                )
+            else:
+                execute_values(
+                    cursor,
+                    "INSERT INTO event_audit ({}) VALUES %s".format(', '.join(AUDIT_COLUMNS)),
+                    rows, template="(%s, %s, %s, %s::JSONB, %s::JSONB, %s)", page_size=self.batch_size
+                )
+        self._buffer = []
+        self.rows_written += len(rows)
+        self.batches += 1
+        self.seconds += time.perf_counter() - start
+        return len(rows)
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.closed = True
+
+    def metrics(self):
+        return {
+            'rows': self.rows_written,
+            'batches': self.batches,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_written / self.seconds, 1) if self.seconds else None
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # The caller's transaction is rolling back; drop what was never written
+            self._buffer = []
+            self.closed = True
+        return False
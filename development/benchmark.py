@@ -0,0 +1,555 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from db_connection import connection, dispose_engine, get_metrics
+from hashing import HASH_KEY_SQL
+from models import bridge_partition_ddl
+from partitioning import BRIDGE_INDEX_DDL, DELTA_STORAGE_DDL, PARTITIONED_BRIDGE_DDL
+from synthetic_schedule import generate_dimensions, iter_schedule_versions, load_dataframe, load_dimensions, to_wip_staging
+from views_and_functions import COMPARE_VERSIONS_SQL, RESOLVE_VERSION_EVENTS_SQL, VERSION_EVENT_ROWS_SQL, VW_EVENT_BY_VERSION_SQL
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(REPO_ROOT, 'DataModelling', 'comp_venue'))
+
+PROCESS_STAGING_SQL_FILE = os.path.join(REPO_ROOT, 'DataModelling', 'comp_venue', '13_process_staging_event_session.sql')
+DEFAULT_HISTORY_FILE = 'benchmark_history.json'
+STAGES = ['sql', 'bridge', 'python', 'diff', 'query', 'sizes']
+# A metric this much worse than the previous run with the same settings is reported as a regression
+REGRESSION_THRESHOLD = 0.25
+
+# Dimension tables of 11_create-dimension-tables.sql without the PostGIS geometry columns
+DIMENSION_DDL = """
+CREATE TABLE dim_regions (
+    region_id SERIAL PRIMARY KEY, region_name VARCHAR(255) NOT NULL, area_sqkm NUMERIC(20, 6), length_km NUMERIC(20, 6),
+    valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP, valid_to TIMESTAMP DEFAULT '9999-12-31 23:59:59', is_current BOOLEAN NOT NULL
+);
+CREATE TABLE dim_zones (
+    zone_id SERIAL PRIMARY KEY, zone_name VARCHAR(255) NOT NULL, region_id INTEGER REFERENCES dim_regions(region_id),
+    valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP, valid_to TIMESTAMP DEFAULT '9999-12-31 23:59:59', is_current BOOLEAN NOT NULL
+);
+CREATE TABLE dim_clusters (
+    cluster_id SERIAL PRIMARY KEY, cluster_name VARCHAR(255) NOT NULL, region_id INTEGER REFERENCES dim_regions(region_id),
+    zone_id INTEGER REFERENCES dim_zones(zone_id),
+    valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP, valid_to TIMESTAMP DEFAULT '9999-12-31 23:59:59', is_current BOOLEAN NOT NULL
+);
+CREATE TABLE dim_status (
+    status_id SERIAL PRIMARY KEY, status_name VARCHAR(255) NOT NULL,
+    valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP, valid_to TIMESTAMP DEFAULT '9999-12-31 23:59:59', is_current BOOLEAN NOT NULL
+);
+CREATE TABLE dim_venues (
+    venue_id SERIAL PRIMARY KEY, venue_name VARCHAR(100) NOT NULL, status_id INTEGER REFERENCES dim_status(status_id),
+    has_subvenue BOOLEAN, region_id INTEGER REFERENCES dim_regions(region_id), zone_id INTEGER REFERENCES dim_zones(zone_id),
+    cluster_id INTEGER REFERENCES dim_clusters(cluster_id), latitude NUMERIC(21, 4), longitude NUMERIC(21, 4), capacity INTEGER,
+    valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP, valid_to TIMESTAMP DEFAULT '9999-12-31 23:59:59', is_current BOOLEAN NOT NULL,
+    CONSTRAINT venue_date_range CHECK (valid_from < valid_to)
+);
+CREATE TABLE dim_subvenues (
+    subvenue_id SERIAL PRIMARY KEY, subvenue_name VARCHAR(100) NOT NULL, venue_id INTEGER REFERENCES dim_venues(venue_id),
+    capacity INTEGER,
+    valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP, valid_to TIMESTAMP DEFAULT '9999-12-31 23:59:59', is_current BOOLEAN NOT NULL,
+    CONSTRAINT subvenue_date_range CHECK (valid_from < valid_to)
+);
+CREATE TABLE dim_sports (
+    sport_id INTEGER PRIMARY KEY, sport_discipline VARCHAR(255) NOT NULL UNIQUE, venue_id INTEGER REFERENCES dim_venues(venue_id),
+    valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP, valid_to TIMESTAMP DEFAULT '9999-12-31 23:59:59', is_current BOOLEAN NOT NULL
+);
+CREATE TABLE dim_calendar (
+    day_id INTEGER PRIMARY KEY, event_day INTEGER NOT NULL, model_date DATE, actual_date DATE NOT NULL,
+    day_of_week VARCHAR(50) NOT NULL, competition_type VARCHAR(50) NOT NULL,
+    valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP, valid_to TIMESTAMP DEFAULT '9999-12-31 23:59:59', is_current BOOLEAN NOT NULL
+);
+"""
+
+# staging_event_session (12_) plus the version and fact tables process_staging_event_session (13_) writes
+SQL_PIPELINE_DDL = """
+CREATE TABLE staging_event_session (
+    sport_discipline VARCHAR(100) NOT NULL, venue_name VARCHAR(100) NOT NULL, subvenue_name VARCHAR(100) NOT NULL,
+    region_name VARCHAR(100) NOT NULL, zone_name VARCHAR(100) NOT NULL, cluster_name VARCHAR(100) NOT NULL,
+    event_day INTEGER NOT NULL, session_id INTEGER NOT NULL, date_start DATE NOT NULL, start_time TIME NOT NULL,
+    date_end DATE NOT NULL, end_time TIME NOT NULL, competition_type VARCHAR(1), event_type VARCHAR(15),
+    gross_seats INTEGER NOT NULL, seat_kill NUMERIC(5,2) NOT NULL, est_pct_ticksold NUMERIC(5,2) NOT NULL,
+    net_seats INTEGER NOT NULL, est_sold_seats INTEGER NOT NULL, workforce INTEGER NOT NULL, unticketed INTEGER NOT NULL,
+    additional_attributes JSONB
+);
+CREATE TABLE dim_schedule_version (
+    version_id VARCHAR(10) PRIMARY KEY, valid_from TIMESTAMP, valid_to TIMESTAMP
+);
+CREATE TABLE fct_event_session (
+    record_id SERIAL PRIMARY KEY, hash_key VARCHAR(100) NOT NULL, schedule_version_id VARCHAR(10),
+    current_version_id VARCHAR(10), version_array VARCHAR[], sport_id INTEGER, venue_id INTEGER, subvenue_id INTEGER,
+    region_id INTEGER, zone_id INTEGER, cluster_id INTEGER, day_id INTEGER, session_id INTEGER,
+    date_start DATE NOT NULL, start_time TIME NOT NULL, date_end DATE NOT NULL, end_time TIME NOT NULL,
+    competition_type VARCHAR(1), event_type VARCHAR(15), gross_seats INTEGER NOT NULL, seat_kill NUMERIC(5,2) NOT NULL,
+    est_pct_ticksold NUMERIC(5,2) NOT NULL, net_seats INTEGER NOT NULL, est_sold_seats INTEGER NOT NULL,
+    workforce INTEGER NOT NULL, unticketed INTEGER NOT NULL, valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    valid_to TIMESTAMP DEFAULT '9999-12-31 23:59:59', is_current BOOLEAN NOT NULL, additional_attributes JSONB
+);
+CREATE INDEX idx_event_session_current ON fct_event_session (hash_key) WHERE is_current;
+"""
+
+# The version-bridge model of create_fct.sql; detail_hash is filled by the loader
+BRIDGE_MODEL_DDL = """
+CREATE TABLE dim_scenario (
+    scenario_id SERIAL PRIMARY KEY, scenario_name VARCHAR(100) NOT NULL, scenario_description TEXT,
+    created_by VARCHAR(50), created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, category VARCHAR(50), priority INTEGER
+);
+CREATE TABLE dim_version (
+    version_id SERIAL PRIMARY KEY, scenario_id INTEGER REFERENCES dim_scenario(scenario_id),
+    version_number INTEGER NOT NULL, version_code VARCHAR(50) NOT NULL, version_name VARCHAR(100),
+    version_description TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, created_by VARCHAR(50),
+    status VARCHAR(20) DEFAULT 'DRAFT', UNIQUE(scenario_id, version_number)
+);
+CREATE TABLE fct_event_base (
+    event_id SERIAL PRIMARY KEY, hash_key VARCHAR(100) NOT NULL UNIQUE,
+    sport_id INTEGER REFERENCES dim_sports(sport_id), venue_id INTEGER REFERENCES dim_venues(venue_id),
+    subvenue_id INTEGER, region_id INTEGER REFERENCES dim_regions(region_id), zone_id INTEGER REFERENCES dim_zones(zone_id),
+    cluster_id INTEGER REFERENCES dim_clusters(cluster_id), day_id INTEGER REFERENCES dim_calendar(day_id),
+    session_id INTEGER, competition_type VARCHAR(1), event_type VARCHAR(15),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, created_by VARCHAR(50), last_modified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE fct_event_details (
+    detail_id SERIAL PRIMARY KEY, event_id INTEGER REFERENCES fct_event_base(event_id),
+    date_start DATE NOT NULL, start_time TIME NOT NULL, date_end DATE NOT NULL, end_time TIME NOT NULL,
+    gross_seats INTEGER NOT NULL, seat_kill NUMERIC(5,2) NOT NULL, est_pct_ticksold NUMERIC(5,2) NOT NULL,
+    net_seats INTEGER NOT NULL, est_sold_seats INTEGER NOT NULL, workforce INTEGER NOT NULL, unticketed INTEGER NOT NULL,
+    additional_attributes JSONB, detail_hash VARCHAR(100),
+    UNIQUE(event_id, detail_hash)
+);
+INSERT INTO dim_scenario (scenario_name, category) VALUES ('Benchmark', 'Base');
+"""
+
+# Set-based equivalent of process_events_for_version (create_fct.sql) for one staging drop
+BRIDGE_INGEST_SQL = """
+CREATE TEMP TABLE bridge_ingest ON COMMIT DROP AS
+SELECT r.*, {hash_key_sql} AS hash_key,
+       md5(
+           COALESCE(to_char(r.date_start, 'YYYY-MM-DD'), '') || COALESCE(to_char(r.start_time, 'HH24:MI:SS'), '') ||
+           COALESCE(to_char(r.date_end, 'YYYY-MM-DD'), '') || COALESCE(to_char(r.end_time, 'HH24:MI:SS'), '') ||
+           COALESCE(r.gross_seats::TEXT, '') || COALESCE(r.seat_kill::TEXT, '') || COALESCE(r.est_pct_ticksold::TEXT, '') ||
+           COALESCE(r.net_seats::TEXT, '') || COALESCE(r.est_sold_seats::TEXT, '') || COALESCE(r.workforce::TEXT, '') ||
+           COALESCE(r.unticketed::TEXT, '')
+       ) AS detail_hash
+FROM (
+    SELECT s.sport_id, v.venue_id,
+           CASE WHEN e.subvenue_name = 'Not Applicable' THEN 99 ELSE sv.subvenue_id END AS subvenue_id,
+           rg.region_id, z.zone_id, cl.cluster_id, c.day_id,
+           e.session_id, e.competition_type, e.event_type, e.date_start, e.start_time, e.date_end, e.end_time,
+           e.gross_seats, e.seat_kill, e.est_pct_ticksold, e.net_seats, e.est_sold_seats, e.workforce, e.unticketed,
+           e.additional_attributes
+    FROM {schema}.staging_event_session e
+    LEFT JOIN dim_venues v ON e.venue_name = v.venue_name AND v.is_current
+    LEFT JOIN dim_sports s ON e.sport_discipline = s.sport_discipline AND s.is_current
+    LEFT JOIN dim_subvenues sv ON e.subvenue_name = sv.subvenue_name AND v.venue_id = sv.venue_id AND sv.is_current
+    LEFT JOIN dim_regions rg ON e.region_name = rg.region_name AND rg.is_current
+    LEFT JOIN dim_zones z ON e.zone_name = z.zone_name AND z.is_current
+    LEFT JOIN dim_clusters cl ON e.cluster_name = cl.cluster_name AND cl.is_current
+    LEFT JOIN dim_calendar c ON e.event_day = c.event_day AND e.competition_type = c.competition_type AND c.is_current
+) r;
+
+INSERT INTO fct_event_base (
+    hash_key, sport_id, venue_id, subvenue_id, region_id, zone_id, cluster_id, day_id,
+    session_id, competition_type, event_type, created_by
+)
+SELECT hash_key, sport_id, venue_id, subvenue_id, region_id, zone_id, cluster_id, day_id,
+       session_id, competition_type, event_type, 'benchmark'
+FROM bridge_ingest
+ON CONFLICT (hash_key) DO NOTHING;
+
+INSERT INTO fct_event_details (
+    event_id, date_start, start_time, date_end, end_time, gross_seats, seat_kill, est_pct_ticksold,
+    net_seats, est_sold_seats, workforce, unticketed, additional_attributes, detail_hash
+)
+SELECT b.event_id, i.date_start, i.start_time, i.date_end, i.end_time, i.gross_seats, i.seat_kill,
+       i.est_pct_ticksold, i.net_seats, i.est_sold_seats, i.workforce, i.unticketed, i.additional_attributes, i.detail_hash
+FROM bridge_ingest i
+JOIN fct_event_base b ON b.hash_key = i.hash_key
+ON CONFLICT (event_id, detail_hash) DO NOTHING;
+
+INSERT INTO version_event_bridge (version_id, event_id, detail_id, is_active, added_by)
+SELECT %(version_id)s, b.event_id, d.detail_id, TRUE, 'benchmark'
+FROM bridge_ingest i
+JOIN fct_event_base b ON b.hash_key = i.hash_key
+JOIN fct_event_details d ON d.event_id = b.event_id AND d.detail_hash = i.detail_hash;
+"""
+
+# Tables process_staging_data (wip_process_staging_comp_venue_data.py) reads and writes
+WIP_PIPELINE_DDL = """
+CREATE TABLE staging_event_session (
+    sport_id INTEGER, venue_id INTEGER, day_id INTEGER, session_id INTEGER, competition_type VARCHAR(1),
+    event_date DATE, start_time TIME, end_time TIME, date_start DATE, date_end DATE, event_type VARCHAR(15),
+    gross_seats INTEGER, seat_kill NUMERIC(5,2), est_ticket_sold NUMERIC(5,2), net_seats INTEGER,
+    est_sold_seats INTEGER, workforce_count INTEGER, additional_attributes JSONB
+);
+CREATE TABLE dim_schedule_version (
+    schedule_version_id SERIAL PRIMARY KEY, version_number VARCHAR(50), valid_from TIMESTAMP, valid_to TIMESTAMP
+);
+CREATE TABLE fct_event_session (
+    event_session_id SERIAL PRIMARY KEY, hash_key VARCHAR(100), schedule_version_id INTEGER, current_version_id INTEGER,
+    version_array INTEGER[], sport_id INTEGER, venue_id INTEGER, day_id INTEGER, session_id INTEGER,
+    competition_type VARCHAR(1), event_date DATE, start_time TIME, end_time TIME, date_start DATE, date_end DATE,
+    event_type VARCHAR(15), gross_seats INTEGER, seat_kill NUMERIC(5,2), est_ticket_sold NUMERIC(5,2), net_seats INTEGER,
+    est_sold_seats INTEGER, workforce_count INTEGER, valid_from TIMESTAMP, valid_to TIMESTAMP, is_current BOOLEAN,
+    additional_attributes JSONB
+);
+CREATE INDEX idx_wip_event_session_current ON fct_event_session (hash_key) WHERE is_current;
+CREATE TABLE event_audit (
+    audit_id SERIAL PRIMARY KEY, event_session_id INTEGER, schedule_version_id INTEGER, change_type VARCHAR(10),
+    changed_fields JSONB, previous_values JSONB, change_timestamp TIMESTAMP
+);
+"""
+
+QUERIES = {
+    'version_read': "SELECT * FROM vw_event_by_version WHERE version_id = %(version_id)s",
+    'venue_day': "SELECT * FROM vw_event_by_version WHERE version_id = %(version_id)s AND venue_id = %(venue_id)s AND day_id = %(day_id)s",
+    'event_history': "SELECT version_id, date_start, start_time, gross_seats FROM vw_event_by_version WHERE event_id = %(event_id)s"
+}
+
+
+def process_staging_function_sql(schema):
+    """process_staging_event_session from 13_, pointed at ``schema`` instead of test."""
+    with open(PROCESS_STAGING_SQL_FILE) as sql_file:
+        source = sql_file.read()
+    function = re.search(r'CREATE OR REPLACE FUNCTION process_staging_event_session.*?\$\$ LANGUAGE plpgsql;', source, re.S)
+    return function.group(0).replace('test.', f'{schema}.').replace(
+        'FUNCTION process_staging_event_session', f'FUNCTION {schema}.process_staging_event_session', 1
+    )
+
+
+@contextlib.contextmanager
+def search_path(path):
+    """Point every pooled connection at ``path`` (DB_SEARCH_PATH) for the duration of the block."""
+    previous = os.environ.get('DB_SEARCH_PATH')
+    os.environ['DB_SEARCH_PATH'] = path
+    dispose_engine()
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop('DB_SEARCH_PATH', None)
+        else:
+            os.environ['DB_SEARCH_PATH'] = previous
+        dispose_engine()
+
+
+class StageTimer:
+    """Wall time and database round trips (db_connection metrics) of one measured block."""
+
+    def __enter__(self):
+        self.queries = get_metrics()['queries']
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.seconds = time.perf_counter() - self.start
+        self.round_trips = get_metrics()['queries'] - self.queries
+        return False
+
+
+def percentiles(samples_ms):
+    samples = np.array(samples_ms)
+    return {
+        'samples': len(samples),
+        'mean_ms': round(float(samples.mean()), 3),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3),
+        'max_ms': round(float(samples.max()), 3)
+    }
+
+
+def setup_schemas(schema, dimensions):
+    wip_schema = f'{schema}_wip'
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; DROP SCHEMA IF EXISTS {wip_schema} CASCADE")
+            cursor.execute(f"CREATE SCHEMA {schema}; CREATE SCHEMA {wip_schema}")
+            cursor.execute(f"SET search_path TO {schema}")
+            cursor.execute(DIMENSION_DDL)
+            cursor.execute(SQL_PIPELINE_DDL)
+            cursor.execute(process_staging_function_sql(schema))
+            cursor.execute(BRIDGE_MODEL_DDL)
+            cursor.execute(PARTITIONED_BRIDGE_DDL.format(strategy='LIST'))
+            cursor.execute(bridge_partition_ddl('LIST'))
+            cursor.execute(BRIDGE_INDEX_DDL)
+            cursor.execute(DELTA_STORAGE_DDL)
+            cursor.execute(RESOLVE_VERSION_EVENTS_SQL)
+            cursor.execute(VERSION_EVENT_ROWS_SQL)
+            cursor.execute(VW_EVENT_BY_VERSION_SQL)
+            cursor.execute(COMPARE_VERSIONS_SQL)
+            load_dimensions(cursor, dimensions, schema)
+            cursor.execute(f"SET search_path TO {wip_schema}")
+            cursor.execute(WIP_PIPELINE_DDL)
+            cursor.execute("RESET search_path")
+        conn.commit()
+
+
+def _record_ingest(results, stage, version_number, rows, timer, **extra):
+    entry = results.setdefault(stage, {'versions': [], 'seconds': 0.0, 'round_trips': 0})
+    entry['versions'].append(dict(
+        version=version_number, rows=rows, seconds=round(timer.seconds, 3), round_trips=timer.round_trips, **extra
+    ))
+    entry['seconds'] = round(entry['seconds'] + timer.seconds, 3)
+    entry['round_trips'] += timer.round_trips
+    total_rows = sum(version['rows'] for version in entry['versions'])
+    entry['rows_per_second'] = round(total_rows / entry['seconds'], 1) if entry['seconds'] else None
+
+
+def run_ingest(schema, dimensions, versions, stages):
+    """Load every version through each selected pipeline. Returns ({stage: ...}, bridge version ids)."""
+    from wip_process_staging_comp_venue_data import process_staging_data
+
+    results = {}
+    bridge_versions = []
+    for version_number, schedule in versions:
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"TRUNCATE {schema}.staging_event_session")
+                load_dataframe(cursor, schedule, f'{schema}.staging_event_session')
+                cursor.execute(f"ANALYZE {schema}.staging_event_session")
+                conn.commit()
+
+                if 'sql' in stages:
+                    with StageTimer() as timer:
+                        cursor.execute(f"SELECT {schema}.process_staging_event_session(%s)", (f'v{version_number}',))
+                        conn.commit()
+                    _record_ingest(results, 'sql', version_number, len(schedule), timer)
+
+                if 'bridge' in stages:
+                    with StageTimer() as timer:
+                        cursor.execute("""
+                            INSERT INTO dim_version (scenario_id, version_number, version_code, created_by)
+                            VALUES (1, %s, %s, 'benchmark') RETURNING version_id
+                        """, (version_number, f'V{version_number}'))
+                        version_id = cursor.fetchone()[0]
+                        cursor.execute(BRIDGE_INGEST_SQL.format(schema=schema, hash_key_sql=HASH_KEY_SQL),
+                                       {'version_id': version_id})
+                        conn.commit()
+                    bridge_versions.append(version_id)
+                    _record_ingest(results, 'bridge', version_number, len(schedule), timer, version_id=version_id)
+
+        if 'python' in stages:
+            wip_staging = to_wip_staging(schedule, dimensions)
+            with search_path(f'{schema}_wip'):
+                with connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute("TRUNCATE staging_event_session")
+                        load_dataframe(cursor, wip_staging, 'staging_event_session')
+                    conn.commit()
+                with StageTimer() as timer, contextlib.redirect_stdout(io.StringIO()):
+                    _, report = process_staging_data(f'v{version_number}', bulk=True)
+                _record_ingest(results, 'python', version_number, len(schedule), timer,
+                               phases={phase: stats['seconds'] for phase, stats in report.items()})
+
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"ANALYZE {schema}.fct_event_base, {schema}.fct_event_details, {schema}.version_event_bridge")
+        conn.commit()
+    return results, bridge_versions
+
+
+def run_diff(bridge_versions, repeats=3):
+    """compare_versions for every consecutive pair of versions (median of ``repeats``)."""
+    pairs = []
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            for previous, version in zip(bridge_versions, bridge_versions[1:]):
+                timings = []
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    cursor.execute("SELECT * FROM compare_versions(%s, %s)", (previous, version))
+                    changes = len(cursor.fetchall())
+                    timings.append((time.perf_counter() - start) * 1000)
+                pairs.append({'from': previous, 'to': version, 'changes': changes, 'ms': round(sorted(timings)[len(timings) // 2], 3)})
+        conn.rollback()
+    if not pairs:
+        return {'pairs': []}
+    return {'pairs': pairs, 'mean_ms': round(float(np.mean([pair['ms'] for pair in pairs])), 3)}
+
+
+def run_queries(bridge_versions, samples=100, seed=2032):
+    """Client-side latency (execute + fetch) of typical vw_event_by_version reads."""
+    rng = np.random.default_rng(seed)
+    results = {}
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT venue_id, day_id FROM fct_event_base")
+            venue_days = cursor.fetchall()
+            cursor.execute("SELECT max(event_id) FROM fct_event_base")
+            max_event_id = cursor.fetchone()[0]
+            for name, query in QUERIES.items():
+                timings = []
+                for _ in range(samples):
+                    venue_id, day_id = venue_days[int(rng.integers(0, len(venue_days)))]
+                    params = {'version_id': int(rng.choice(bridge_versions)), 'venue_id': venue_id, 'day_id': day_id,
+                              'event_id': int(rng.integers(1, max_event_id + 1))}
+                    start = time.perf_counter()
+                    cursor.execute(query, params)
+                    cursor.fetchall()
+                    timings.append((time.perf_counter() - start) * 1000)
+                results[name] = percentiles(timings)
+        conn.rollback()
+    return results
+
+
+def run_sizes(schema):
+    """Heap and index bytes per table; partitioned tables include all their partitions."""
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT n.nspname || '.' || c.relname,
+                       sum(pg_table_size(COALESCE(p.relid, c.oid))), sum(pg_indexes_size(COALESCE(p.relid, c.oid)))
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                -- pg_partition_tree is empty for plain tables
+                LEFT JOIN LATERAL pg_partition_tree(c.oid) p ON TRUE
+                WHERE n.nspname IN (%s, %s) AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+                GROUP BY 1
+                ORDER BY 1
+            """, (schema, f'{schema}_wip'))
+            sizes = {name: {'table_bytes': int(table), 'index_bytes': int(index)} for name, table, index in cursor.fetchall()}
+        conn.rollback()
+    return sizes
+
+
+def run_benchmark(sessions=5000, versions=5, churn_rate=0.05, seed=2032, stages=STAGES, query_samples=100,
+                  schema='pipeline_benchmark', keep=False):
+    """
+    Generate a synthetic schedule, load it version by version into throwaway schemas
+    (``schema`` and ``schema``_wip) and measure the selected stages. Returns the results dict.
+    """
+    results = {}
+    start = time.perf_counter()
+    dimensions = generate_dimensions(seed=seed)
+    schedule_versions = list(iter_schedule_versions(dimensions, sessions, versions, churn_rate, seed))
+    results['generate_seconds'] = round(time.perf_counter() - start, 3)
+
+    with search_path(schema):
+        setup_schemas(schema, dimensions)
+        try:
+            ingest, bridge_versions = run_ingest(schema, dimensions, schedule_versions, stages)
+            results['ingest'] = ingest
+            if 'diff' in stages and bridge_versions:
+                results['diff'] = run_diff(bridge_versions)
+            if 'query' in stages and bridge_versions:
+                results['query'] = run_queries(bridge_versions, query_samples, seed)
+            if 'sizes' in stages:
+                results['sizes'] = run_sizes(schema)
+        finally:
+            if not keep:
+                with connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; DROP SCHEMA IF EXISTS {schema}_wip CASCADE")
+                    conn.commit()
+    return results
+
+
+def headline_metrics(results):
+    """The numbers compared between runs: lower is better for all of them."""
+    metrics = {}
+    for stage, entry in results.get('ingest', {}).items():
+        metrics[f'ingest.{stage}.seconds'] = entry['seconds']
+    if results.get('diff', {}).get('mean_ms') is not None:
+        metrics['diff.mean_ms'] = results['diff']['mean_ms']
+    for name, stats in results.get('query', {}).items():
+        metrics[f'query.{name}.p95_ms'] = stats['p95_ms']
+    for name, sizes in results.get('sizes', {}).items():
+        metrics[f'size.{name.split(".", 1)[1]}.bytes'] = sizes['table_bytes'] + sizes['index_bytes']
+    return metrics
+
+
+def find_regressions(history, run, threshold=REGRESSION_THRESHOLD):
+    """Compare ``run`` with the latest earlier run that used the same settings."""
+    previous = next((entry for entry in reversed(history) if entry['config'] == run['config']), None)
+    if previous is None:
+        return None, []
+    before, after = headline_metrics(previous['results']), headline_metrics(run['results'])
+    regressions = [
+        {'metric': metric, 'before': before[metric], 'after': value, 'change': round(value / before[metric] - 1, 3)}
+        for metric, value in after.items()
+        if before.get(metric) and value > before[metric] * (1 + threshold)
+    ]
+    return previous, regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def append_history(path, run):
+    history = []
+    if os.path.exists(path):
+        with open(path) as history_file:
+            history = json.load(history_file)
+    previous, regressions = find_regressions(history, run)
+    run['regressions'] = regressions
+    history.append(run)
+    with open(path, 'w') as history_file:
+        json.dump(history, history_file, indent=2, default=str)
+    return previous, regressions
+
+
+def print_summary(results):
+    print(f"Generated in {results['generate_seconds']}s")
+    for stage, entry in results.get('ingest', {}).items():
+        print(f"  ingest {stage:<7} {entry['seconds']:>9.3f}s  {entry['rows_per_second']} rows/s, "
+              f"{entry['round_trips']} round trips over {len(entry['versions'])} versions")
+    if results.get('diff', {}).get('pairs'):
+        print(f"  compare_versions   mean {results['diff']['mean_ms']} ms over {len(results['diff']['pairs'])} pairs")
+    for name, stats in results.get('query', {}).items():
+        print(f"  query {name:<14} p50 {stats['p50_ms']:>8.3f}  p95 {stats['p95_ms']:>8.3f}  p99 {stats['p99_ms']:>8.3f} ms")
+    for name, sizes in results.get('sizes', {}).items():
+        print(f"  size {name:<45} table {sizes['table_bytes'] / 1024 / 1024:>8.2f} MB  "
+              f"indexes {sizes['index_bytes'] / 1024 / 1024:>8.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the versioning pipeline on a synthetic Games schedule.")
+    parser.add_argument('--sessions', type=int, default=5000)
+    parser.add_argument('--versions', type=int, default=5)
+    parser.add_argument('--churn-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=2032)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--query-samples', type=int, default=100)
+    parser.add_argument('--schema', default='pipeline_benchmark', help="Throwaway schema (dropped and recreated)")
+    parser.add_argument('--keep', action='store_true', help="Keep the benchmark schemas afterwards")
+    parser.add_argument('--history', default=DEFAULT_HISTORY_FILE, help="JSON file the run is appended to")
+    parser.add_argument('--label', help="Free-text note stored with the run")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    config = {'sessions': args.sessions, 'versions': args.versions, 'churn_rate': args.churn_rate,
+              'seed': args.seed, 'stages': sorted(args.stages), 'query_samples': args.query_samples}
+    results = run_benchmark(args.sessions, args.versions, args.churn_rate, args.seed, args.stages,
+                            args.query_samples, args.schema, args.keep)
+    run = {'run_at': datetime.now().isoformat(timespec='seconds'), 'label': args.label, 'git_commit': _git_commit(),
+           'config': config, 'results': results}
+    print_summary(results)
+
+    previous, regressions = append_history(args.history, run)
+    if previous is None:
+        print(f"No earlier run with these settings in {args.history}")
+    else:
+        print(f"Compared with the run of {previous['run_at']} ({previous['git_commit']}): "
+              f"{len(regressions)} regression(s) over {REGRESSION_THRESHOLD:.0%}")
+        for regression in regressions:
+            print(f"  {regression['metric']}: {regression['before']} -> {regression['after']} (+{regression['change']:.0%})")
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
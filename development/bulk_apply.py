@@ -0,0 +1,237 @@
+import io
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from audit_writer import to_json
+
+OPEN_VALID_TO = '9999-12-31 23:59:59'
+
+# Event columns carried from staging into fct_event_session
+EVENT_VALUE_COLUMNS = [
+    'sport_id', 'venue_id', 'day_id', 'session_id', 'competition_type', 'event_date', 'start_time', 'end_time',
+    'date_start', 'date_end', 'event_type', 'gross_seats', 'seat_kill', 'est_ticket_sold', 'net_seats', 'est_sold_seats',
+    'workforce_count', 'additional_attributes'
+]
+
+BULK_ROW_COLUMNS = ['hash_key'] + EVENT_VALUE_COLUMNS + [
+    'old_event_session_id', 'old_schedule_version_id', 'old_version_array',
+    'change_type', 'changed_fields', 'previous_values'
+]
+BULK_EXPIRY_COLUMNS = ['event_session_id', 'schedule_version_id', 'previous_values']
+
+
+def _to_pg_array(value):
+    if value is None or (not isinstance(value, (list, tuple)) and pd.isna(value)):
+        return None
+    return '{' + ','.join('"{}"'.format(str(item).replace('"', '\\"')) for item in value) + '}'
+
+
+def _prepare_for_copy(df):
+    # COPY (FORMAT csv) reads an unquoted empty field as NULL, so only values that
+    # to_csv cannot render the way PostgreSQL expects need converting up front.
+    prepared = df.copy()
+    for column in prepared.columns:
+        series = prepared[column]
+        if series.dtype == object:
+            sample = series.dropna()
+            sample = sample.iloc[0] if len(sample) else None
+            if isinstance(sample, (list, tuple)):
+                prepared[column] = series.map(_to_pg_array)
+            elif isinstance(sample, dict):
+                # As AuditWriter writes them: NaN/NA become null, which JSONB accepts
+                prepared[column] = series.map(lambda value: to_json(value) if isinstance(value, dict) else None)
+        elif pd.api.types.is_float_dtype(series):
+            # Integer columns come back from merges as float64 once a NaN is present
+            non_null = series.dropna()
+            if len(non_null) and (non_null % 1 == 0).all():
+                prepared[column] = series.astype('Int64')
+    return prepared
+
+
+def copy_dataframe(cursor, df, table, columns):
+    """Stream ``df[columns]`` into ``table`` with a single COPY FROM STDIN."""
+    buffer = io.StringIO()
+    _prepare_for_copy(df[columns]).to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    cursor.copy_expert(
+        "COPY {} ({}) FROM STDIN WITH (FORMAT csv)".format(table, ', '.join(columns)),
+        buffer
+    )
+    return len(df)
+
+
+def copy_change_batch(cursor, inserts_df, updates_df, deletes_df, rows_table='bulk_event_rows',
+                      expiries_table='bulk_event_expiries', **tags):
+    """
+    COPY one batch of changes into the bulk_event_rows / bulk_event_expiries temp tables,
+    or tables of the same shape; ``tags`` are constant leading columns such as a run id.
+    """
+    new_rows = pd.concat([
+        inserts_df.assign(change_type='INSERT'),
+        updates_df.rename(columns={
+            'event_session_id': 'old_event_session_id',
+            'schedule_version_id': 'old_schedule_version_id',
+            'version_array': 'old_version_array'
+        }).assign(change_type='UPDATE')
+    ], ignore_index=True).reindex(columns=BULK_ROW_COLUMNS)
+    expiries = deletes_df.reindex(columns=BULK_EXPIRY_COLUMNS)
+    tag_columns = list(tags)
+    return (
+        copy_dataframe(cursor, new_rows.assign(**tags), rows_table, tag_columns + BULK_ROW_COLUMNS)
+        + copy_dataframe(cursor, expiries.assign(**tags), expiries_table, tag_columns + BULK_EXPIRY_COLUMNS)
+    )
+
+
+def apply_staged_changes(cursor, schedule_version_id, run_timestamp, rows='bulk_event_rows',
+                         expiries='bulk_event_expiries'):
+    """
+    Steps 4-6 of apply_changes_bulk: expire, insert and audit from staged change rows.
+    ``rows`` and ``expiries`` are relations with exactly the BULK_ROW_COLUMNS /
+    BULK_EXPIRY_COLUMNS: a table, or a parenthesised SELECT of those columns. Returns
+    {phase: {'rows', 'seconds'}}; nothing is committed.
+    """
+    report = {}
+
+    def timed(phase, func):
+        start = time.perf_counter()
+        rows_done = func()
+        report[phase] = {'rows': rows_done, 'seconds': round(time.perf_counter() - start, 3)}
+        return rows_done
+
+    # Step 4: Expire replaced and deleted rows
+    def expire():
+        cursor.execute("""
+            UPDATE fct_event_session f
+            SET is_current = FALSE, valid_to = %s
+            FROM {rows} r
+            WHERE r.change_type = 'UPDATE'
+            AND f.event_session_id = r.old_event_session_id
+        """.format(rows=rows), (run_timestamp,))
+        expired = cursor.rowcount
+        cursor.execute("""
+            UPDATE fct_event_session f
+            SET is_current = FALSE, valid_to = %s, current_version_id = %s,
+                version_array = array_append(f.version_array, %s)
+            FROM {expiries} d
+            WHERE f.event_session_id = d.event_session_id
+        """.format(expiries=expiries), (run_timestamp, schedule_version_id, schedule_version_id))
+        return expired + cursor.rowcount
+    timed('expire', expire)
+
+    # Step 5: Insert new and replacement rows
+    def insert():
+        cursor.execute("""
+            INSERT INTO fct_event_session (
+                hash_key, schedule_version_id, current_version_id, version_array, {value_columns},
+                valid_from, valid_to, is_current
+            )
+            SELECT hash_key, %(version_id)s, %(version_id)s,
+                   array_append(COALESCE(old_version_array, '{{}}'), %(version_id)s), {value_columns},
+                   %(valid_from)s, %(valid_to)s, TRUE
+            FROM {rows} r
+        """.format(value_columns=', '.join(EVENT_VALUE_COLUMNS), rows=rows), {
+            'version_id': schedule_version_id, 'valid_from': run_timestamp, 'valid_to': OPEN_VALID_TO
+        })
+        return cursor.rowcount
+    timed('insert', insert)
+
+    # Step 6: Audit every change in one statement
+    def audit():
+        cursor.execute("""
+            INSERT INTO event_audit (
+                event_session_id, schedule_version_id, change_type, changed_fields, previous_values, change_timestamp
+            )
+            SELECT NULL, %(version_id)s, 'INSERT',
+                   to_jsonb(r) - ARRAY['old_event_session_id', 'old_schedule_version_id', 'old_version_array',
+                                       'change_type', 'changed_fields', 'previous_values'],
+                   NULL, %(ts)s
+            FROM {rows} r
+            WHERE r.change_type = 'INSERT'
+            UNION ALL
+            SELECT old_event_session_id, old_schedule_version_id, 'UPDATE', changed_fields, previous_values, %(ts)s
+            FROM {rows} u
+            WHERE change_type = 'UPDATE'
+            UNION ALL
+            SELECT event_session_id, schedule_version_id, 'DELETE', NULL, previous_values, %(ts)s
+            FROM {expiries} d
+        """.format(rows=rows, expiries=expiries), {'version_id': schedule_version_id, 'ts': run_timestamp})
+        return cursor.rowcount
+    timed('audit', audit)
+
+    return report
+
+
+def apply_changes_bulk(conn, new_version_number, change_batches):
+    """
+    Apply computed change sets to fct_event_session in one transaction.
+
+    change_batches is an iterable of (inserts_df, updates_df, deletes_df) tuples:
+    inserts_df: hash_key + EVENT_VALUE_COLUMNS for new events
+    updates_df: hash_key + EVENT_VALUE_COLUMNS + event_session_id, schedule_version_id,
+                version_array of the row being replaced + changed_fields, previous_values
+    deletes_df: event_session_id, schedule_version_id, previous_values of rows to expire
+    Batches are COPYed as they arrive, so a generator that reads from ``conn`` keeps
+    client memory bounded by its batch size.
+
+    Returns the new schedule_version_id and a per-phase report of row counts and timings.
+    Nothing is committed unless every phase succeeds.
+    """
+    report = {}
+    run_timestamp = datetime.now()
+
+    try:
+        with conn.cursor() as cursor:
+            # Step 1: Create new schedule version
+            cursor.execute("""
+                INSERT INTO dim_schedule_version (version_number, valid_from, valid_to)
+                VALUES (%s, %s, %s) RETURNING schedule_version_id
+            """, (new_version_number, run_timestamp, OPEN_VALID_TO))
+            schedule_version_id = cursor.fetchone()[0]
+
+            # Step 2: Temp tables typed from the fact table, dropped at commit
+            cursor.execute("""
+                CREATE TEMP TABLE bulk_event_rows ON COMMIT DROP AS
+                SELECT hash_key, {value_columns},
+                       event_session_id AS old_event_session_id,
+                       schedule_version_id AS old_schedule_version_id,
+                       version_array AS old_version_array,
+                       NULL::VARCHAR(10) AS change_type,
+                       NULL::JSONB AS changed_fields,
+                       NULL::JSONB AS previous_values
+                FROM fct_event_session WITH NO DATA;
+
+                CREATE TEMP TABLE bulk_event_expiries ON COMMIT DROP AS
+                SELECT event_session_id, schedule_version_id, NULL::JSONB AS previous_values
+                FROM fct_event_session WITH NO DATA;
+            """.format(value_columns=', '.join(EVENT_VALUE_COLUMNS)))
+
+            # Step 3: COPY the change sets in, timing the batch producer separately
+            counts = {'inserts': 0, 'updates': 0, 'deletes': 0, 'batches': 0}
+            copy_seconds = 0.0
+            loop_start = time.perf_counter()
+            for inserts_df, updates_df, deletes_df in change_batches:
+                start = time.perf_counter()
+                copy_change_batch(cursor, inserts_df, updates_df, deletes_df)
+                copy_seconds += time.perf_counter() - start
+                counts['inserts'] += len(inserts_df)
+                counts['updates'] += len(updates_df)
+                counts['deletes'] += len(deletes_df)
+                counts['batches'] += 1
+            report['diff'] = {'rows': None, 'seconds': round(time.perf_counter() - loop_start - copy_seconds, 3)}
+            report['copy'] = dict(
+                rows=counts['inserts'] + counts['updates'] + counts['deletes'], seconds=round(copy_seconds, 3), **counts
+            )
+
+            # Steps 4-6: Expire, insert and audit from the temp tables
+            report.update(apply_staged_changes(cursor, schedule_version_id, run_timestamp))
+
+        start = time.perf_counter()
+        conn.commit()
+        report['commit'] = {'rows': None, 'seconds': round(time.perf_counter() - start, 3)}
+    except Exception:
+        conn.rollback()
+        raise
+
+    return schedule_version_id, report
@@ -0,0 +1,154 @@
+import argparse
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+# Identity and SCD bookkeeping columns; a difference in these is not an event change
+IGNORED_COLUMNS = {
+    'hash_key', 'event_session_id', 'record_id', 'schedule_version_id', 'current_version_id', 'version_id',
+    'version_array', 'valid_from', 'valid_to', 'is_current', 'created_at', 'created_by', 'updated_at', 'updated_by'
+}
+
+# Numeric values closer than this are equal (NUMERIC(5, 2) Decimals against float64)
+NUMERIC_TOLERANCE = 1e-9
+
+NUMERIC_INFERRED_TYPES = {'integer', 'floating', 'mixed-integer-float', 'decimal'}
+
+
+def paired_columns(df, old_suffix='_old', new_suffix='_new', ignore=IGNORED_COLUMNS):
+    """Base names that have both an ``old_suffix`` and a ``new_suffix`` column in ``df``, minus ``ignore``."""
+    columns = set(df.columns)
+    return [
+        column[:-len(old_suffix)] for column in df.columns
+        if column.endswith(old_suffix) and column[:-len(old_suffix)] + new_suffix in columns
+        and column[:-len(old_suffix)] not in ignore
+    ]
+
+
+def _is_numeric(series):
+    if pd.api.types.is_bool_dtype(series):
+        return False
+    if pd.api.types.is_numeric_dtype(series):
+        return True
+    return pd.api.types.infer_dtype(series, skipna=True) in NUMERIC_INFERRED_TYPES
+
+
+def _is_datetime(series):
+    return pd.api.types.is_datetime64_any_dtype(series)
+
+
+def column_changed(old, new, tolerance=NUMERIC_TOLERANCE):
+    """
+    Boolean array, True where ``old`` and ``new`` differ. Two nulls (None, NaN, NaT, <NA>)
+    are equal and a null never equals a value. Numeric columns (ints, floats, Decimals)
+    compare within ``tolerance``; everything else compares with ==.
+    """
+    old_na = old.isna().to_numpy()
+    new_na = new.isna().to_numpy()
+    either_na = old_na | new_na
+
+    if _is_numeric(old) and _is_numeric(new):
+        old_values = pd.to_numeric(old, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        new_values = pd.to_numeric(new, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        equal = np.isclose(old_values, new_values, rtol=0, atol=tolerance)
+    elif _is_datetime(old) or _is_datetime(new):
+        equal = (pd.to_datetime(old, errors='coerce').to_numpy() == pd.to_datetime(new, errors='coerce').to_numpy())
+    else:
+        # Nulls become None so the element-wise comparison never sees NaN or <NA>
+        old_values = old.astype(object).where(~old_na, None).to_numpy()
+        new_values = new.astype(object).where(~new_na, None).to_numpy()
+        equal = np.fromiter((a == b for a, b in zip(old_values, new_values)), dtype=bool, count=len(old_values))
+
+    return np.where(either_na, old_na != new_na, ~equal)
+
+
+def change_mask(df, columns=None, old_suffix='_old', new_suffix='_new', tolerance=NUMERIC_TOLERANCE):
+    """
+    One boolean column per compared field, True where the row's ``<field>_old`` and
+    ``<field>_new`` values differ. Columns are paired by name, never by position;
+    ``columns`` defaults to every paired, non-bookkeeping field.
+    """
+    if columns is None:
+        columns = paired_columns(df, old_suffix, new_suffix)
+    return pd.DataFrame(
+        {column: column_changed(df[column + old_suffix], df[column + new_suffix], tolerance) for column in columns},
+        index=df.index, columns=columns
+    )
+
+
+def _plain_values(series):
+    # Python scalars for the audit JSON; nulls become None
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def changed_fields(df, mask, old_suffix='_old', new_suffix='_new'):
+    """
+    Compact per-row changes for the rows of ``mask`` with at least one True: a DataFrame
+    indexed like ``df`` with ``changed_fields`` ({field: new value}) and
+    ``previous_values`` ({field: old value}) dicts holding only the fields that changed.
+    """
+    changed_rows = mask.any(axis=1).to_numpy()
+    row_index = df.index[changed_rows]
+    mask = mask[changed_rows]
+    new_fields = [{} for _ in range(len(row_index))]
+    old_fields = [{} for _ in range(len(row_index))]
+
+    # Work is proportional to the number of changed cells, not rows x columns
+    for column in mask.columns:
+        positions = np.flatnonzero(mask[column].to_numpy())
+        if not len(positions):
+            continue
+        rows = row_index[positions]
+        new_values = _plain_values(df.loc[rows, column + new_suffix])
+        old_values = _plain_values(df.loc[rows, column + old_suffix])
+        for position, new_value, old_value in zip(positions, new_values, old_values):
+            new_fields[position][column] = new_value
+            old_fields[position][column] = old_value
+
+    return pd.DataFrame({'changed_fields': new_fields, 'previous_values': old_fields}, index=row_index)
+
+
+def detect_changes(df, columns=None, old_suffix='_old', new_suffix='_new', tolerance=NUMERIC_TOLERANCE):
+    """Compare a merged old/new DataFrame in one pass; see change_mask and changed_fields."""
+    mask = change_mask(df, columns, old_suffix, new_suffix, tolerance)
+    return changed_fields(df, mask, old_suffix, new_suffix)
+
+
+def _synthetic_updates(rows, change_rate):
+    # A merged update set shaped like identify_changes' output, with Decimal seat_kill on the old side
+    rng = np.random.default_rng(2032)
+    old = pd.DataFrame({
+        'event_session_id': np.arange(rows),
+        'sport_id': rng.integers(1, 50, rows),
+        'venue_id': rng.integers(1, 40, rows),
+        'event_date': pd.Timestamp('2032-07-23') + pd.to_timedelta(rng.integers(0, 17, rows), unit='D'),
+        'event_type': rng.choice(['Heat', 'Final', 'Semi-final'], rows),
+        'gross_seats': rng.integers(1000, 80000, rows),
+        'seat_kill': [Decimal(f'{value:.2f}') for value in rng.uniform(0, 20, rows)],
+        'additional_attributes': [{'broadcast': bool(value)} for value in rng.integers(0, 2, rows)]
+    })
+    new = old.drop(columns='event_session_id').copy()
+    new['seat_kill'] = new['seat_kill'].astype(float)
+    changed = rng.random(rows) < change_rate
+    new.loc[changed, 'gross_seats'] += 100
+    new.loc[rng.random(rows) < change_rate, 'event_type'] = 'Final'
+    return pd.concat([old.add_suffix('_old'), new.add_suffix('_new')], axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time vectorized change detection on a synthetic update set.")
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--change-rate', type=float, default=0.2)
+    args = parser.parse_args()
+
+    df = _synthetic_updates(args.rows, args.change_rate)
+    start = time.perf_counter()
+    changes = detect_changes(df)
+    elapsed = time.perf_counter() - start
+    print(f"{len(changes)} of {len(df)} rows changed, compared in {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
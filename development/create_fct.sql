@@ -59,9 +59,9 @@ END;
 $$ LANGUAGE plpgsql;
 
 
-"""
+/*
 Instead of duplicating data or relying on arrays, let's create a more normalized structure that explicitly maps events to versions and scenarios:
-"""
+*/
 -- Create fct_event_base table
 -- This table will store the core event properties that rarely change
 CREATE TABLE IF NOT EXISTS fct_event_base (
@@ -158,9 +158,10 @@ CREATE TABLE IF NOT EXISTS dim_version (
 -- Version-Event Bridge Table
 -- This table maps events to versions and scenarios
 -- It also stores version-specific metadata and tracks active/inactive events
+-- Partitioned by version_id so version-scoped reads only touch that version's rows
 CREATE TABLE IF NOT EXISTS version_event_bridge (
-    bridge_id SERIAL PRIMARY KEY,
-    version_id INTEGER REFERENCES dim_version(version_id),
+    bridge_id SERIAL,
+    version_id INTEGER NOT NULL REFERENCES dim_version(version_id),
     event_id INTEGER REFERENCES fct_event_base(event_id),
     detail_id INTEGER REFERENCES fct_event_details(detail_id),
     
@@ -169,57 +170,106 @@ CREATE TABLE IF NOT EXISTS version_event_bridge (
     added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     added_by VARCHAR(50),
     
+    -- The partition key has to be part of the primary key
+    PRIMARY KEY (bridge_id, version_id),
+    
     -- Each event can only have one set of details in each version
     UNIQUE(version_id, event_id)
-);
+) PARTITION BY LIST (version_id);
 
--- View to simplify querying events by version
--- This view joins the bridge table with the event base and details tables
-CREATE OR REPLACE VIEW vw_event_by_version AS
-SELECT 
-    v.scenario_id,
-    v.version_id,
-    v.version_code,
-    s.scenario_name,
-    b.event_id,
-    eb.hash_key,
-    eb.sport_id,
-    eb.venue_id,
-    eb.subvenue_id,
-    eb.region_id,
-    eb.zone_id,
-    eb.cluster_id,
-    eb.day_id,
-    eb.session_id,
-    eb.competition_type,
-    eb.event_type,
-    ed.date_start,
-    ed.start_time,
-    ed.date_end,
-    ed.end_time,
-    ed.gross_seats,
-    ed.seat_kill,
-    ed.est_pct_ticksold,
-    ed.net_seats,
-    ed.est_sold_seats,
-    ed.workforce,
-    ed.unticketed,
-    ed.additional_attributes,
-    b.is_active
-FROM 
-    version_event_bridge b
-JOIN dim_version v ON b.version_id = v.version_id
-JOIN dim_scenario s ON v.scenario_id = s.scenario_id
-JOIN fct_event_base eb ON b.event_id = eb.event_id
-JOIN fct_event_details ed ON b.detail_id = ed.detail_id;
+-- No DEFAULT partition: every version gets its own partition before any of its bridge rows are written.
+-- A DEFAULT partition would have to be scanned (and locked) each time a partition is added,
+-- and adding one fails once rows for that version_id have landed in it.
+-- Installs that still have one keep it only while it holds rows.
+DO $$
+DECLARE
+    v_has_rows BOOLEAN;
+BEGIN
+    IF to_regclass('version_event_bridge_default') IS NOT NULL THEN
+        EXECUTE 'SELECT EXISTS (SELECT 1 FROM version_event_bridge_default)' INTO v_has_rows;
+        IF NOT v_has_rows THEN
+            DROP TABLE version_event_bridge_default;
+        END IF;
+    END IF;
+END;
+$$;
+
+-- Creating a partition locks version_event_bridge for a moment, so partitions for upcoming
+-- version_ids are created ahead of time (see create_version_partitions); this trigger
+-- only creates one when a version arrives that was not provided for
+CREATE OR REPLACE FUNCTION create_version_event_bridge_partition()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF to_regclass('version_event_bridge_v' || NEW.version_id) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF version_event_bridge FOR VALUES IN (%s)',
+            'version_event_bridge_v' || NEW.version_id, NEW.version_id
+        );
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create bridge and OBT partitions for every existing version that lacks one and for the next
+-- p_ahead values of the dim_version sequence. Run it off-peak; returns the number created.
+CREATE OR REPLACE FUNCTION create_version_partitions(
+    p_ahead INTEGER DEFAULT 50
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_next INTEGER;
+    v_version_id INTEGER;
+    v_parent TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    EXECUTE format(
+        'SELECT last_value + CASE WHEN is_called THEN 1 ELSE 0 END FROM %s',
+        pg_get_serial_sequence('dim_version', 'version_id')
+    ) INTO v_next;
+
+    FOR v_version_id IN
+        SELECT version_id FROM dim_version
+        UNION
+        SELECT generate_series(v_next, v_next + p_ahead - 1)
+        ORDER BY 1
+    LOOP
+        -- obt_event_by_version is partitioned the same way, when it exists
+        FOREACH v_parent IN ARRAY ARRAY['version_event_bridge', 'obt_event_by_version'] LOOP
+            IF to_regclass(v_parent) IS NOT NULL AND to_regclass(v_parent || '_v' || v_version_id) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES IN (%s)',
+                    v_parent || '_v' || v_version_id, v_parent, v_version_id
+                );
+                v_created := v_created + 1;
+            END IF;
+        END LOOP;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS create_bridge_partition ON dim_version;
+CREATE TRIGGER create_bridge_partition
+AFTER INSERT ON dim_version
+FOR EACH ROW EXECUTE FUNCTION create_version_event_bridge_partition();
+
+-- Covering index for vw_event_by_version and compare_versions (version-scoped, active rows)
+CREATE INDEX IF NOT EXISTS idx_bridge_version_active
+    ON version_event_bridge (version_id, is_active, event_id) INCLUDE (detail_id);
+CREATE INDEX IF NOT EXISTS idx_bridge_event ON version_event_bridge (event_id);
+CREATE INDEX IF NOT EXISTS idx_event_details_event ON fct_event_details (event_id);
 
 -- Function to process events for a specific version
 -- This function will insert or update events and details based on the staging data
 -- It will also deactivate events that are not present in the current version
+-- With p_storage = 'DELTA' no bridge rows are written: the version's (event_id, detail_id)
+-- set is recorded against the previous version of the scenario in delta storage instead
 CREATE OR REPLACE FUNCTION process_events_for_version(
     p_scenario_id INTEGER,
     p_version_id INTEGER,
-    p_creator VARCHAR(50)
+    p_creator VARCHAR(50),
+    p_storage VARCHAR(10) DEFAULT 'BRIDGE',
+    p_snapshot_interval INTEGER DEFAULT 10
 )
 RETURNS INTEGER AS $$
 DECLARE
@@ -229,7 +279,15 @@ DECLARE
     v_source_version_id INTEGER := NULL;
     v_event_id INTEGER;
     v_detail_id INTEGER;
+    event_rec RECORD;
+    v_event_ids INTEGER[] := '{}';
+    v_detail_ids INTEGER[] := '{}';
+    v_parent_version_id INTEGER;
 BEGIN
+    IF p_storage NOT IN ('BRIDGE', 'DELTA') THEN
+        RAISE EXCEPTION 'Unknown storage %, expected BRIDGE or DELTA', p_storage;
+    END IF;
+
     -- Get scenario and version info
     SELECT scenario_name INTO v_scenario_name
     FROM dim_scenario
@@ -313,7 +371,7 @@ BEGIN
         
         -- If details don't exist, create them
         IF v_detail_id IS NULL THEN
-            INSERT INTO event_details (
+            INSERT INTO fct_event_details (
                 event_id, date_start, start_time, date_end, end_time,
                 gross_seats, seat_kill, est_pct_ticksold, net_seats,
                 est_sold_seats, workforce, unticketed, additional_attributes
@@ -326,38 +384,55 @@ BEGIN
             ) RETURNING detail_id INTO v_detail_id;
         END IF;
         
-        -- Add or update the bridge record for this version
-        INSERT INTO version_event_bridge (
-            version_id, event_id, detail_id, is_active, added_by
-        ) VALUES (
-            p_version_id, v_event_id, v_detail_id, TRUE, p_creator
-        )
-        ON CONFLICT (version_id, event_id)
-        DO UPDATE SET 
-            detail_id = EXCLUDED.detail_id,
-            is_active = TRUE;
+        v_event_ids := v_event_ids || v_event_id;
+        v_detail_ids := v_detail_ids || v_detail_id;
+
+        IF p_storage = 'BRIDGE' THEN
+            -- Add or update the bridge record for this version
+            INSERT INTO version_event_bridge (
+                version_id, event_id, detail_id, is_active, added_by
+            ) VALUES (
+                p_version_id, v_event_id, v_detail_id, TRUE, p_creator
+            )
+            ON CONFLICT (version_id, event_id)
+            DO UPDATE SET 
+                detail_id = EXCLUDED.detail_id,
+                is_active = TRUE;
+        END IF;
             
         v_count := v_count + 1;
     END LOOP;
+
+    IF p_storage = 'DELTA' THEN
+        -- Last staging row per event wins, as the bridge upsert above does
+        SELECT COALESCE(array_agg(d.event_id ORDER BY d.event_id), '{}'),
+               COALESCE(array_agg(d.detail_id ORDER BY d.event_id), '{}')
+        INTO v_event_ids, v_detail_ids
+        FROM (
+            SELECT DISTINCT ON (i.event_id) i.event_id, i.detail_id
+            FROM unnest(v_event_ids, v_detail_ids) WITH ORDINALITY AS i(event_id, detail_id, position)
+            ORDER BY i.event_id, i.position DESC
+        ) d;
+
+        -- The previous version of the same scenario is the parent, as version_delta.py migrate uses
+        SELECT version_id INTO v_parent_version_id
+        FROM dim_version
+        WHERE scenario_id = p_scenario_id AND version_number < v_version_number
+        ORDER BY version_number DESC
+        LIMIT 1;
+
+        -- Events of the parent missing from staging are recorded as REMOVED
+        PERFORM record_version_changes(
+            p_version_id, v_parent_version_id, v_event_ids, v_detail_ids, TRUE, p_snapshot_interval
+        );
+        RETURN v_count;
+    END IF;
     
     -- Optionally, deactivate events not in the current version
     UPDATE version_event_bridge
     SET is_active = FALSE
     WHERE version_id = p_version_id
-    AND event_id NOT IN (
-        SELECT eb.event_id
-        FROM event_base eb
-        JOIN staging_event_session e ON 
-            md5(
-                COALESCE(e.venue_id::TEXT, 'NULL') || '-' ||
-                COALESCE(e.sport_id::TEXT, 'NULL') || '-' ||
-                COALESCE(e.day_id::TEXT, 'NULL') || '-' ||
-                e.session_id::TEXT || '-' ||
-                e.competition_type::TEXT || '-' ||
-                e.event_type::TEXT || '-' ||
-                to_char(e.date_start, 'YYYY-MM-DD')
-            ) = eb.hash_key
-    );
+    AND event_id <> ALL (v_event_ids);
     
     RETURN v_count;
 END;
@@ -377,66 +452,717 @@ CREATE OR REPLACE FUNCTION compare_versions(
 ) AS $$
 BEGIN
     RETURN QUERY
-    WITH v1 AS (
-        SELECT 
-            b.event_id, 
-            e.hash_key,
-            e.sport_id, e.venue_id, e.subvenue_id, e.region_id, e.zone_id, 
-            e.cluster_id, e.day_id, e.session_id, e.competition_type, e.event_type,
-            d.date_start, d.start_time, d.end_time, d.date_end, 
-            d.gross_seats, d.seat_kill, d.est_pct_ticksold, d.net_seats, 
-            d.est_sold_seats, d.workforce, d.unticketed,
-            d.detail_id
-        FROM version_event_bridge b
-        JOIN fct_event_base e ON b.event_id = e.event_id
-        JOIN fct_event_details d ON b.detail_id = d.detail_id
-        WHERE b.version_id = p_version_id1
+    -- Details are immutable per detail_id, so the (event_id, detail_id) pairs found in only
+    -- one of the two versions are exactly the changed events. Flags rather than a row count,
+    -- so comparing a version with itself finds no changes.
+    WITH pairs AS (
+        SELECT
+            b.event_id,
+            b.detail_id,
+            bool_or(b.version_id = p_version_id1) AS in_old,
+            bool_or(b.version_id = p_version_id2) AS in_new
+        FROM vw_version_event_rows b
+        WHERE b.version_id IN (p_version_id1, p_version_id2)
         AND b.is_active = TRUE
+        GROUP BY b.event_id, b.detail_id
     ),
-    v2 AS (
+    symmetric_difference AS (
+        SELECT p.event_id, p.detail_id, p.in_old
+        FROM pairs p
+        WHERE p.in_old <> p.in_new
+    ),
+    changed AS (
         SELECT 
-            b.event_id, 
-            e.hash_key,
-            e.sport_id, e.venue_id, e.subvenue_id, e.region_id, e.zone_id, 
-            e.cluster_id, e.day_id, e.session_id, e.competition_type, e.event_type,
-            d.date_start, d.start_time, d.end_time, d.date_end, 
-            d.gross_seats, d.seat_kill, d.est_pct_ticksold, d.net_seats, 
-            d.est_sold_seats, d.workforce, d.unticketed,
-            d.detail_id
-        FROM version_event_bridge b
-        JOIN fct_event_base e ON b.event_id = e.event_id
-        JOIN fct_event_details d ON b.detail_id = d.detail_id
-        WHERE b.version_id = p_version_id2
-        AND b.is_active = TRUE
+            sd.event_id,
+            max(sd.detail_id) FILTER (WHERE sd.in_old) AS old_detail_id,
+            max(sd.detail_id) FILTER (WHERE NOT sd.in_old) AS new_detail_id
+        FROM symmetric_difference sd
+        GROUP BY sd.event_id
     )
     SELECT 
-        COALESCE(v1.event_id, v2.event_id),
-        COALESCE(v1.hash_key, v2.hash_key),
+        c.event_id,
+        e.hash_key,
         CASE 
-            WHEN v1.event_id IS NULL THEN 'ADDED' 
-            WHEN v2.event_id IS NULL THEN 'REMOVED'
-            WHEN v1.detail_id != v2.detail_id THEN 'MODIFIED'
-            ELSE 'UNCHANGED'
-        END AS change_type,
+            WHEN c.old_detail_id IS NULL THEN 'ADDED' 
+            WHEN c.new_detail_id IS NULL THEN 'REMOVED'
+            ELSE 'MODIFIED'
+        END::VARCHAR(20) AS change_type,
         CASE
-            WHEN v1.event_id IS NULL OR v2.event_id IS NULL THEN NULL
-            WHEN v1.detail_id = v2.detail_id THEN NULL
+            WHEN c.old_detail_id IS NULL OR c.new_detail_id IS NULL THEN NULL
             ELSE jsonb_strip_nulls(jsonb_build_object(
-                'date_start', CASE WHEN v1.date_start IS DISTINCT FROM v2.date_start THEN jsonb_build_object('old', v1.date_start, 'new', v2.date_start) ELSE NULL END,
-                'start_time', CASE WHEN v1.start_time IS DISTINCT FROM v2.start_time THEN jsonb_build_object('old', v1.start_time, 'new', v2.start_time) ELSE NULL END,
-                'date_end', CASE WHEN v1.date_end IS DISTINCT FROM v2.date_end THEN jsonb_build_object('old', v1.date_end, 'new', v2.date_end) ELSE NULL END,
-                'end_time', CASE WHEN v1.end_time IS DISTINCT FROM v2.end_time THEN jsonb_build_object('old', v1.end_time, 'new', v2.end_time) ELSE NULL END,
-                'gross_seats', CASE WHEN v1.gross_seats IS DISTINCT FROM v2.gross_seats THEN jsonb_build_object('old', v1.gross_seats, 'new', v2.gross_seats) ELSE NULL END,
-                'seat_kill', CASE WHEN v1.seat_kill IS DISTINCT FROM v2.seat_kill THEN jsonb_build_object('old', v1.seat_kill, 'new', v2.seat_kill) ELSE NULL END,
-                'est_pct_ticksold', CASE WHEN v1.est_pct_ticksold IS DISTINCT FROM v2.est_pct_ticksold THEN jsonb_build_object('old', v1.est_pct_ticksold, 'new', v2.est_pct_ticksold) ELSE NULL END,
-                'net_seats', CASE WHEN v1.net_seats IS DISTINCT FROM v2.net_seats THEN jsonb_build_object('old', v1.net_seats, 'new', v2.net_seats) ELSE NULL END,
-                'est_sold_seats', CASE WHEN v1.est_sold_seats IS DISTINCT FROM v2.est_sold_seats THEN jsonb_build_object('old', v1.est_sold_seats, 'new', v2.est_sold_seats) ELSE NULL END,
-                'workforce', CASE WHEN v1.workforce IS DISTINCT FROM v2.workforce THEN jsonb_build_object('old', v1.workforce, 'new', v2.workforce) ELSE NULL END,
-                'unticketed', CASE WHEN v1.unticketed IS DISTINCT FROM v2.unticketed THEN jsonb_build_object('old', v1.unticketed, 'new', v2.unticketed) ELSE NULL END
+                'date_start', CASE WHEN d1.date_start IS DISTINCT FROM d2.date_start THEN jsonb_build_object('old', d1.date_start, 'new', d2.date_start) ELSE NULL END,
+                'start_time', CASE WHEN d1.start_time IS DISTINCT FROM d2.start_time THEN jsonb_build_object('old', d1.start_time, 'new', d2.start_time) ELSE NULL END,
+                'date_end', CASE WHEN d1.date_end IS DISTINCT FROM d2.date_end THEN jsonb_build_object('old', d1.date_end, 'new', d2.date_end) ELSE NULL END,
+                'end_time', CASE WHEN d1.end_time IS DISTINCT FROM d2.end_time THEN jsonb_build_object('old', d1.end_time, 'new', d2.end_time) ELSE NULL END,
+                'gross_seats', CASE WHEN d1.gross_seats IS DISTINCT FROM d2.gross_seats THEN jsonb_build_object('old', d1.gross_seats, 'new', d2.gross_seats) ELSE NULL END,
+                'seat_kill', CASE WHEN d1.seat_kill IS DISTINCT FROM d2.seat_kill THEN jsonb_build_object('old', d1.seat_kill, 'new', d2.seat_kill) ELSE NULL END,
+                'est_pct_ticksold', CASE WHEN d1.est_pct_ticksold IS DISTINCT FROM d2.est_pct_ticksold THEN jsonb_build_object('old', d1.est_pct_ticksold, 'new', d2.est_pct_ticksold) ELSE NULL END,
+                'net_seats', CASE WHEN d1.net_seats IS DISTINCT FROM d2.net_seats THEN jsonb_build_object('old', d1.net_seats, 'new', d2.net_seats) ELSE NULL END,
+                'est_sold_seats', CASE WHEN d1.est_sold_seats IS DISTINCT FROM d2.est_sold_seats THEN jsonb_build_object('old', d1.est_sold_seats, 'new', d2.est_sold_seats) ELSE NULL END,
+                'workforce', CASE WHEN d1.workforce IS DISTINCT FROM d2.workforce THEN jsonb_build_object('old', d1.workforce, 'new', d2.workforce) ELSE NULL END,
+                'unticketed', CASE WHEN d1.unticketed IS DISTINCT FROM d2.unticketed THEN jsonb_build_object('old', d1.unticketed, 'new', d2.unticketed) ELSE NULL END
             ))
         END
-    FROM v1
-    FULL OUTER JOIN v2 ON v1.event_id = v2.event_id
-    WHERE v1.event_id IS NULL OR v2.event_id IS NULL OR v1.detail_id != v2.detail_id;
+    -- LATERAL keeps the lookups to index probes for the changed rows only; the planner
+    -- can't estimate how small the difference is and would otherwise hash whole tables
+    FROM changed c
+    CROSS JOIN LATERAL (SELECT eb.hash_key FROM fct_event_base eb WHERE eb.event_id = c.event_id) e
+    LEFT JOIN LATERAL (SELECT * FROM fct_event_details ed WHERE ed.detail_id = c.old_detail_id) d1 ON TRUE
+    LEFT JOIN LATERAL (SELECT * FROM fct_event_details ed WHERE ed.detail_id = c.new_detail_id) d2 ON TRUE;
+END;
+$$ LANGUAGE plpgsql;
+-- One Big Table: vw_event_by_version materialized for dashboards and the transport model
+-- Partitioned by version_id like the bridge, so a refresh only rewrites one version's partition
+CREATE TABLE IF NOT EXISTS obt_event_by_version (
+    scenario_id INTEGER,
+    version_id INTEGER NOT NULL,
+    version_code VARCHAR(50),
+    scenario_name VARCHAR(100),
+    event_id INTEGER NOT NULL,
+    hash_key VARCHAR(100),
+    sport_id INTEGER,
+    venue_id INTEGER,
+    subvenue_id INTEGER,
+    region_id INTEGER,
+    zone_id INTEGER,
+    cluster_id INTEGER,
+    day_id INTEGER,
+    session_id INTEGER,
+    competition_type VARCHAR(1),
+    event_type VARCHAR(15),
+    date_start DATE,
+    start_time TIME,
+    date_end DATE,
+    end_time TIME,
+    gross_seats INTEGER,
+    seat_kill NUMERIC(5,2),
+    est_pct_ticksold NUMERIC(5,2),
+    net_seats INTEGER,
+    est_sold_seats INTEGER,
+    workforce INTEGER,
+    unticketed INTEGER,
+    additional_attributes JSONB,
+    is_active BOOLEAN,
+    
+    -- One row per event per version, as in the bridge
+    PRIMARY KEY (version_id, event_id)
+) PARTITION BY LIST (version_id);
+
+-- No DEFAULT partition, as for the bridge: each version's partition is created with the version
+-- (or ahead of it by create_version_partitions), so refreshes and readers never wait on the DDL
+DO $$
+DECLARE
+    v_has_rows BOOLEAN;
+BEGIN
+    IF to_regclass('obt_event_by_version_default') IS NOT NULL THEN
+        EXECUTE 'SELECT EXISTS (SELECT 1 FROM obt_event_by_version_default)' INTO v_has_rows;
+        IF NOT v_has_rows THEN
+            DROP TABLE obt_event_by_version_default;
+        END IF;
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION create_obt_event_by_version_partition()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF to_regclass('obt_event_by_version_v' || NEW.version_id) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF obt_event_by_version FOR VALUES IN (%s)',
+            'obt_event_by_version_v' || NEW.version_id, NEW.version_id
+        );
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS create_obt_partition ON dim_version;
+CREATE TRIGGER create_obt_partition
+AFTER INSERT ON dim_version
+FOR EACH ROW EXECUTE FUNCTION create_obt_event_by_version_partition();
+
+-- Freshness of each version's OBT rows
+-- source_changed_at is bumped by any bridge change or rename, refreshed_at by each refresh
+CREATE TABLE IF NOT EXISTS obt_refresh_status (
+    version_id INTEGER PRIMARY KEY REFERENCES dim_version(version_id),
+    refreshed_at TIMESTAMP,
+    source_changed_at TIMESTAMP,
+    row_count INTEGER,
+    refresh_ms NUMERIC(12,3)
+);
+
+-- A version is stale until it has been refreshed after its last bridge change
+CREATE OR REPLACE VIEW vw_obt_freshness AS
+SELECT
+    v.version_id,
+    v.scenario_id,
+    v.version_code,
+    v.status,
+    f.refreshed_at,
+    f.source_changed_at,
+    f.row_count,
+    f.refresh_ms,
+    (f.refreshed_at IS NULL OR f.source_changed_at > f.refreshed_at) AS is_stale
+FROM dim_version v
+LEFT JOIN obt_refresh_status f ON v.version_id = f.version_id;
+
+-- Rebuild one version's OBT rows from vw_event_by_version
+CREATE OR REPLACE FUNCTION refresh_obt_event_by_version(
+    p_version_id INTEGER
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+    v_started TIMESTAMP := clock_timestamp();
+BEGIN
+    -- Serialize refreshes of the same version
+    PERFORM pg_advisory_xact_lock(hashtext('obt_event_by_version'), p_version_id);
+
+    -- Only versions that predate create_obt_partition get here without a partition
+    IF to_regclass('obt_event_by_version_v' || p_version_id) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF obt_event_by_version FOR VALUES IN (%s)',
+            'obt_event_by_version_v' || p_version_id, p_version_id
+        );
+    END IF;
+
+    DELETE FROM obt_event_by_version WHERE version_id = p_version_id;
+
+    -- Columns by name, so a change to the view can't shift values between columns
+    INSERT INTO obt_event_by_version (
+        scenario_id, version_id, version_code, scenario_name, event_id, hash_key, sport_id, venue_id, subvenue_id,
+        region_id, zone_id, cluster_id, day_id, session_id, competition_type, event_type, date_start, start_time,
+        date_end, end_time, gross_seats, seat_kill, est_pct_ticksold, net_seats, est_sold_seats, workforce,
+        unticketed, additional_attributes, is_active
+    )
+    SELECT
+        scenario_id, version_id, version_code, scenario_name, event_id, hash_key, sport_id, venue_id, subvenue_id,
+        region_id, zone_id, cluster_id, day_id, session_id, competition_type, event_type, date_start, start_time,
+        date_end, end_time, gross_seats, seat_kill, est_pct_ticksold, net_seats, est_sold_seats, workforce,
+        unticketed, additional_attributes, is_active
+    FROM vw_event_by_version WHERE version_id = p_version_id;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+
+    INSERT INTO obt_refresh_status (version_id, refreshed_at, source_changed_at, row_count, refresh_ms)
+    VALUES (
+        p_version_id, clock_timestamp(), v_started, v_count,
+        EXTRACT(EPOCH FROM clock_timestamp() - v_started) * 1000
+    )
+    ON CONFLICT (version_id) DO UPDATE SET
+        refreshed_at = EXCLUDED.refreshed_at,
+        source_changed_at = COALESCE(obt_refresh_status.source_changed_at, EXCLUDED.source_changed_at),
+        row_count = EXCLUDED.row_count,
+        refresh_ms = EXCLUDED.refresh_ms;
+
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mark every version touched by a bridge statement as stale
+CREATE OR REPLACE FUNCTION mark_obt_stale()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO obt_refresh_status (version_id, source_changed_at)
+        SELECT version_id, clock_timestamp() FROM (SELECT DISTINCT version_id FROM old_rows) changed
+        ON CONFLICT (version_id) DO UPDATE SET source_changed_at = EXCLUDED.source_changed_at;
+    ELSE
+        INSERT INTO obt_refresh_status (version_id, source_changed_at)
+        SELECT version_id, clock_timestamp() FROM (SELECT DISTINCT version_id FROM new_rows) changed
+        ON CONFLICT (version_id) DO UPDATE SET source_changed_at = EXCLUDED.source_changed_at;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level with transition tables: one upsert per statement, not per bridge row
+DROP TRIGGER IF EXISTS bridge_insert_marks_obt_stale ON version_event_bridge;
+CREATE TRIGGER bridge_insert_marks_obt_stale
+AFTER INSERT ON version_event_bridge
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION mark_obt_stale();
+
+DROP TRIGGER IF EXISTS bridge_update_marks_obt_stale ON version_event_bridge;
+CREATE TRIGGER bridge_update_marks_obt_stale
+AFTER UPDATE ON version_event_bridge
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION mark_obt_stale();
+
+DROP TRIGGER IF EXISTS bridge_delete_marks_obt_stale ON version_event_bridge;
+CREATE TRIGGER bridge_delete_marks_obt_stale
+AFTER DELETE ON version_event_bridge
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION mark_obt_stale();
+
+-- version_code, scenario_name and scenario_id are copied into the OBT too, so renaming a
+-- version or scenario (or moving a version to another scenario) marks its versions stale.
+-- Transition tables can't be combined with UPDATE OF column lists, so old and new rows are compared here.
+CREATE OR REPLACE FUNCTION mark_obt_stale_on_rename()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'dim_version' THEN
+        INSERT INTO obt_refresh_status (version_id, source_changed_at)
+        SELECT n.version_id, clock_timestamp()
+        FROM new_rows n
+        JOIN old_rows o ON n.version_id = o.version_id
+        WHERE n.version_code IS DISTINCT FROM o.version_code
+           OR n.scenario_id IS DISTINCT FROM o.scenario_id
+        ON CONFLICT (version_id) DO UPDATE SET source_changed_at = EXCLUDED.source_changed_at;
+    ELSE
+        INSERT INTO obt_refresh_status (version_id, source_changed_at)
+        SELECT v.version_id, clock_timestamp()
+        FROM new_rows n
+        JOIN old_rows o ON n.scenario_id = o.scenario_id
+        JOIN dim_version v ON v.scenario_id = n.scenario_id
+        WHERE n.scenario_name IS DISTINCT FROM o.scenario_name
+        ON CONFLICT (version_id) DO UPDATE SET source_changed_at = EXCLUDED.source_changed_at;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS version_rename_marks_obt_stale ON dim_version;
+CREATE TRIGGER version_rename_marks_obt_stale
+AFTER UPDATE ON dim_version
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION mark_obt_stale_on_rename();
+
+DROP TRIGGER IF EXISTS scenario_rename_marks_obt_stale ON dim_scenario;
+CREATE TRIGGER scenario_rename_marks_obt_stale
+AFTER UPDATE ON dim_scenario
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION mark_obt_stale_on_rename();
+
+-- Publishing a version refreshes just that version's OBT rows
+CREATE OR REPLACE FUNCTION refresh_obt_on_publish()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_obt_event_by_version(NEW.version_id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS publish_refreshes_obt ON dim_version;
+CREATE TRIGGER publish_refreshes_obt
+AFTER UPDATE OF status ON dim_version
+FOR EACH ROW
+WHEN (NEW.status = 'PUBLISHED' AND OLD.status IS DISTINCT FROM 'PUBLISHED')
+EXECUTE FUNCTION refresh_obt_on_publish();
+
+-- Precomputed compare_versions results per version pair, filled at publish time
+-- A status row marks the pair as cached (a pair can be cached with zero changes)
+CREATE TABLE IF NOT EXISTS version_diff_status (
+    from_version_id INTEGER REFERENCES dim_version(version_id),
+    to_version_id INTEGER REFERENCES dim_version(version_id),
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    change_count INTEGER,
+    compute_ms NUMERIC(12,3),
+    PRIMARY KEY (from_version_id, to_version_id)
+);
+
+CREATE TABLE IF NOT EXISTS version_diff_cache (
+    from_version_id INTEGER,
+    to_version_id INTEGER,
+    event_id INTEGER,
+    hash_key VARCHAR(100),
+    change_type VARCHAR(20),
+    changed_fields JSONB,
+    
+    -- Keyset pagination walks this index in event_id order
+    PRIMARY KEY (from_version_id, to_version_id, event_id),
+    FOREIGN KEY (from_version_id, to_version_id)
+        REFERENCES version_diff_status(from_version_id, to_version_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_version_diff_status_to ON version_diff_status (to_version_id);
+
+-- Compute and store the diff for one version pair
+CREATE OR REPLACE FUNCTION cache_version_diff(
+    p_version_id1 INTEGER,
+    p_version_id2 INTEGER
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+    v_started TIMESTAMP := clock_timestamp();
+BEGIN
+    -- Serialize computing the same pair
+    PERFORM pg_advisory_xact_lock(hashtext('version_diff_cache'), hashtext(p_version_id1 || '-' || p_version_id2));
+
+    DELETE FROM version_diff_status
+    WHERE from_version_id = p_version_id1 AND to_version_id = p_version_id2;
+
+    INSERT INTO version_diff_status (from_version_id, to_version_id)
+    VALUES (p_version_id1, p_version_id2);
+
+    INSERT INTO version_diff_cache (from_version_id, to_version_id, event_id, hash_key, change_type, changed_fields)
+    SELECT p_version_id1, p_version_id2, d.event_id, d.hash_key, d.change_type, d.changed_fields
+    FROM compare_versions(p_version_id1, p_version_id2) d;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+
+    UPDATE version_diff_status
+    SET computed_at = clock_timestamp(),
+        change_count = v_count,
+        compute_ms = EXTRACT(EPOCH FROM clock_timestamp() - v_started) * 1000
+    WHERE from_version_id = p_version_id1 AND to_version_id = p_version_id2;
+
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- compare_versions served from the cache when the pair has been computed
+CREATE OR REPLACE FUNCTION compare_versions_cached(
+    p_version_id1 INTEGER,
+    p_version_id2 INTEGER
+) RETURNS TABLE (
+    event_id INTEGER,
+    hash_key VARCHAR(100),
+    change_type VARCHAR(20),
+    changed_fields JSONB
+) AS $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM version_diff_status s
+        WHERE s.from_version_id = p_version_id1 AND s.to_version_id = p_version_id2
+    ) THEN
+        RETURN QUERY
+        SELECT c.event_id, c.hash_key, c.change_type, c.changed_fields
+        FROM version_diff_cache c
+        WHERE c.from_version_id = p_version_id1 AND c.to_version_id = p_version_id2;
+    ELSE
+        RETURN QUERY SELECT * FROM compare_versions(p_version_id1, p_version_id2);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Any bridge change to a version drops the cached diffs it takes part in
+CREATE OR REPLACE FUNCTION invalidate_version_diffs()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM version_diff_status s
+        USING (SELECT DISTINCT version_id FROM old_rows) changed
+        WHERE s.from_version_id = changed.version_id OR s.to_version_id = changed.version_id;
+    ELSE
+        DELETE FROM version_diff_status s
+        USING (SELECT DISTINCT version_id FROM new_rows) changed
+        WHERE s.from_version_id = changed.version_id OR s.to_version_id = changed.version_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bridge_insert_invalidates_version_diffs ON version_event_bridge;
+CREATE TRIGGER bridge_insert_invalidates_version_diffs
+AFTER INSERT ON version_event_bridge
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION invalidate_version_diffs();
+
+DROP TRIGGER IF EXISTS bridge_update_invalidates_version_diffs ON version_event_bridge;
+CREATE TRIGGER bridge_update_invalidates_version_diffs
+AFTER UPDATE ON version_event_bridge
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION invalidate_version_diffs();
+
+DROP TRIGGER IF EXISTS bridge_delete_invalidates_version_diffs ON version_event_bridge;
+CREATE TRIGGER bridge_delete_invalidates_version_diffs
+AFTER DELETE ON version_event_bridge
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION invalidate_version_diffs();
+
+-- Publishing a version caches its diff against the previous version of the same scenario
+CREATE OR REPLACE FUNCTION cache_diff_on_publish()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_previous_version_id INTEGER;
+BEGIN
+    SELECT version_id INTO v_previous_version_id
+    FROM dim_version
+    WHERE scenario_id = NEW.scenario_id
+    AND version_number < NEW.version_number
+    ORDER BY version_number DESC
+    LIMIT 1;
+
+    IF v_previous_version_id IS NOT NULL THEN
+        PERFORM cache_version_diff(v_previous_version_id, NEW.version_id);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS publish_caches_version_diff ON dim_version;
+CREATE TRIGGER publish_caches_version_diff
+AFTER UPDATE OF status ON dim_version
+FOR EACH ROW
+WHEN (NEW.status = 'PUBLISHED' AND OLD.status IS DISTINCT FROM 'PUBLISHED')
+EXECUTE FUNCTION cache_diff_on_publish();
+
+-- Delta-only version storage: instead of one bridge row per event per version, a version
+-- records only the events added, removed or modified against its parent version.
+-- Every SNAPSHOT_INTERVAL hops (and at the root of each chain) the full event set is kept
+-- as a checkpoint, so resolving a version reads at most one snapshot plus a few deltas.
+CREATE TABLE IF NOT EXISTS version_lineage (
+    version_id INTEGER PRIMARY KEY REFERENCES dim_version(version_id),
+    parent_version_id INTEGER REFERENCES version_lineage(version_id),
+    depth INTEGER NOT NULL,  -- hops since the nearest snapshot
+    is_snapshot BOOLEAN NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS version_event_delta (
+    version_id INTEGER REFERENCES version_lineage(version_id),
+    event_id INTEGER REFERENCES fct_event_base(event_id),
+    detail_id INTEGER REFERENCES fct_event_details(detail_id),  -- NULL for REMOVED
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,  -- the bridge's is_active; FALSE for REMOVED
+    change_type VARCHAR(20) NOT NULL,
+    PRIMARY KEY (version_id, event_id),
+    CHECK (change_type IN ('ADDED', 'REMOVED', 'MODIFIED')),
+    CHECK ((change_type = 'REMOVED') = (detail_id IS NULL))
+);
+
+CREATE TABLE IF NOT EXISTS version_event_snapshot (
+    version_id INTEGER REFERENCES version_lineage(version_id),
+    event_id INTEGER REFERENCES fct_event_base(event_id),
+    detail_id INTEGER NOT NULL REFERENCES fct_event_details(detail_id),
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    PRIMARY KEY (version_id, event_id)
+);
+
+-- Stores created before is_active was tracked hold active rows only
+ALTER TABLE version_event_delta ADD COLUMN IF NOT EXISTS is_active BOOLEAN NOT NULL DEFAULT TRUE;
+ALTER TABLE version_event_snapshot ADD COLUMN IF NOT EXISTS is_active BOOLEAN NOT NULL DEFAULT TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_version_lineage_parent ON version_lineage (parent_version_id);
+
+-- Full (event_id, detail_id, is_active) set of a delta-stored version: walk up to the nearest
+-- snapshot and keep, per event, the entry closest to the requested version.
+-- A single-statement SQL function, so the planner can inline it into callers.
+CREATE OR REPLACE FUNCTION resolve_version_rows(
+    p_version_id INTEGER
+) RETURNS TABLE (
+    event_id INTEGER,
+    detail_id INTEGER,
+    is_active BOOLEAN
+) AS $$
+    WITH RECURSIVE chain AS (
+        SELECT l.version_id, l.parent_version_id, l.is_snapshot, 0 AS hop
+        FROM version_lineage l
+        WHERE l.version_id = p_version_id
+        UNION ALL
+        SELECT l.version_id, l.parent_version_id, l.is_snapshot, c.hop + 1
+        FROM chain c
+        JOIN version_lineage l ON l.version_id = c.parent_version_id
+        WHERE NOT c.is_snapshot
+    ),
+    entries AS (
+        SELECT d.event_id, d.detail_id, d.is_active, d.change_type, c.hop
+        FROM chain c
+        JOIN version_event_delta d ON d.version_id = c.version_id
+        WHERE NOT c.is_snapshot
+        UNION ALL
+        SELECT s.event_id, s.detail_id, s.is_active, 'SNAPSHOT', c.hop
+        FROM chain c
+        JOIN version_event_snapshot s ON s.version_id = c.version_id
+        WHERE c.is_snapshot
+    ),
+    latest AS (
+        SELECT DISTINCT ON (e.event_id) e.event_id, e.detail_id, e.is_active, e.change_type
+        FROM entries e
+        ORDER BY e.event_id, e.hop
+    )
+    SELECT latest.event_id, latest.detail_id, latest.is_active
+    FROM latest
+    WHERE latest.change_type <> 'REMOVED';
+$$ LANGUAGE sql STABLE;
+
+-- Active events only: what a version is diffed and built from
+CREATE OR REPLACE FUNCTION resolve_version_events(
+    p_version_id INTEGER
+) RETURNS TABLE (
+    event_id INTEGER,
+    detail_id INTEGER
+) AS $$
+    SELECT r.event_id, r.detail_id
+    FROM resolve_version_rows(p_version_id) r
+    WHERE r.is_active;
+$$ LANGUAGE sql STABLE;
+
+-- Record a version against its parent (NULL for the first version of a chain).
+-- With p_full_set the arrays hold the version's complete event set and anything of the
+-- parent's missing from them is REMOVED; otherwise they hold only the changes, with a
+-- NULL detail_id for a removed event. p_is_active flags rows the version keeps as inactive
+-- bridge rows. Events whose detail and is_active did not change are not stored.
+-- Returns the number of delta rows written.
+-- The is_active array came after the first release; drop the old signature so calls stay unambiguous
+DROP FUNCTION IF EXISTS record_version_changes(INTEGER, INTEGER, INTEGER[], INTEGER[], BOOLEAN, INTEGER);
+
+CREATE OR REPLACE FUNCTION record_version_changes(
+    p_version_id INTEGER,
+    p_parent_version_id INTEGER,
+    p_event_ids INTEGER[],
+    p_detail_ids INTEGER[],
+    p_full_set BOOLEAN DEFAULT TRUE,
+    p_snapshot_interval INTEGER DEFAULT 10,
+    p_is_active BOOLEAN[] DEFAULT NULL  -- per event; NULL means all active
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_depth INTEGER := 0;
+    v_count INTEGER := 0;
+BEGIN
+    IF p_parent_version_id IS NOT NULL THEN
+        SELECT depth + 1 INTO v_depth FROM version_lineage WHERE version_id = p_parent_version_id;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Parent version % is not in delta storage', p_parent_version_id;
+        END IF;
+    END IF;
+
+    -- Flagged as a snapshot only once the checkpoint rows exist, so the resolve below still reads the deltas
+    INSERT INTO version_lineage (version_id, parent_version_id, depth, is_snapshot)
+    VALUES (p_version_id, p_parent_version_id, v_depth, FALSE);
+
+    IF p_parent_version_id IS NOT NULL THEN
+        -- Diffed against all of the parent's rows, inactive ones included, so an inactive row
+        -- is only inherited by a version that keeps it
+        INSERT INTO version_event_delta (version_id, event_id, detail_id, is_active, change_type)
+        SELECT
+            p_version_id,
+            COALESCE(i.event_id, p.event_id),
+            i.detail_id,
+            i.detail_id IS NOT NULL AND COALESCE(i.is_active, TRUE),
+            CASE
+                WHEN i.detail_id IS NULL THEN 'REMOVED'
+                WHEN p.event_id IS NULL THEN 'ADDED'
+                ELSE 'MODIFIED'
+            END
+        FROM unnest(p_event_ids, p_detail_ids, p_is_active) AS i(event_id, detail_id, is_active)
+        FULL JOIN resolve_version_rows(p_parent_version_id) p ON p.event_id = i.event_id
+        WHERE (i.event_id IS NULL AND p_full_set)
+        OR (i.event_id IS NOT NULL AND i.detail_id IS NULL AND p.event_id IS NOT NULL)
+        OR (i.detail_id IS NOT NULL
+            AND (i.detail_id, COALESCE(i.is_active, TRUE)) IS DISTINCT FROM (p.detail_id, p.is_active));
+        GET DIAGNOSTICS v_count = ROW_COUNT;
+    END IF;
+
+    IF p_parent_version_id IS NULL OR v_depth >= p_snapshot_interval THEN
+        IF p_parent_version_id IS NULL THEN
+            INSERT INTO version_event_snapshot (version_id, event_id, detail_id, is_active)
+            SELECT p_version_id, i.event_id, i.detail_id, COALESCE(i.is_active, TRUE)
+            FROM unnest(p_event_ids, p_detail_ids, p_is_active) AS i(event_id, detail_id, is_active)
+            WHERE i.detail_id IS NOT NULL;
+        ELSE
+            INSERT INTO version_event_snapshot (version_id, event_id, detail_id, is_active)
+            SELECT p_version_id, r.event_id, r.detail_id, r.is_active
+            FROM resolve_version_rows(p_version_id) r;
+        END IF;
+
+        UPDATE version_lineage SET depth = 0, is_snapshot = TRUE WHERE version_id = p_version_id;
+    END IF;
+
+    -- Without bridge rows the version is read from here, so do what the bridge triggers would:
+    -- mark its OBT rows stale and drop the cached diffs it takes part in
+    IF NOT EXISTS (SELECT FROM version_event_bridge WHERE version_id = p_version_id) THEN
+        INSERT INTO obt_refresh_status (version_id, source_changed_at)
+        VALUES (p_version_id, clock_timestamp())
+        ON CONFLICT (version_id) DO UPDATE SET source_changed_at = EXCLUDED.source_changed_at;
+        DELETE FROM version_diff_status
+        WHERE from_version_id = p_version_id OR to_version_id = p_version_id;
+    END IF;
+
+    RETURN v_count;
 END;
-$$ LANGUAGE plpgsql;
\ No newline at end of file
+$$ LANGUAGE plpgsql;
+
+-- Same rows as vw_event_by_version, inactive ones included, resolved from delta storage.
+-- An event removed against the parent has no row in that version, as in the bridge.
+CREATE OR REPLACE VIEW vw_event_by_version_delta AS
+SELECT 
+    v.scenario_id,
+    v.version_id,
+    v.version_code,
+    s.scenario_name,
+    r.event_id,
+    eb.hash_key,
+    eb.sport_id,
+    eb.venue_id,
+    eb.subvenue_id,
+    eb.region_id,
+    eb.zone_id,
+    eb.cluster_id,
+    eb.day_id,
+    eb.session_id,
+    eb.competition_type,
+    eb.event_type,
+    ed.date_start,
+    ed.start_time,
+    ed.date_end,
+    ed.end_time,
+    ed.gross_seats,
+    ed.seat_kill,
+    ed.est_pct_ticksold,
+    ed.net_seats,
+    ed.est_sold_seats,
+    ed.workforce,
+    ed.unticketed,
+    ed.additional_attributes,
+    r.is_active
+FROM 
+    version_lineage l
+JOIN dim_version v ON l.version_id = v.version_id
+JOIN dim_scenario s ON v.scenario_id = s.scenario_id
+CROSS JOIN LATERAL resolve_version_rows(l.version_id) r
+JOIN fct_event_base eb ON r.event_id = eb.event_id
+JOIN fct_event_details ed ON r.detail_id = ed.detail_id;
+
+-- Every version's (event_id, detail_id, is_active) rows, whichever way it is stored: bridge rows,
+-- or for a version written only to delta storage (process_events_for_version 'DELTA') its
+-- resolved rows. A migrated version has both and is read from the bridge.
+-- vw_event_by_version, compare_versions and everything built on them read versions through it.
+CREATE OR REPLACE VIEW vw_version_event_rows AS
+SELECT b.version_id, b.event_id, b.detail_id, b.is_active
+FROM version_event_bridge b
+UNION ALL
+SELECT l.version_id, r.event_id, r.detail_id, r.is_active
+FROM version_lineage l
+CROSS JOIN LATERAL resolve_version_rows(l.version_id) r
+WHERE NOT EXISTS (SELECT FROM version_event_bridge b WHERE b.version_id = l.version_id);
+
+-- View to simplify querying events by version
+-- This view joins each version's rows with the event base and details tables
+CREATE OR REPLACE VIEW vw_event_by_version AS
+SELECT 
+    v.scenario_id,
+    v.version_id,
+    v.version_code,
+    s.scenario_name,
+    b.event_id,
+    eb.hash_key,
+    eb.sport_id,
+    eb.venue_id,
+    eb.subvenue_id,
+    eb.region_id,
+    eb.zone_id,
+    eb.cluster_id,
+    eb.day_id,
+    eb.session_id,
+    eb.competition_type,
+    eb.event_type,
+    ed.date_start,
+    ed.start_time,
+    ed.date_end,
+    ed.end_time,
+    ed.gross_seats,
+    ed.seat_kill,
+    ed.est_pct_ticksold,
+    ed.net_seats,
+    ed.est_sold_seats,
+    ed.workforce,
+    ed.unticketed,
+    ed.additional_attributes,
+    b.is_active
+FROM 
+    vw_version_event_rows b
+JOIN dim_version v ON b.version_id = v.version_id
+JOIN dim_scenario s ON v.scenario_id = s.scenario_id
+JOIN fct_event_base eb ON b.event_id = eb.event_id
+JOIN fct_event_details ed ON b.detail_id = ed.detail_id;
@@ -0,0 +1,275 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from itertools import count
+
+import pandas as pd
+import psycopg2.extensions
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL
+
+# Connection settings come from the environment so the same code runs locally and against RDS
+DB_PARAMS = {
+    'database': os.getenv('DB_NAME'),
+    'username': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'port': os.getenv('DB_PORT')
+}
+
+POOL_SETTINGS = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+    'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', '5')),
+    'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    'pool_pre_ping': True
+}
+
+# Rows fetched per round trip by server-side cursors
+DEFAULT_ITERSIZE = int(os.getenv('DB_ITERSIZE', '10000'))
+
+# Opt-in: statements slower than this are logged with their EXPLAIN plan (unset = off)
+EXPLAIN_SLOW_MS = float(os.getenv('DB_EXPLAIN_SLOW_MS')) if os.getenv('DB_EXPLAIN_SLOW_MS') else None
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'with', 'values', 'declare')
+
+logger = logging.getLogger('etl.db')
+
+_engine = None
+_engine_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+_cursor_names = count()
+_metrics = {
+    'connections_opened': 0,
+    'checkouts': 0,
+    'checkout_seconds': 0.0,
+    'queries': 0,
+    'query_seconds': 0.0,
+    'rows_fetched': 0,
+    'bytes_sent': 0,
+    'bytes_received': 0
+}
+
+
+def _record(**increments):
+    with _metrics_lock:
+        for key, value in increments.items():
+            _metrics[key] += value
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """
+    psycopg2 cursor that adds every statement's duration, the rows it fetches and the
+    statement and COPY bytes it moves to the module metrics. libpq doesn't count result
+    bytes, so bytes_received only covers COPY TO; rows_fetched stands in for the rest.
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        finally:
+            seconds = time.perf_counter() - start
+            _record(queries=1, query_seconds=seconds, bytes_sent=len(self.query or b''))
+        if EXPLAIN_SLOW_MS is not None and seconds * 1000 >= EXPLAIN_SLOW_MS:
+            self._explain(seconds)
+        return result
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record(queries=1, query_seconds=time.perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            copied = file.tell() if hasattr(file, 'tell') else 0
+            direction = 'bytes_received' if 'TO STDOUT' in sql.upper() else 'bytes_sent'
+            _record(queries=1, query_seconds=time.perf_counter() - start, **{direction: copied})
+
+    def fetchone(self):
+        row = super().fetchone()
+        _record(rows_fetched=1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _record(rows_fetched=len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        _record(rows_fetched=len(rows))
+        return rows
+
+    def _explain(self, seconds):
+        # Plain EXPLAIN on the same connection: plans the statement again without running it
+        statement = (self.query or b'').decode(errors='replace')
+        if not statement.lstrip().lower().startswith(EXPLAINABLE) or self.connection.closed:
+            return
+        if ';' in statement.strip().rstrip(';'):
+            # EXPLAIN covers only the first command of a multi-statement string and the server
+            # would run the rest again; a ';' inside a literal just means no plan is logged
+            plan = ["Not explained: more than one statement"]
+        else:
+            plan = self._plan()
+        logger.warning("slow statement", extra={'fields': {
+            'event': 'slow_statement', 'ms': round(seconds * 1000, 1), 'statement': statement[:2000], 'plan': plan
+        }})
+
+    def _plan(self):
+        # A savepoint keeps a failed EXPLAIN from aborting the caller's transaction
+        savepoint = not self.connection.autocommit
+        with self.connection.cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+            try:
+                if savepoint:
+                    cursor.execute("SAVEPOINT etl_explain")
+                cursor.execute(b'EXPLAIN ' + self.query)
+                plan = [row[0] for row in cursor.fetchall()]
+                if savepoint:
+                    cursor.execute("RELEASE SAVEPOINT etl_explain")
+            except psycopg2.Error as error:
+                if savepoint:
+                    cursor.execute("ROLLBACK TO SAVEPOINT etl_explain")
+                plan = [f"EXPLAIN failed: {error}"]
+        return plan
+
+
+def get_engine():
+    """Return the process-wide SQLAlchemy engine; its pool also backs the raw psycopg2 helpers below."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                connect_args = {'cursor_factory': TimedCursor}
+                if os.getenv('DB_SSLMODE'):
+                    connect_args['sslmode'] = os.getenv('DB_SSLMODE')
+                if os.getenv('DB_SEARCH_PATH'):
+                    # e.g. a throwaway benchmark schema; applies to every pooled connection
+                    connect_args['options'] = f"-c search_path={os.getenv('DB_SEARCH_PATH')}"
+                engine = create_engine(
+                    URL.create('postgresql+psycopg2', **DB_PARAMS),
+                    connect_args=connect_args,
+                    **POOL_SETTINGS
+                )
+                event.listen(engine, 'connect', lambda dbapi_conn, record: _record(connections_opened=1))
+                event.listen(engine, 'checkout', lambda dbapi_conn, record, proxy: _record(checkouts=1))
+                _engine = engine
+    return _engine
+
+
+def dispose_engine():
+    """Close every pooled connection, e.g. after forking worker processes."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+@contextmanager
+def connection():
+    """
+    Borrow a pooled psycopg2 connection. The caller owns commit/rollback;
+    anything left uncommitted is rolled back when the connection goes back to the pool.
+    """
+    start = time.perf_counter()
+    conn = get_engine().raw_connection()
+    _record(checkout_seconds=time.perf_counter() - start)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def transaction():
+    """One unit of work: commit on success, roll back on any exception."""
+    with connection() as conn:
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def execute(query, params=None):
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.rowcount
+
+
+def iter_sql_chunks(query, params=None, chunksize=DEFAULT_ITERSIZE, conn=None):
+    """
+    Stream a query through a server-side (named) cursor, yielding DataFrames of up to
+    ``chunksize`` rows. Uses ``conn`` if given, otherwise its own transaction.
+    """
+    if conn is None:
+        with transaction() as own_conn:
+            yield from iter_sql_chunks(query, params, chunksize, own_conn)
+        return
+
+    with conn.cursor(name=f'etl_cursor_{next(_cursor_names)}') as cursor:
+        cursor.itersize = chunksize
+        cursor.execute(query, params)
+        columns = None
+        yielded = False
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if columns is None:
+                columns = [description[0] for description in cursor.description]
+            if not rows:
+                break
+            yielded = True
+            yield pd.DataFrame(rows, columns=columns)
+        if not yielded:
+            # Keep the column layout for empty results so callers can still merge on them
+            yield pd.DataFrame(columns=columns)
+
+
+def read_sql(query, params=None, chunksize=DEFAULT_ITERSIZE, conn=None):
+    """Read a whole query result into one DataFrame via a server-side cursor."""
+    chunks = list(iter_sql_chunks(query, params, chunksize, conn))
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
+
+
+def table_columns(cursor, table):
+    """Columns of ``table`` (optionally schema-qualified) in table order; empty if it does not exist."""
+    cursor.execute("""
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def get_metrics():
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    pool = _engine.pool if _engine is not None else None
+    if pool is not None:
+        metrics['pool_checked_out'] = pool.checkedout()
+        metrics['pool_size'] = pool.size()
+    return metrics
+
+
+def reset_metrics():
+    with _metrics_lock:
+        for key in _metrics:
+            _metrics[key] = 0 if isinstance(_metrics[key], int) else 0.0
+
+
+def print_metrics():
+    metrics = get_metrics()
+    print(f"DB metrics: {metrics['connections_opened']} connections opened, "
+          f"{metrics['checkouts']} checkouts ({metrics['checkout_seconds']:.3f}s waiting), "
+          f"{metrics['queries']} queries ({metrics['query_seconds']:.3f}s), {metrics['rows_fetched']} rows fetched")
@@ -0,0 +1,256 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from bulk_apply import copy_dataframe
+from db_connection import connection, print_metrics, read_sql, transaction
+
+# Natural key -> surrogate key lookups of process_staging_event_session (13_), in resolution
+# order. Subvenue names are only unique within a venue, so that lookup also keys on venue_id.
+LOOKUPS = {
+    'venues': {'table': 'dim_venues', 'id': 'venue_id', 'keys': ['venue_name']},
+    'sports': {'table': 'dim_sports', 'id': 'sport_id', 'keys': ['sport_discipline']},
+    'subvenues': {'table': 'dim_subvenues', 'id': 'subvenue_id', 'keys': ['subvenue_name', 'venue_id']},
+    'regions': {'table': 'dim_regions', 'id': 'region_id', 'keys': ['region_name']},
+    'zones': {'table': 'dim_zones', 'id': 'zone_id', 'keys': ['zone_name']},
+    'clusters': {'table': 'dim_clusters', 'id': 'cluster_id', 'keys': ['cluster_name']},
+    'calendar': {'table': 'dim_calendar', 'id': 'day_id', 'keys': ['event_day', 'competition_type']}
+}
+
+# 13_ maps venues without subvenues to this fixed id
+SUBVENUE_NOT_APPLICABLE = ('Not Applicable', 99)
+
+DISCREPANCY_COLUMNS = ['row_index', 'column_name', 'value', 'issue', 'dimension']
+
+# discrepancy_log from 98_handling-data-discrepancies.md, with the value and the source it came from
+DISCREPANCY_LOG_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    discrepancy_id SERIAL PRIMARY KEY,
+    source VARCHAR(100),
+    row_index INTEGER,
+    column_name VARCHAR(100),
+    value TEXT,
+    issue VARCHAR(255),
+    dimension VARCHAR(50),
+    logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def _table(schema, name):
+    return f'{schema}.{name}' if schema else name
+
+
+class DimensionCache:
+    """
+    Current natural-key -> surrogate-key maps of the dimension tables, held in process.
+
+    Each map is reloaded only when its table changes: one round trip reads the row
+    count, the current row count and max(valid_from) of every table, and a map whose
+    values differ from the ones it was loaded with is read again. The SCD functions
+    (81_-88_) always insert a new row to change a name, so the row count moves even
+    when valid_from is backdated; call invalidate() after editing a dimension in place.
+
+    ``check_interval`` (seconds) limits how often that check runs; 0 checks on every resolve.
+    """
+
+    def __init__(self, schema=None, check_interval=0):
+        self.schema = schema
+        self.check_interval = check_interval
+        self._maps = {}
+        self._versions = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self.stats = {'checks': 0, 'loads': 0, 'load_seconds': 0.0, 'resolved_rows': 0, 'resolve_seconds': 0.0}
+
+    def _version_query(self):
+        return '\nUNION ALL\n'.join(
+            f"SELECT '{name}', count(*), count(*) FILTER (WHERE is_current), max(valid_from) FROM {_table(self.schema, lookup['table'])}"
+            for name, lookup in LOOKUPS.items()
+        )
+
+    def _load(self, conn, name):
+        lookup = LOOKUPS[name]
+        df = read_sql(
+            f"SELECT {', '.join(lookup['keys'])}, {lookup['id']} FROM {_table(self.schema, lookup['table'])} "
+            f"WHERE is_current = TRUE ORDER BY {lookup['id']}",
+            conn=conn
+        )
+        # Should two current rows share a natural key, the newest surrogate key wins
+        df = df.drop_duplicates(lookup['keys'], keep='last')
+        if len(lookup['keys']) == 1:
+            index = pd.Index(df[lookup['keys'][0]])
+        else:
+            index = pd.MultiIndex.from_frame(df[lookup['keys']])
+        self._maps[name] = (index, df[lookup['id']].to_numpy())
+
+    def refresh(self, force=False):
+        """Reload the maps whose table changed since they were loaded. Returns the reloaded names."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return []
+            start = time.perf_counter()
+            reloaded = []
+            with connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(self._version_query())
+                    versions = {row[0]: row[1:] for row in cursor.fetchall()}
+                for name in LOOKUPS:
+                    if force or name not in self._maps or self._versions.get(name) != versions[name]:
+                        self._load(conn, name)
+                        self._versions[name] = versions[name]
+                        reloaded.append(name)
+                conn.rollback()
+            self._checked_at = now
+            self.stats['checks'] += 1
+            self.stats['loads'] += len(reloaded)
+            self.stats['load_seconds'] += time.perf_counter() - start
+            return reloaded
+
+    def invalidate(self, name=None):
+        """Drop one map (or all of them) so the next resolve reloads it."""
+        with self._lock:
+            for dropped in ([name] if name else list(self._maps)):
+                self._maps.pop(dropped, None)
+                self._versions.pop(dropped, None)
+            self._checked_at = None
+
+    def lookup(self, name, keys):
+        """
+        Surrogate keys for ``keys`` (a Series, or a DataFrame of the lookup's key columns):
+        a float array with NaN where nothing current matches.
+        """
+        index, ids = self._maps[name]
+        if isinstance(keys, pd.DataFrame):
+            if len(keys.columns) == 1:
+                keys = keys.iloc[:, 0]
+            else:
+                keys = pd.MultiIndex.from_frame(keys)
+        positions = index.get_indexer(keys)
+        resolved = np.full(len(positions), np.nan)
+        found = positions >= 0
+        resolved[found] = ids[positions[found]]
+        return resolved
+
+    def resolve(self, staging_df):
+        """
+        Add the seven surrogate key columns to a names-based staging DataFrame (the
+        12_ staging_event_session layout), as the LEFT JOINs of 13_ would.
+
+        Returns (resolved_df, discrepancies). Unmatched and missing names keep a null key
+        and are reported in ``discrepancies`` (one record per row and column, with the
+        DISCREPANCY_COLUMNS of 98_), and the rows are flagged with ``flagged_for_review``.
+        """
+        self.refresh()
+        start = time.perf_counter()
+        df = staging_df.copy()
+        found = []
+
+        for name, lookup in LOOKUPS.items():
+            keys = df[lookup['keys']]
+            if name == 'calendar':
+                keys = keys.assign(event_day=pd.to_numeric(keys['event_day'], errors='coerce'))
+            ids = self.lookup(name, keys)
+            if name == 'subvenues':
+                not_applicable = (df['subvenue_name'] == SUBVENUE_NOT_APPLICABLE[0]).to_numpy()
+                ids[not_applicable] = SUBVENUE_NOT_APPLICABLE[1]
+            df[lookup['id']] = pd.array(ids, dtype='Int64')
+            found.append(self._discrepancies(df, name, ids))
+
+        discrepancies = pd.concat(found, ignore_index=True)
+        df['flagged_for_review'] = df.index.isin(discrepancies['row_index'])
+        self.stats['resolved_rows'] += len(df)
+        self.stats['resolve_seconds'] += time.perf_counter() - start
+        return df, discrepancies
+
+    def _discrepancies(self, df, name, ids):
+        lookup = LOOKUPS[name]
+        unmatched = np.isnan(ids)
+        if name == 'subvenues':
+            # A subvenue of an unmatched venue can't match either; the venue record covers it
+            unmatched &= df['venue_id'].notna().to_numpy()
+            column = 'subvenue_name'
+        else:
+            column = lookup['keys'][0]
+        if not unmatched.any():
+            return pd.DataFrame(columns=DISCREPANCY_COLUMNS)
+
+        # Only the key columns of the unmatched rows; staging rows are wide
+        rows = df.loc[unmatched, lookup['keys']]
+        key_values = rows[[key for key in lookup['keys'] if key != 'venue_id']]
+        missing = key_values.isna().any(axis=1).to_numpy()
+        values = key_values.iloc[:, 0].astype(str)
+        for key in key_values.columns[1:]:
+            values = values + ' / ' + key_values[key].astype(str)
+        unmatched_issue = f"No current {lookup['table']} row"
+        if name == 'subvenues':
+            unmatched_issue = (unmatched_issue + " at venue_id " + rows['venue_id'].astype(str)).to_numpy()
+        issues = np.where(missing, 'Missing value', unmatched_issue)
+        return pd.DataFrame({
+            'row_index': rows.index,
+            'column_name': column,
+            'value': values.where(~missing, None).to_numpy(),
+            'issue': issues,
+            'dimension': lookup['table']
+        })
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_dimension_cache(schema=None, check_interval=0):
+    """The process-wide DimensionCache for ``schema``, created on first use."""
+    with _caches_lock:
+        if schema not in _caches:
+            _caches[schema] = DimensionCache(schema, check_interval)
+        return _caches[schema]
+
+
+def log_discrepancies(conn, discrepancies, source, table='discrepancy_log'):
+    """Append discrepancy records to ``table`` (created if missing); the caller commits."""
+    if not len(discrepancies):
+        return 0
+    with conn.cursor() as cursor:
+        cursor.execute(DISCREPANCY_LOG_DDL.format(table=table))
+        return copy_dataframe(cursor, discrepancies.assign(source=source), table, ['source'] + DISCREPANCY_COLUMNS)
+
+
+def discrepancy_report(discrepancies):
+    """Counts per dimension, issue and value, most frequent first."""
+    return discrepancies.groupby(['dimension', 'issue', 'value'], dropna=False).size().sort_values(ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve staging_event_session names to surrogate keys from the dimension cache.")
+    parser.add_argument('--schema', help="Schema of the dimension and staging tables (default: search_path)")
+    parser.add_argument('--log', action='store_true', help="Append unmatched names to discrepancy_log")
+    parser.add_argument('--repeat', type=int, default=2, help="Resolve this many times to show the warm-cache cost")
+    args = parser.parse_args()
+
+    try:
+        cache = get_dimension_cache(args.schema)
+        staging_df = read_sql(f"SELECT * FROM {_table(args.schema, 'staging_event_session')}")
+        for attempt in range(args.repeat):
+            start = time.perf_counter()
+            resolved_df, discrepancies = cache.resolve(staging_df)
+            print(f"Resolve {attempt + 1}: {len(resolved_df)} rows in {time.perf_counter() - start:.3f}s, "
+                  f"{resolved_df['flagged_for_review'].sum()} flagged")
+        print(f"Cache: {cache.stats['loads']} table loads in {cache.stats['load_seconds']:.3f}s over {cache.stats['checks']} checks")
+        if len(discrepancies):
+            print(discrepancy_report(discrepancies).head(20).to_string())
+            if args.log:
+                with transaction() as conn:
+                    logged = log_discrepancies(conn, discrepancies, 'staging_event_session',
+                                               _table(args.schema, 'discrepancy_log'))
+                print(f"Logged {logged} discrepancies")
+    finally:
+        print_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import argparse
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from db_connection import connection, print_metrics, transaction
+from instrumentation import get_logger
+from two_phase import finish_prepared, recover_prepared, two_phase_available
+
+logger = get_logger('dimension_refresh')
+
+# The 81_-88_ update functions, in the order 14_update-all-dims.sql runs them.
+# depends_on lists the dimension tables each function joins to; staging_columns is the
+# slice of staging_event_session it reads (the SELECT DISTINCT in its first CTE).
+DIMENSIONS = {
+    'regions': {'function': 'update_dim_regions', 'depends_on': [],
+                'staging_columns': ['region_name']},
+    'zones': {'function': 'update_dim_zones', 'depends_on': ['regions'],
+              'staging_columns': ['zone_name', 'region_name']},
+    'clusters': {'function': 'update_dim_clusters', 'depends_on': ['regions', 'zones'],
+                 'staging_columns': ['cluster_name', 'zone_name', 'region_name']},
+    'venues': {'function': 'update_dim_venues', 'depends_on': ['regions', 'zones', 'clusters'],
+               'staging_columns': ['venue_name', 'region_name', 'zone_name', 'cluster_name']},
+    'subvenues': {'function': 'update_dim_subvenues', 'depends_on': ['venues'],
+                  'staging_columns': ['subvenue_name', 'venue_name']},
+    # 86_ joins dim_venues to resolve each sport's venue
+    'sports': {'function': 'update_dim_sports', 'depends_on': ['venues'],
+               'staging_columns': ['sport_discipline', 'venue_name']},
+    'calendar': {'function': 'update_dim_calendar', 'depends_on': [],
+                 'staging_columns': ['event_day', 'date_start', 'competition_type']},
+    'non_comp_facs': {'function': 'update_dim_non_comp_facs', 'depends_on': ['regions'],
+                      'staging_columns': ['nc_fac_name', 'nc_fac_code', 'details', 'status', 'region_name',
+                                          'latitude', 'longitude']}
+}
+
+# Non-competition facilities are still commented out of update_all_dimensions()
+DEFAULT_DIMENSIONS = ['regions', 'zones', 'clusters', 'venues', 'subvenues', 'sports', 'calendar']
+
+# Prepared branches are named dim_refresh_<run id>_branch_<n> so two_phase.recover_prepared can find
+# them; branch 0 is prepared and committed first, so it marks whether a run had started committing
+GID_PREFIX = 'dim_refresh'
+
+CHECKSUM_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS {schema}.dim_refresh_checksum (
+    dimension_name VARCHAR(50) PRIMARY KEY,
+    staging_checksum VARCHAR(32) NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# Order-independent fingerprint of the distinct staging rows a dimension reads
+STAGING_CHECKSUM_SQL = """
+SELECT md5(COALESCE(string_agg(slice::TEXT, '|' ORDER BY slice::TEXT COLLATE "C"), ''))
+FROM (SELECT DISTINCT {columns} FROM {schema}.staging_event_session) slice
+"""
+
+
+def plan_branches(dimensions):
+    """
+    Group the selected dimensions into independent branches, each in dependency order.
+
+    A dimension reads its upstream tables' uncommitted rows, so everything connected
+    by a dependency has to run on the same connection; only separate components can
+    run in parallel.
+    """
+    selected = [name for name in DIMENSIONS if name in dimensions]
+    component = {name: name for name in selected}
+
+    def root(name):
+        while component[name] != name:
+            name = component[name]
+        return name
+
+    for name in selected:
+        for upstream in DIMENSIONS[name]['depends_on']:
+            if upstream in component:
+                component[root(name)] = root(upstream)
+
+    branches = {}
+    for name in selected:
+        branches.setdefault(root(name), []).append(name)
+    return list(branches.values())
+
+
+def _upstream(name):
+    seen = []
+    stack = list(DIMENSIONS[name]['depends_on'])
+    while stack:
+        upstream = stack.pop()
+        if upstream not in seen:
+            seen.append(upstream)
+            stack.extend(DIMENSIONS[upstream]['depends_on'])
+    return seen
+
+
+def refresh_branch(conn, schema, branch, results, force=False, abort=None):
+    """
+    Run one branch's update functions in order on ``conn`` without committing.
+    A dimension is skipped when its staging checksum matches the last refresh and
+    nothing upstream changed in this run. Fills ``results[name]`` as it goes.
+    """
+    with conn.cursor() as cursor:
+        for name in branch:
+            if abort is not None and abort.is_set():
+                results[name] = {'status': 'aborted', 'seconds': 0.0, 'expired': None, 'inserted': None}
+                continue
+
+            dimension = DIMENSIONS[name]
+            start = time.perf_counter()
+            cursor.execute(STAGING_CHECKSUM_SQL.format(columns=', '.join(dimension['staging_columns']), schema=schema))
+            checksum = cursor.fetchone()[0]
+            cursor.execute(f"SELECT staging_checksum FROM {schema}.dim_refresh_checksum WHERE dimension_name = %s", (name,))
+            previous = cursor.fetchone()
+
+            upstream_changed = any(
+                results.get(upstream, {}).get('expired') or results.get(upstream, {}).get('inserted')
+                for upstream in _upstream(name)
+            )
+            if not force and previous is not None and previous[0] == checksum and not upstream_changed:
+                results[name] = {'status': 'skipped', 'seconds': round(time.perf_counter() - start, 3),
+                                 'expired': 0, 'inserted': 0}
+                continue
+
+            cursor.execute(f"SELECT expired_count, inserted_count FROM {schema}.{dimension['function']}()")
+            expired, inserted = cursor.fetchone()
+            cursor.execute(f"""
+                INSERT INTO {schema}.dim_refresh_checksum (dimension_name, staging_checksum, refreshed_at)
+                VALUES (%s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (dimension_name) DO UPDATE
+                SET staging_checksum = EXCLUDED.staging_checksum, refreshed_at = EXCLUDED.refreshed_at
+            """, (name, checksum))
+            results[name] = {'status': 'refreshed', 'seconds': round(time.perf_counter() - start, 3),
+                             'expired': expired, 'inserted': inserted}
+
+
+def _finish_failed_run(conns, gids, phases):
+    """
+    Resolve the branches of a two-phase run that failed. Before any commit, open branches
+    are rolled back and prepared ones rolled back by gid (branch 0 last). Once a commit has
+    succeeded the run has to complete, so the remaining prepared branches are committed.
+    """
+    prepared = [gid for gid, phase in zip(gids, phases) if phase == 'prepared']
+    for conn, phase in zip(conns, phases):
+        if phase == 'open':
+            try:
+                conn.tpc_rollback()
+            except Exception:
+                logger.exception("Rollback failed")
+        elif phase == 'prepared':
+            # Finished by gid on another connection; this one can't go back to the pool prepared
+            conn.invalidate()
+    if 'committed' in phases:
+        unfinished = finish_prepared(prepared, commit=True)
+    else:
+        unfinished = finish_prepared(sorted(prepared, key=lambda gid: gid == gids[0]), commit=False)
+    if unfinished:
+        logger.error("Branches left prepared; run `python dimension_refresh.py --recover`",
+                     extra={'fields': {'gids': unfinished}})
+
+
+def refresh_dimensions(schema='test', dimensions=DEFAULT_DIMENSIONS, force=False, two_phase=None):
+    """
+    Refresh the dimension tables with independent branches running concurrently, each
+    on its own pooled connection. Nothing is committed unless every branch succeeds.
+
+    With two-phase commit (needs max_prepared_transactions >= number of branches) all
+    branches are PREPAREd before any is committed, so the run commits or rolls back as
+    one unit: a failure after the first COMMIT PREPARED commits the other branches too.
+    Otherwise every branch is committed only after all have finished.
+
+    Returns {'dimensions': {name: {status, seconds, expired, inserted}}, 'branches': [...],
+    'wall_seconds', 'serial_seconds', 'commit_mode'}.
+    """
+    branches = plan_branches(dimensions)
+    if two_phase is None:
+        two_phase = two_phase_available(len(branches))
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(CHECKSUM_TABLE_DDL.format(schema=schema))
+
+    results = {}
+    abort = threading.Event()
+    run_id = uuid.uuid4().hex[:12]
+    start = time.perf_counter()
+
+    with ExitStack() as stack:
+        conns = [stack.enter_context(connection()) for _ in branches]
+        gids = [f'{GID_PREFIX}_{run_id}_branch_{index}' for index in range(len(branches))]
+        # 'open' -> 'prepared' -> 'committed' per branch, so a failure knows what is left to finish
+        phases = ['open'] * len(conns)
+        if two_phase:
+            for conn, gid in zip(conns, gids):
+                conn.tpc_begin(gid)
+
+        def run(conn, branch):
+            try:
+                refresh_branch(conn, schema, branch, results, force, abort)
+            except Exception as error:
+                abort.set()
+                failed = next(name for name in branch if name not in results)
+                raise RuntimeError(f"Refreshing {failed} failed: {error}") from error
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(branches)) as executor:
+                futures = [executor.submit(run, conn, branch) for conn, branch in zip(conns, branches)]
+                errors = [future.exception() for future in futures]
+            failed = [error for error in errors if error is not None]
+            if failed:
+                raise failed[0]
+
+            if two_phase:
+                for index, conn in enumerate(conns):
+                    conn.tpc_prepare()
+                    phases[index] = 'prepared'
+                # Branch 0 first: once it is gone, recover_prepared knows the commit had started
+                for index, conn in enumerate(conns):
+                    conn.tpc_commit()
+                    phases[index] = 'committed'
+            else:
+                for conn in conns:
+                    conn.commit()
+        except Exception:
+            if two_phase:
+                _finish_failed_run(conns, gids, phases)
+            else:
+                for conn in conns:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        logger.exception("Rollback failed")
+            raise
+
+    return {
+        'dimensions': results,
+        'branches': branches,
+        'wall_seconds': round(time.perf_counter() - start, 3),
+        'serial_seconds': round(sum(result['seconds'] or 0 for result in results.values()), 3),
+        'commit_mode': 'two-phase' if two_phase else 'deferred'
+    }
+
+
+def print_report(report):
+    for index, branch in enumerate(report['branches']):
+        print(f"Branch {index + 1}: {' -> '.join(branch)}")
+    for name in [name for branch in report['branches'] for name in branch]:
+        result = report['dimensions'][name]
+        counts = ''
+        if result['status'] == 'refreshed':
+            counts = f": {result['expired']} expired, {result['inserted']} inserted"
+        seconds = f"{result['seconds']:.3f}s" if result['seconds'] is not None else '-'
+        print(f"  {name:<14} {result['status']:<9} {seconds:>9}{counts}")
+    print(f"Dimensions refreshed in {report['wall_seconds']:.3f}s wall time "
+          f"({report['serial_seconds']:.3f}s of work, {report['commit_mode']} commit)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the dimension tables in parallel, dependency-aware branches.")
+    parser.add_argument('--schema', default='test', help="Schema holding staging_event_session and the update_dim_* functions")
+    parser.add_argument('--dimensions', nargs='+', choices=list(DIMENSIONS), default=DEFAULT_DIMENSIONS)
+    parser.add_argument('--force', action='store_true', help="Run every dimension even if its staging slice is unchanged")
+    parser.add_argument('--no-two-phase', action='store_true', help="Commit branches one after another instead of PREPARE/COMMIT PREPARED")
+    parser.add_argument('--recover', action='store_true', help="Finish refreshes left prepared by a crashed run, then exit")
+    args = parser.parse_args()
+
+    try:
+        if args.recover:
+            outcome = recover_prepared(GID_PREFIX, 'branch_0')
+            for run_id, result in outcome.items():
+                print(f"Run {run_id}: {result}")
+            print(f"{len(outcome)} run(s) recovered")
+            return
+        report = refresh_dimensions(args.schema, args.dimensions, args.force, two_phase=False if args.no_two_phase else None)
+        print_report(report)
+    finally:
+        print_metrics()
+
+
+if __name__ == "__main__":
+    main()
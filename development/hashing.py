@@ -0,0 +1,97 @@
+import argparse
+import hashlib
+import time
+
+import pandas as pd
+
+# Canonical event hash_key recipe, as used by process_staging_event_session (13_) and
+# process_events_for_version (create_fct.sql). Only the three dimension keys are
+# COALESCEd to 'NULL'; a NULL in any other part makes the whole key NULL.
+HASH_KEY_COLUMNS = ['venue_id', 'sport_id', 'day_id', 'session_id', 'competition_type', 'event_type', 'date_start']
+NULLABLE_HASH_KEY_COLUMNS = ['venue_id', 'sport_id', 'day_id']
+
+HASH_KEY_SQL = """md5(
+    COALESCE(venue_id::TEXT, 'NULL') || '-' ||
+    COALESCE(sport_id::TEXT, 'NULL') || '-' ||
+    COALESCE(day_id::TEXT, 'NULL') || '-' ||
+    session_id::TEXT || '-' ||
+    competition_type::TEXT || '-' ||
+    event_type::TEXT || '-' ||
+    to_char(date_start, 'YYYY-MM-DD')
+)"""
+
+
+def _as_text(series):
+    # Render a column the way PostgreSQL's ::TEXT would, keeping NULLs as <NA>
+    if pd.api.types.is_bool_dtype(series):
+        return series.map({True: 'true', False: 'false'}).astype('string')
+    if pd.api.types.is_numeric_dtype(series):
+        non_null = series.dropna()
+        if pd.api.types.is_integer_dtype(series) or (non_null % 1 == 0).all():
+            return series.astype('Int64').astype('string')
+        return series.astype('string')
+    return series.astype('string')
+
+
+def hash_key_strings(df):
+    """Build the pre-md5 hash_key input for every row of ``df`` column by column."""
+    parts = []
+    for column in HASH_KEY_COLUMNS:
+        if column == 'date_start':
+            text = pd.to_datetime(df[column]).dt.strftime('%Y-%m-%d').astype('string')
+        else:
+            text = _as_text(df[column])
+        if column in NULLABLE_HASH_KEY_COLUMNS:
+            text = text.fillna('NULL')
+        parts.append(text)
+    # str.cat propagates <NA>, matching || with a NULL operand
+    return parts[0].str.cat(parts[1:], sep='-', na_rep=None)
+
+
+def compute_hash_keys(df):
+    """Return the canonical md5 hash_key for every row of ``df`` as a Series aligned to its index."""
+    strings = hash_key_strings(df).tolist()
+    return pd.Series(
+        [hashlib.md5(value.encode()).hexdigest() if isinstance(value, str) else None for value in strings],
+        index=df.index, dtype=object
+    )
+
+
+def check_against_sql(conn, table, limit):
+    """Compare compute_hash_keys with HASH_KEY_SQL over a sample of ``table``; returns the mismatching rows."""
+    query = "SELECT {columns}, {hash_sql} AS sql_hash_key FROM {table} LIMIT %s".format(
+        columns=', '.join(HASH_KEY_COLUMNS), hash_sql=HASH_KEY_SQL, table=table
+    )
+    with conn.cursor() as cursor:
+        cursor.execute(query, (limit,))
+        columns = [description[0] for description in cursor.description]
+        sample_df = pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    sample_df['py_hash_key'] = compute_hash_keys(sample_df)
+    mismatches = sample_df[sample_df['py_hash_key'].fillna('') != sample_df['sql_hash_key'].fillna('')]
+    return sample_df, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check Python hash_key computation against the SQL md5 recipe.")
+    parser.add_argument('--table', default='staging_event_session_id', help="Table with id-resolved staging rows")
+    parser.add_argument('--limit', type=int, default=10000, help="Number of sample rows to compare")
+    args = parser.parse_args()
+
+    from db_connection import connection
+    with connection() as conn:
+        sample_df, mismatches = check_against_sql(conn, args.table, args.limit)
+
+    start = time.perf_counter()
+    compute_hash_keys(sample_df)
+    elapsed = time.perf_counter() - start
+
+    print(f"Compared {len(sample_df)} rows from {args.table}: {len(mismatches)} mismatches "
+          f"(python hashing took {elapsed:.3f}s)")
+    if len(mismatches):
+        print(mismatches.head(20).to_string())
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import argparse
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from db_connection import get_metrics
+
+# Log settings come from the environment like the DB_* settings, so a nightly job can switch them
+LOG_FORMAT = os.getenv('ETL_LOG_FORMAT', 'json')
+LOG_FILE = os.getenv('ETL_LOG_FILE')
+LOG_LEVEL = os.getenv('ETL_LOG_LEVEL', 'INFO')
+# Opt-in cProfile: 'all', or comma-separated span names (e.g. "diff,inserts")
+PROFILE_SPANS = os.getenv('ETL_PROFILE', '')
+PROFILE_DIR = os.getenv('ETL_PROFILE_DIR', '.')
+
+# Ties every record of one run together; a scheduler can pass its own
+RUN_ID = os.getenv('ETL_RUN_ID') or uuid.uuid4().hex[:12]
+
+# db_connection counters reported as per-span deltas. They are process-wide, so a span
+# also counts statements that other threads run while it is open.
+DB_COUNTERS = ['queries', 'query_seconds', 'rows_fetched', 'bytes_sent', 'bytes_received', 'checkouts']
+
+# Same bar as benchmark.py
+REGRESSION_THRESHOLD = 0.25
+
+_state = threading.local()
+_configure_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, run_id, message and the record's fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'run_id': RUN_ID,
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = ' '.join(f'{key}={value}' for key, value in getattr(record, 'fields', {}).items()
+                          if key not in ('plan', 'profile'))
+        line = f"{self.formatTime(record)} {record.levelname} {record.name}: {record.getMessage()} {fields}".rstrip()
+        for extra in ('plan', 'profile'):
+            if extra in getattr(record, 'fields', {}):
+                line += '\n' + json.dumps(record.fields[extra], indent=2, default=str)
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(log_format=LOG_FORMAT, path=LOG_FILE, level=LOG_LEVEL):
+    """
+    Send the 'etl' loggers (this module, db_connection's slow statements, the entry points)
+    to stderr, and append them to ``path`` when given. Calling it again replaces the handlers.
+    """
+    logger = logging.getLogger('etl')
+    with _configure_lock:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        formatter = JsonFormatter() if log_format == 'json' else TextFormatter()
+        handlers = [logging.StreamHandler()]
+        if path:
+            handlers.append(logging.FileHandler(path))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = False
+    return logger
+
+
+def get_logger(name=None):
+    """A logger under 'etl', configured from the ETL_LOG_* settings on first use."""
+    if not logging.getLogger('etl').handlers:
+        configure_logging()
+    return logging.getLogger(f'etl.{name}' if name else 'etl')
+
+
+class Span:
+    """An open span; ``set`` and ``add`` attach row counts and other fields to its record."""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = dict(fields)
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.fields[key] = self.fields.get(key, 0) + value
+
+
+def _stack():
+    if not hasattr(_state, 'spans'):
+        _state.spans = []
+    return _state.spans
+
+
+def _should_profile(name, profile):
+    if profile is not None:
+        return profile
+    names = {value.strip() for value in PROFILE_SPANS.split(',') if value.strip()}
+    return 'all' in names or name in names
+
+
+def _profile_summary(profiler, path, top=15):
+    """Save the profile for snakeviz / pstats and return its most expensive functions."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    file_name = os.path.join(PROFILE_DIR, f"{RUN_ID}-{re.sub(r'[^A-Za-z0-9_.-]', '_', path)}.prof")
+    profiler.dump_stats(file_name)
+    stats = pstats.Stats(profiler).stats
+    costliest = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    return {
+        'file': file_name,
+        'top': [
+            {'function': f"{function} ({os.path.basename(source)}:{line})", 'calls': calls,
+             'own_seconds': round(own, 3), 'cumulative_seconds': round(cumulative, 3)}
+            for (source, line, function), (_, calls, own, cumulative, _) in costliest
+        ]
+    }
+
+
+@contextmanager
+def span(name, profile=None, **fields):
+    """
+    Time one pipeline phase. Nested spans are named after their parents
+    ('process_staging_data.load_staging'). On exit one record is logged with the
+    duration, the DB round trips, rows fetched and bytes moved while it was open, any
+    fields given here or through the yielded Span, and status 'error' plus the
+    exception if the block raised (the exception still propagates).
+
+    ``profile`` forces cProfile on or off for this span; by default ETL_PROFILE decides.
+    Only the outermost profiled span of a thread is profiled.
+    """
+    stack = _stack()
+    path = '.'.join([parent.name for parent in stack[-1:]] + [name])
+    current = Span(path, fields)
+    profiler = None
+    if _should_profile(name, profile) and not getattr(_state, 'profiling', False):
+        profiler = cProfile.Profile()
+    before = get_metrics()
+    start = time.perf_counter()
+    stack.append(current)
+    status = 'ok'
+    if profiler is not None:
+        _state.profiling = True
+        profiler.enable()
+    try:
+        yield current
+    except BaseException as error:
+        status = 'error'
+        current.fields['error'] = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _state.profiling = False
+        stack.pop()
+        seconds = time.perf_counter() - start
+        after = get_metrics()
+        record = {'event': 'span', 'span': path, 'status': status, 'seconds': round(seconds, 3)}
+        for counter in DB_COUNTERS:
+            delta = after[counter] - before[counter]
+            record[f'db_{counter}'] = round(delta, 3) if isinstance(delta, float) else delta
+        record.update(current.fields)
+        if profiler is not None:
+            record['profile'] = _profile_summary(profiler, path)
+        get_logger('span').log(logging.ERROR if status == 'error' else logging.INFO, path, extra={'fields': record})
+
+
+def read_spans(path):
+    """Span records of a JSON log file, grouped by run_id in the order the runs appear."""
+    runs = {}
+    with open(path) as log_file:
+        for line in log_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('event') == 'span':
+                runs.setdefault(entry['run_id'], []).append(entry)
+    return runs
+
+
+def span_totals(records):
+    """Seconds, rows and DB round trips per span name, summed over repeated spans."""
+    totals = {}
+    for record in records:
+        entry = totals.setdefault(record['span'], {'count': 0, 'seconds': 0.0, 'rows': 0, 'db_queries': 0, 'errors': 0})
+        entry['count'] += 1
+        entry['seconds'] = round(entry['seconds'] + record['seconds'], 3)
+        entry['rows'] += record.get('rows') or 0
+        entry['db_queries'] += record.get('db_queries') or 0
+        entry['errors'] += record['status'] == 'error'
+    return totals
+
+
+def _root(records):
+    return next((record['span'] for record in reversed(records) if '.' not in record['span']), None)
+
+
+def compare_runs(runs, run_id=None, baseline_id=None, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare a run (default: the last in the log) with a baseline (default: the previous run
+    of the same entry point). Returns (run_id, baseline_id, totals, regressions).
+    """
+    run_ids = list(runs)
+    run_id = run_id or run_ids[-1]
+    if baseline_id is None:
+        root = _root(runs[run_id])
+        earlier = run_ids[:run_ids.index(run_id)]
+        baseline_id = next((rid for rid in reversed(earlier) if _root(runs[rid]) == root), None)
+    totals = span_totals(runs[run_id])
+    if baseline_id is None:
+        return run_id, None, totals, []
+    before = span_totals(runs[baseline_id])
+    regressions = [
+        {'span': name, 'before': before[name]['seconds'], 'after': entry['seconds'],
+         'change': round(entry['seconds'] / before[name]['seconds'] - 1, 3)}
+        for name, entry in totals.items()
+        if before.get(name, {}).get('seconds') and entry['seconds'] > before[name]['seconds'] * (1 + threshold)
+    ]
+    return run_id, baseline_id, totals, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise the spans of an ETL_LOG_FILE and compare runs.")
+    parser.add_argument('log_file')
+    parser.add_argument('--run-id', help="Run to show (default: the last one)")
+    parser.add_argument('--baseline', help="Run to compare against (default: the previous run of the same entry point)")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    runs = read_spans(args.log_file)
+    if not runs:
+        sys.exit(f"No span records in {args.log_file}")
+    run_id, baseline_id, totals, regressions = compare_runs(runs, args.run_id, args.baseline, args.threshold)
+    print(f"Run {run_id}" + (f" against {baseline_id}" if baseline_id else " (no earlier run to compare)"))
+    for name, entry in totals.items():
+        print(f"  {name:<45} {entry['seconds']:>9.3f}s  {entry['rows']:>9} rows  {entry['db_queries']:>7} queries"
+              + (f"  {entry['errors']} error(s)" if entry['errors'] else ''))
+    for regression in regressions:
+        print(f"REGRESSION {regression['span']}: {regression['before']}s -> {regression['after']}s "
+              f"({regression['change']:+.0%})")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Time, Numeric, JSON, ForeignKey, TIMESTAMP, Boolean, UniqueConstraint, func
+from sqlalchemy import Column, Integer, String, Date, Time, Numeric, JSON, ForeignKey, TIMESTAMP, Boolean, UniqueConstraint, ForeignKeyConstraint, CheckConstraint, Index, DDL, event, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -74,6 +74,7 @@ class FctEventDetails(Base):
     unticketed = Column(Integer, nullable=False)
     additional_attributes = Column(JSON)
     detail_hash = Column(String(100), nullable=False, unique=True)
+    __table_args__ = (Index('idx_event_details_event', 'event_id'),)
 
 class DimScenario(Base):
     __tablename__ = 'dim_scenario'
@@ -100,16 +101,228 @@ class DimVersion(Base):
     status = Column(String(20), default='DRAFT')
     __table_args__ = (UniqueConstraint('scenario_id', 'version_number'),)
 
+# version_event_bridge is partitioned by version_id: LIST gives one partition per version
+# (created ahead by create_version_partitions, or by a trigger on dim_version), HASH spreads
+# versions over a fixed set of partitions.
+BRIDGE_PARTITION_STRATEGY = 'LIST'
+BRIDGE_HASH_PARTITIONS = 16
+
 class VersionEventBridge(Base):
     __tablename__ = 'version_event_bridge'
     
-    bridge_id = Column(Integer, primary_key=True)
-    version_id = Column(Integer, ForeignKey('dim_version.version_id'))
+    # The partition key has to be part of every unique constraint, including the primary key
+    bridge_id = Column(Integer, primary_key=True, autoincrement=True)
+    version_id = Column(Integer, ForeignKey('dim_version.version_id'), primary_key=True)
     event_id = Column(Integer, ForeignKey('fct_event_base.event_id'))
     detail_id = Column(Integer, ForeignKey('fct_event_details.detail_id'))
     is_active = Column(Boolean, default=True)
     added_at = Column(TIMESTAMP, default=func.current_timestamp())
     added_by = Column(String(50))
-    __table_args__ = (UniqueConstraint('version_id', 'event_id'),)
+    __table_args__ = (
+        UniqueConstraint('version_id', 'event_id'),
+        # Covering index for vw_event_by_version / compare_versions: version-scoped, active rows,
+        # returning event_id and detail_id without touching the heap
+        Index('idx_bridge_version_active', 'version_id', 'is_active', 'event_id', postgresql_include=['detail_id']),
+        Index('idx_bridge_event', 'event_id'),
+        {'postgresql_partition_by': f'{BRIDGE_PARTITION_STRATEGY} (version_id)'}
+    )
+
+def bridge_partition_ddl(strategy=BRIDGE_PARTITION_STRATEGY, hash_partitions=BRIDGE_HASH_PARTITIONS):
+    if strategy == 'HASH':
+        return '\n'.join(
+            f"CREATE TABLE IF NOT EXISTS version_event_bridge_p{remainder} PARTITION OF version_event_bridge "
+            f"FOR VALUES WITH (MODULUS {hash_partitions}, REMAINDER {remainder});"
+            for remainder in range(hash_partitions)
+        )
+    # No DEFAULT partition: adding a partition would scan it, and fail once it held that version's rows
+    return """
+    CREATE OR REPLACE FUNCTION create_version_event_bridge_partition()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF to_regclass('version_event_bridge_v' || NEW.version_id) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF version_event_bridge FOR VALUES IN (%s)',
+                'version_event_bridge_v' || NEW.version_id, NEW.version_id
+            );
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION create_version_partitions(
+        p_ahead INTEGER DEFAULT 50
+    )
+    RETURNS INTEGER AS $$
+    DECLARE
+        v_next INTEGER;
+        v_version_id INTEGER;
+        v_parent TEXT;
+        v_created INTEGER := 0;
+    BEGIN
+        EXECUTE format(
+            'SELECT last_value + CASE WHEN is_called THEN 1 ELSE 0 END FROM %s',
+            pg_get_serial_sequence('dim_version', 'version_id')
+        ) INTO v_next;
+
+        FOR v_version_id IN
+            SELECT version_id FROM dim_version
+            UNION
+            SELECT generate_series(v_next, v_next + p_ahead - 1)
+            ORDER BY 1
+        LOOP
+            -- obt_event_by_version is partitioned the same way, when it exists
+            FOREACH v_parent IN ARRAY ARRAY['version_event_bridge', 'obt_event_by_version'] LOOP
+                IF to_regclass(v_parent) IS NOT NULL AND to_regclass(v_parent || '_v' || v_version_id) IS NULL THEN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF %I FOR VALUES IN (%s)',
+                        v_parent || '_v' || v_version_id, v_parent, v_version_id
+                    );
+                    v_created := v_created + 1;
+                END IF;
+            END LOOP;
+        END LOOP;
+        RETURN v_created;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS create_bridge_partition ON dim_version;
+    CREATE TRIGGER create_bridge_partition
+    AFTER INSERT ON dim_version
+    FOR EACH ROW EXECUTE FUNCTION create_version_event_bridge_partition();
+    """
+
+# DDL() applies %-formatting to its statement, so the format() placeholders need escaping
+event.listen(VersionEventBridge.__table__, 'after_create', DDL(bridge_partition_ddl().replace('%', '%%')))
+
+class ObtEventByVersion(Base):
+    """vw_event_by_version materialized per version (see refresh_obt_event_by_version)."""
+    __tablename__ = 'obt_event_by_version'
+    
+    scenario_id = Column(Integer)
+    version_id = Column(Integer, primary_key=True)
+    version_code = Column(String(50))
+    scenario_name = Column(String(100))
+    event_id = Column(Integer, primary_key=True)
+    hash_key = Column(String(100))
+    sport_id = Column(Integer)
+    venue_id = Column(Integer)
+    subvenue_id = Column(Integer)
+    region_id = Column(Integer)
+    zone_id = Column(Integer)
+    cluster_id = Column(Integer)
+    day_id = Column(Integer)
+    session_id = Column(Integer)
+    competition_type = Column(String(1))
+    event_type = Column(String(15))
+    date_start = Column(Date)
+    start_time = Column(Time)
+    date_end = Column(Date)
+    end_time = Column(Time)
+    gross_seats = Column(Integer)
+    seat_kill = Column(Numeric(5, 2))
+    est_pct_ticksold = Column(Numeric(5, 2))
+    net_seats = Column(Integer)
+    est_sold_seats = Column(Integer)
+    workforce = Column(Integer)
+    unticketed = Column(Integer)
+    additional_attributes = Column(JSON)
+    is_active = Column(Boolean)
+    # One partition per version, created by create_obt_partition or create_version_partitions
+    __table_args__ = ({'postgresql_partition_by': 'LIST (version_id)'},)
+
+# No DEFAULT partition: each version's partition is created with the version, or ahead of it
+OBT_PARTITION_DDL = """
+CREATE OR REPLACE FUNCTION create_obt_event_by_version_partition()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF to_regclass('obt_event_by_version_v' || NEW.version_id) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF obt_event_by_version FOR VALUES IN (%s)',
+            'obt_event_by_version_v' || NEW.version_id, NEW.version_id
+        );
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS create_obt_partition ON dim_version;
+CREATE TRIGGER create_obt_partition
+AFTER INSERT ON dim_version
+FOR EACH ROW EXECUTE FUNCTION create_obt_event_by_version_partition();
+"""
+
+# After all tables: the trigger is on dim_version, which the OBT has no foreign key to
+event.listen(Base.metadata, 'after_create', DDL(OBT_PARTITION_DDL.replace('%', '%%')))
+
+class ObtRefreshStatus(Base):
+    __tablename__ = 'obt_refresh_status'
+    
+    version_id = Column(Integer, ForeignKey('dim_version.version_id'), primary_key=True)
+    refreshed_at = Column(TIMESTAMP)
+    source_changed_at = Column(TIMESTAMP)
+    row_count = Column(Integer)
+    refresh_ms = Column(Numeric(12, 3))
+
+class VersionDiffStatus(Base):
+    """One row per version pair whose compare_versions result is in version_diff_cache."""
+    __tablename__ = 'version_diff_status'
+    
+    from_version_id = Column(Integer, ForeignKey('dim_version.version_id'), primary_key=True)
+    to_version_id = Column(Integer, ForeignKey('dim_version.version_id'), primary_key=True)
+    computed_at = Column(TIMESTAMP, default=func.current_timestamp())
+    change_count = Column(Integer)
+    compute_ms = Column(Numeric(12, 3))
+    __table_args__ = (Index('idx_version_diff_status_to', 'to_version_id'),)
+
+class VersionDiffCache(Base):
+    __tablename__ = 'version_diff_cache'
+    
+    from_version_id = Column(Integer, primary_key=True)
+    to_version_id = Column(Integer, primary_key=True)
+    event_id = Column(Integer, primary_key=True)
+    hash_key = Column(String(100))
+    change_type = Column(String(20))
+    changed_fields = Column(JSON)
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ['from_version_id', 'to_version_id'],
+            ['version_diff_status.from_version_id', 'version_diff_status.to_version_id'],
+            ondelete='CASCADE'
+        ),
+    )
+
+class VersionLineage(Base):
+    """Parent of each delta-stored version; snapshots are full checkpoints of the chain."""
+    __tablename__ = 'version_lineage'
+    
+    version_id = Column(Integer, ForeignKey('dim_version.version_id'), primary_key=True)
+    parent_version_id = Column(Integer, ForeignKey('version_lineage.version_id'))
+    depth = Column(Integer, nullable=False)
+    is_snapshot = Column(Boolean, nullable=False)
+    created_at = Column(TIMESTAMP, default=func.current_timestamp())
+    __table_args__ = (Index('idx_version_lineage_parent', 'parent_version_id'),)
+
+class VersionEventDelta(Base):
+    """Events added, removed (detail_id NULL) or modified (detail or is_active) in a version against its parent."""
+    __tablename__ = 'version_event_delta'
+    
+    version_id = Column(Integer, ForeignKey('version_lineage.version_id'), primary_key=True)
+    event_id = Column(Integer, ForeignKey('fct_event_base.event_id'), primary_key=True)
+    detail_id = Column(Integer, ForeignKey('fct_event_details.detail_id'))
+    # The bridge's is_active; FALSE for REMOVED
+    is_active = Column(Boolean, nullable=False, default=True, server_default='true')
+    change_type = Column(String(20), nullable=False)
+    __table_args__ = (
+        CheckConstraint("change_type IN ('ADDED', 'REMOVED', 'MODIFIED')"),
+        CheckConstraint("(change_type = 'REMOVED') = (detail_id IS NULL)"),
+    )
+
+class VersionEventSnapshot(Base):
+    __tablename__ = 'version_event_snapshot'
+    
+    version_id = Column(Integer, ForeignKey('version_lineage.version_id'), primary_key=True)
+    event_id = Column(Integer, ForeignKey('fct_event_base.event_id'), primary_key=True)
+    detail_id = Column(Integer, ForeignKey('fct_event_details.detail_id'), nullable=False)
+    is_active = Column(Boolean, nullable=False, default=True, server_default='true')
 
 # Define other models similarly
@@ -0,0 +1,84 @@
+import argparse
+import time
+
+from db_connection import connection, print_metrics, read_sql, transaction
+
+STALE_VERSIONS_QUERY = """
+SELECT version_id FROM vw_obt_freshness
+WHERE is_stale {status_filter}
+ORDER BY version_id
+"""
+
+
+def refresh_version(conn, version_id):
+    """Rebuild one version's rows of obt_event_by_version; the caller commits."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT refresh_obt_event_by_version(%s)", (version_id,))
+        return cursor.fetchone()[0]
+
+
+def refresh_stale(published_only=True):
+    """
+    Refresh every stale version, one transaction per version so a failure only
+    leaves that version stale. Returns {version_id: {'rows', 'seconds'}}.
+    """
+    status_filter = "AND status = 'PUBLISHED'" if published_only else ""
+    stale = read_sql(STALE_VERSIONS_QUERY.format(status_filter=status_filter))['version_id'].tolist()
+
+    report = {}
+    for version_id in stale:
+        start = time.perf_counter()
+        with transaction() as conn:
+            rows = refresh_version(conn, version_id)
+        report[version_id] = {'rows': rows, 'seconds': round(time.perf_counter() - start, 3)}
+    return report
+
+
+def get_freshness(version_id=None, conn=None):
+    """Refresh status per version from vw_obt_freshness, optionally for a single version."""
+    if version_id is None:
+        return read_sql("SELECT * FROM vw_obt_freshness ORDER BY version_id", conn=conn)
+    return read_sql("SELECT * FROM vw_obt_freshness WHERE version_id = %s", (version_id,), conn=conn)
+
+
+def read_event_by_version(version_id, allow_stale=False):
+    """
+    Read one version's wide rows. Uses obt_event_by_version when it is fresh
+    (or ``allow_stale``), otherwise falls back to the vw_event_by_version join.
+    Returns (DataFrame, source) where source is 'obt' or 'view'.
+    """
+    with connection() as conn:
+        freshness = get_freshness(version_id, conn=conn)
+        is_fresh = len(freshness) and not freshness['is_stale'].iloc[0]
+        source = 'obt' if is_fresh or allow_stale else 'view'
+        table = 'obt_event_by_version' if source == 'obt' else 'vw_event_by_version'
+        df = read_sql(f"SELECT * FROM {table} WHERE version_id = %s", (version_id,), conn=conn)
+    return df, source
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the materialized vw_event_by_version (obt_event_by_version).")
+    parser.add_argument('--version-id', type=int, action='append', help="Version to refresh (repeatable)")
+    parser.add_argument('--stale', action='store_true', help="Refresh every stale published version")
+    parser.add_argument('--include-drafts', action='store_true', help="With --stale, also refresh unpublished versions")
+    args = parser.parse_args()
+
+    try:
+        report = {}
+        for version_id in args.version_id or []:
+            start = time.perf_counter()
+            with transaction() as conn:
+                rows = refresh_version(conn, version_id)
+            report[version_id] = {'rows': rows, 'seconds': round(time.perf_counter() - start, 3)}
+        if args.stale:
+            report.update(refresh_stale(published_only=not args.include_drafts))
+
+        for version_id, stats in report.items():
+            print(f"Refreshed version {version_id}: {stats['rows']} rows in {stats['seconds']}s")
+        print(get_freshness().to_string(index=False))
+    finally:
+        print_metrics()
+
+
+if __name__ == "__main__":
+    main()
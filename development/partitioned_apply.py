@@ -0,0 +1,310 @@
+import argparse
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import datetime
+
+import pandas as pd
+
+from bulk_apply import BULK_EXPIRY_COLUMNS, BULK_ROW_COLUMNS, EVENT_VALUE_COLUMNS, OPEN_VALID_TO, apply_staged_changes, copy_change_batch
+from db_connection import connection, print_metrics, read_sql, table_columns, transaction
+from instrumentation import RUN_ID, span
+from staging_diff import add_hash_keys, build_bulk_change_sets, identify_changes
+from two_phase import finish_prepared, prepared_transactions, recover_prepared, two_phase_available
+
+# hash_key includes venue_id and day_id, so an event never moves between shards of either
+PARTITION_KEYS = ['venue_id', 'day_id']
+DEFAULT_PARTITION_KEY = 'venue_id'
+DEFAULT_WORKERS = int(os.getenv('PARTITION_WORKERS', str(os.cpu_count() or 4)))
+
+STAGED_ROWS_TABLE = 'partitioned_event_rows'
+STAGED_EXPIRIES_TABLE = 'partitioned_event_expiries'
+
+# Prepared transaction ids: <prefix>_<run_id>_version and <prefix>_<run_id>_shard_<n>;
+# the version branch is the marker two_phase.recover_prepared decides a run's outcome by
+GID_PREFIX = 'partitioned_staging'
+
+# apply_changes_bulk's temp tables, as unlogged tables shared by the workers of a run.
+# PREPARE TRANSACTION refuses transactions that touched temp tables.
+STAGED_CHANGES_DDL = """
+CREATE UNLOGGED TABLE IF NOT EXISTS {rows_table} AS
+SELECT NULL::VARCHAR(32) AS run_id, NULL::INTEGER AS shard, hash_key, {value_columns},
+       event_session_id AS old_event_session_id,
+       schedule_version_id AS old_schedule_version_id,
+       version_array AS old_version_array,
+       NULL::VARCHAR(10) AS change_type,
+       NULL::JSONB AS changed_fields,
+       NULL::JSONB AS previous_values
+FROM fct_event_session WITH NO DATA;
+
+CREATE UNLOGGED TABLE IF NOT EXISTS {expiries_table} AS
+SELECT NULL::VARCHAR(32) AS run_id, NULL::INTEGER AS shard, event_session_id, schedule_version_id,
+       NULL::JSONB AS previous_values
+FROM fct_event_session WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS idx_{rows_table}_run ON {rows_table} (run_id, shard);
+CREATE INDEX IF NOT EXISTS idx_{expiries_table}_run ON {expiries_table} (run_id, shard);
+""".format(rows_table=STAGED_ROWS_TABLE, expiries_table=STAGED_EXPIRIES_TABLE,
+           value_columns=', '.join(EVENT_VALUE_COLUMNS))
+
+# Rows per partition key value on both sides of the diff; deletes need the fact side too
+SHARD_SIZES_QUERY = """
+SELECT {key} AS shard_key, sum(rows) AS rows
+FROM (
+    SELECT {key}, count(*) AS rows FROM staging_event_session GROUP BY {key}
+    UNION ALL
+    SELECT {key}, count(*) FROM fct_event_session WHERE is_current = TRUE GROUP BY {key}
+) sizes
+GROUP BY {key}
+ORDER BY rows DESC
+"""
+
+SHARD_FILTER = "({key} = ANY(%(keys)s::INTEGER[]) OR (%(with_null)s AND {key} IS NULL))"
+
+INSERT_VERSION_SQL = """
+INSERT INTO dim_schedule_version (version_number, valid_from, valid_to)
+VALUES (%s, %s, %s) RETURNING schedule_version_id
+"""
+
+
+def plan_shards(conn, partition_by, shard_count):
+    """
+    Spread the partition key values over ``shard_count`` shards of similar row counts,
+    largest value first. Returns the non-empty shards as {'keys', 'with_null', 'rows'}.
+    """
+    sizes = read_sql(SHARD_SIZES_QUERY.format(key=partition_by), conn=conn)
+    shards = [{'keys': [], 'with_null': False, 'rows': 0} for _ in range(shard_count)]
+    for key, rows in zip(sizes['shard_key'], sizes['rows']):
+        shard = min(shards, key=lambda candidate: candidate['rows'])
+        if pd.isna(key):
+            shard['with_null'] = True
+        else:
+            shard['keys'].append(int(key))
+        shard['rows'] += int(rows)
+    return [shard for shard in shards if shard['keys'] or shard['with_null']]
+
+
+def staged_relation(table, columns, run_id, shard=None):
+    """One run's (or one shard's) staged changes, in the shape apply_staged_changes expects."""
+    if not run_id.isalnum():
+        raise ValueError(f"Invalid run id: {run_id}")
+    shard_filter = '' if shard is None else f" AND shard = {int(shard)}"
+    return f"(SELECT {', '.join(columns)} FROM {table} WHERE run_id = '{run_id}'{shard_filter})"
+
+
+def diff_shard(run_id, shard_index, partition_by, shard):
+    """Worker, phase 1: diff one shard in memory and stage its change set (committed). Returns its counts."""
+    shard_filter = SHARD_FILTER.format(key=partition_by)
+    params = {'keys': shard['keys'], 'with_null': shard['with_null']}
+    with span('shard_diff', shard=shard_index, keys=len(shard['keys'])) as phase, transaction() as conn:
+        staging_df = read_sql(f"SELECT * FROM staging_event_session WHERE {shard_filter}", params, conn=conn)
+        current_df = read_sql(
+            f"SELECT * FROM fct_event_session WHERE is_current = TRUE AND {shard_filter}", params, conn=conn
+        )
+        add_hash_keys(staging_df)
+        add_hash_keys(current_df)
+        inserts_df, updates_df, deletes_df = build_bulk_change_sets(*identify_changes(staging_df, current_df))
+        with conn.cursor() as cursor:
+            copy_change_batch(cursor, inserts_df, updates_df, deletes_df, STAGED_ROWS_TABLE, STAGED_EXPIRIES_TABLE,
+                              run_id=run_id, shard=shard_index)
+        counts = {'inserts': len(inserts_df), 'updates': len(updates_df), 'deletes': len(deletes_df)}
+        phase.set(rows=len(staging_df) + len(current_df), **counts)
+    return counts
+
+
+def apply_shard(run_id, shard_index, schedule_version_id, run_timestamp, gid):
+    """Worker, phase 2: apply one shard's staged changes and PREPARE them as ``gid``."""
+    with span('shard_apply', shard=shard_index) as phase, connection() as conn:
+        conn.tpc_begin(gid)
+        try:
+            with conn.cursor() as cursor:
+                report = apply_staged_changes(
+                    cursor, schedule_version_id, run_timestamp,
+                    staged_relation(STAGED_ROWS_TABLE, BULK_ROW_COLUMNS, run_id, shard_index),
+                    staged_relation(STAGED_EXPIRIES_TABLE, BULK_EXPIRY_COLUMNS, run_id, shard_index)
+                )
+            conn.tpc_prepare()
+        except Exception:
+            conn.tpc_rollback()
+            raise
+        # The coordinator commits or rolls back by gid; a prepared connection can't go back to the pool
+        conn.invalidate()
+        phase.set(rows=report['insert']['rows'], phases=report)
+    return report
+
+
+def _gather(futures):
+    """Wait for every future, then raise the first failure (so no worker is left running)."""
+    futures = list(futures)
+    wait(futures)
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        raise errors[0]
+    return [future.result() for future in futures]
+
+
+def _apply_two_phase(pool, new_version_number, run_id, shard_count, report):
+    run_timestamp = datetime.now()
+    version_gid = f'{GID_PREFIX}_{run_id}_version'
+    shard_gids = [f'{GID_PREFIX}_{run_id}_shard_{index}' for index in range(shard_count)]
+
+    # Step 1: The version row is a branch of its own, prepared before any shard is
+    with connection() as conn:
+        conn.tpc_begin(version_gid)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(INSERT_VERSION_SQL, (new_version_number, run_timestamp, OPEN_VALID_TO))
+                schedule_version_id = cursor.fetchone()[0]
+            conn.tpc_prepare()
+        except Exception:
+            conn.tpc_rollback()
+            raise
+        conn.invalidate()
+
+    # Step 2: Every shard applies and prepares in parallel; Step 3: commit version first, then shards
+    try:
+        with span('apply', shards=shard_count) as phase:
+            shard_reports = _gather(
+                pool.submit(apply_shard, run_id, index, schedule_version_id, run_timestamp, gid)
+                for index, gid in enumerate(shard_gids)
+            )
+            phase.set(rows=sum(shard['insert']['rows'] for shard in shard_reports))
+    except Exception as error:
+        unfinished = finish_prepared(
+            [gid for gid in prepared_transactions(GID_PREFIX, run_id) if gid != version_gid] + [version_gid], commit=False
+        )
+        if unfinished:
+            raise RuntimeError(f"Run {run_id} failed ({error}); {len(unfinished)} branch(es) could not be rolled "
+                               f"back and are still prepared: {', '.join(unfinished)}. "
+                               "Run `python partitioned_apply.py recover`") from error
+        raise
+    with span('commit', branches=shard_count + 1) as phase:
+        if finish_prepared([version_gid], commit=True):
+            # Nothing is committed yet, so the run can still be rolled back as a whole
+            unfinished = finish_prepared(shard_gids + [version_gid], commit=False)
+            outcome = (f"{', '.join(unfinished)} still prepared; run `python partitioned_apply.py recover`"
+                       if unfinished else "the run was rolled back")
+            raise RuntimeError(f"Run {run_id} could not commit its version branch and committed nothing; {outcome}")
+        # The version is committed, so every shard has to be: keep going past a failed one
+        unfinished = finish_prepared(shard_gids, commit=True)
+        phase.set(committed=shard_count + 1 - len(unfinished), unfinished=len(unfinished))
+        if unfinished:
+            raise RuntimeError(f"Run {run_id} committed its version and {shard_count - len(unfinished)} of "
+                               f"{shard_count} shards; {', '.join(unfinished)} still prepared. "
+                               "Run `python partitioned_apply.py recover` to commit them")
+    report['shards'] = shard_reports
+    return schedule_version_id
+
+
+def _apply_in_one_transaction(new_version_number, run_id, report):
+    run_timestamp = datetime.now()
+    with span('apply') as phase, transaction() as conn, conn.cursor() as cursor:
+        cursor.execute(INSERT_VERSION_SQL, (new_version_number, run_timestamp, OPEN_VALID_TO))
+        schedule_version_id = cursor.fetchone()[0]
+        applied = apply_staged_changes(
+            cursor, schedule_version_id, run_timestamp,
+            staged_relation(STAGED_ROWS_TABLE, BULK_ROW_COLUMNS, run_id),
+            staged_relation(STAGED_EXPIRIES_TABLE, BULK_EXPIRY_COLUMNS, run_id)
+        )
+        phase.set(rows=applied['insert']['rows'], phases=applied)
+    report['shards'] = [applied]
+    return schedule_version_id
+
+
+def process_staging_partitioned(new_version_number, partition_by=DEFAULT_PARTITION_KEY, workers=DEFAULT_WORKERS,
+                                two_phase=None):
+    """
+    process_staging_data for id-based staging, split into shards by ``partition_by``
+    (venue_id or day_id) and run in a pool of ``workers`` processes, each with its own
+    connections. The coordinator creates the schedule version once.
+
+    Phase 1: every worker diffs its shard and stages the change set in partitioned_event_rows /
+    partitioned_event_expiries. Phase 2 with two-phase commit (needs max_prepared_transactions
+    > number of shards): every worker applies its shard in a prepared transaction, and the
+    version row and all shards are committed together or rolled back together. Otherwise the
+    coordinator applies the staged changes of all shards in one transaction.
+
+    Returns the new schedule_version_id and a report with the shard plan and per-shard counts.
+    """
+    if partition_by not in PARTITION_KEYS:
+        raise ValueError(f"partition_by must be one of {PARTITION_KEYS}")
+    run_id = uuid.uuid4().hex[:12]
+
+    with span('plan', partition_by=partition_by) as phase, transaction() as conn:
+        with conn.cursor() as cursor:
+            if partition_by not in table_columns(cursor, 'staging_event_session'):
+                raise ValueError(f"staging_event_session has no {partition_by}; partitioned runs need id-based staging")
+            cursor.execute(STAGED_CHANGES_DDL)
+        shards = plan_shards(conn, partition_by, workers)
+        phase.set(shards=len(shards), rows=sum(shard['rows'] for shard in shards))
+    if two_phase is None:
+        two_phase = two_phase_available(len(shards) + 1)
+    report = {
+        'run_id': run_id, 'partition_by': partition_by, 'commit_mode': 'two-phase' if two_phase else 'single',
+        'plan': [{'keys': len(shard['keys']), 'rows': shard['rows']} for shard in shards]
+    }
+
+    # Workers log under the coordinator's run id; spawn starts them without the parent's pooled connections
+    os.environ.setdefault('ETL_RUN_ID', RUN_ID)
+    try:
+        with ProcessPoolExecutor(max_workers=max(len(shards), 1), mp_context=multiprocessing.get_context('spawn')) as pool:
+            with span('diff', shards=len(shards)) as phase:
+                counts = _gather(
+                    pool.submit(diff_shard, run_id, index, partition_by, shard) for index, shard in enumerate(shards)
+                )
+                report['diff'] = {key: sum(count[key] for count in counts) for key in ('inserts', 'updates', 'deletes')}
+                phase.set(**report['diff'])
+            if two_phase:
+                schedule_version_id = _apply_two_phase(pool, new_version_number, run_id, len(shards), report)
+            else:
+                schedule_version_id = _apply_in_one_transaction(new_version_number, run_id, report)
+    finally:
+        with transaction() as conn, conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {STAGED_ROWS_TABLE} WHERE run_id = %s", (run_id,))
+            cursor.execute(f"DELETE FROM {STAGED_EXPIRIES_TABLE} WHERE run_id = %s", (run_id,))
+    return schedule_version_id, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partitioned, multi-process process_staging_data.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run = subparsers.add_parser('run', help="Diff and apply staging_event_session as a new schedule version")
+    run.add_argument('version_number')
+    run.add_argument('--partition-by', choices=PARTITION_KEYS, default=DEFAULT_PARTITION_KEY)
+    run.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    run.add_argument('--no-two-phase', action='store_true', help="Apply all shards in one coordinator transaction")
+    plan = subparsers.add_parser('plan', help="Show how the staging rows would be sharded")
+    plan.add_argument('--partition-by', choices=PARTITION_KEYS, default=DEFAULT_PARTITION_KEY)
+    plan.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    subparsers.add_parser('recover', help="Finish runs left prepared by a crashed coordinator")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'run':
+            start = time.perf_counter()
+            schedule_version_id, report = process_staging_partitioned(
+                args.version_number, args.partition_by, args.workers, False if args.no_two_phase else None
+            )
+            print(f"Version {args.version_number} ({schedule_version_id}): {report['diff']['inserts']} inserts, "
+                  f"{report['diff']['updates']} updates, {report['diff']['deletes']} deletes over "
+                  f"{len(report['plan'])} shards in {time.perf_counter() - start:.3f}s ({report['commit_mode']} commit)")
+        elif args.command == 'plan':
+            with connection() as conn:
+                shards = plan_shards(conn, args.partition_by, args.workers)
+                conn.rollback()
+            for index, shard in enumerate(shards):
+                print(f"Shard {index}: {len(shard['keys'])} {args.partition_by} values"
+                      f"{' + NULL' if shard['with_null'] else ''}, {shard['rows']} rows")
+        else:
+            outcome = recover_prepared(GID_PREFIX, 'version')
+            for run_id, result in outcome.items():
+                print(f"Run {run_id}: {result}")
+            print(f"{len(outcome)} run(s) recovered")
+    finally:
+        print_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import re
+
+from db_connection import connection, transaction
+from models import BRIDGE_HASH_PARTITIONS, BRIDGE_PARTITION_STRATEGY, bridge_partition_ddl
+from views_and_functions import (
+    COMPARE_VERSIONS_SQL, INVALIDATE_VERSION_DIFFS_SQL, MARK_OBT_STALE_SQL, RESOLVE_VERSION_EVENTS_SQL, VERSION_EVENT_ROWS_SQL,
+    VW_EVENT_BY_VERSION_SQL
+)
+
+BRIDGE_COLUMNS = ['bridge_id', 'version_id', 'event_id', 'detail_id', 'is_active', 'added_at', 'added_by']
+
+PARTITIONED_BRIDGE_DDL = """
+CREATE TABLE version_event_bridge (
+    bridge_id SERIAL,
+    version_id INTEGER NOT NULL REFERENCES dim_version(version_id),
+    event_id INTEGER REFERENCES fct_event_base(event_id),
+    detail_id INTEGER REFERENCES fct_event_details(detail_id),
+    is_active BOOLEAN DEFAULT TRUE,
+    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    added_by VARCHAR(50),
+    PRIMARY KEY (bridge_id, version_id),
+    UNIQUE(version_id, event_id)
+) PARTITION BY {strategy} (version_id);
+"""
+
+BRIDGE_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_bridge_version_active
+    ON version_event_bridge (version_id, is_active, event_id) INCLUDE (detail_id);
+CREATE INDEX IF NOT EXISTS idx_bridge_event ON version_event_bridge (event_id);
+CREATE INDEX IF NOT EXISTS idx_event_details_event ON fct_event_details (event_id);
+"""
+
+# Delta storage tables vw_version_event_rows reads, for schemas built without models.py (benchmarks)
+DELTA_STORAGE_DDL = """
+CREATE TABLE IF NOT EXISTS version_lineage (
+    version_id INTEGER PRIMARY KEY REFERENCES dim_version(version_id),
+    parent_version_id INTEGER REFERENCES version_lineage(version_id),
+    depth INTEGER NOT NULL, is_snapshot BOOLEAN NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS version_event_delta (
+    version_id INTEGER REFERENCES version_lineage(version_id), event_id INTEGER, detail_id INTEGER,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE, change_type VARCHAR(20) NOT NULL, PRIMARY KEY (version_id, event_id)
+);
+CREATE TABLE IF NOT EXISTS version_event_snapshot (
+    version_id INTEGER REFERENCES version_lineage(version_id), event_id INTEGER, detail_id INTEGER NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE, PRIMARY KEY (version_id, event_id)
+);
+"""
+
+
+def is_bridge_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('version_event_bridge')")
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def migrate_version_event_bridge(conn, strategy=BRIDGE_PARTITION_STRATEGY, hash_partitions=BRIDGE_HASH_PARTITIONS, keep_old=False):
+    """
+    Move an existing, unpartitioned version_event_bridge into a table partitioned by version_id.
+
+    Runs on ``conn`` without committing so the caller decides the transaction boundary.
+    bridge_id values and the bridge_id sequence position are preserved, vw_version_event_rows and
+    vw_event_by_version are recreated against the new table, and the old table is dropped unless ``keep_old`` is set.
+    Returns the number of rows moved, or None if the table is already partitioned.
+    """
+    with conn.cursor() as cursor:
+        if is_bridge_partitioned(cursor):
+            return None
+
+        # Views bind to the table itself, so re-point the views at the new table afterwards
+        cursor.execute("SELECT to_regclass('vw_event_by_version') IS NOT NULL")
+        has_view = cursor.fetchone()[0]
+        if has_view:
+            cursor.execute("DROP VIEW vw_event_by_version")
+        cursor.execute("SELECT to_regclass('vw_version_event_rows') IS NOT NULL")
+        has_rows_view = cursor.fetchone()[0]
+        if has_rows_view:
+            cursor.execute("DROP VIEW vw_version_event_rows")
+
+        # Step 1: Move the old table and its indexes out of the way
+        cursor.execute("ALTER TABLE version_event_bridge RENAME TO version_event_bridge_unpartitioned")
+        cursor.execute("""
+            SELECT indexname FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = 'version_event_bridge_unpartitioned'
+        """)
+        for (index_name,) in cursor.fetchall():
+            cursor.execute(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_unpartitioned"')
+
+        # Step 2: Create the partitioned table and its partitions
+        cursor.execute(PARTITIONED_BRIDGE_DDL.format(strategy=strategy))
+        cursor.execute(bridge_partition_ddl(strategy, hash_partitions))
+        if strategy == 'LIST':
+            cursor.execute("""
+                SELECT version_id FROM dim_version
+                UNION
+                SELECT DISTINCT version_id FROM version_event_bridge_unpartitioned WHERE version_id IS NOT NULL
+                ORDER BY 1
+            """)
+            for (version_id,) in cursor.fetchall():
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS version_event_bridge_v{int(version_id)} "
+                    f"PARTITION OF version_event_bridge FOR VALUES IN ({int(version_id)})"
+                )
+
+        # Step 3: Copy rows and carry the sequence forward
+        columns = ', '.join(BRIDGE_COLUMNS)
+        cursor.execute(f"""
+            INSERT INTO version_event_bridge ({columns})
+            SELECT {columns} FROM version_event_bridge_unpartitioned
+        """)
+        moved = cursor.rowcount
+        cursor.execute("""
+            SELECT setval(pg_get_serial_sequence('version_event_bridge', 'bridge_id'),
+                          COALESCE((SELECT MAX(bridge_id) FROM version_event_bridge), 0) + 1, FALSE)
+        """)
+
+        # Step 4: Access-path indexes, view, cleanup
+        cursor.execute(BRIDGE_INDEX_DDL)
+        if has_rows_view:
+            cursor.execute(VERSION_EVENT_ROWS_SQL)
+        if has_view:
+            cursor.execute(VW_EVENT_BY_VERSION_SQL)
+        # The OBT staleness and diff cache triggers stayed on the renamed table
+        for function_name, trigger_sql in (('mark_obt_stale', MARK_OBT_STALE_SQL),
+                                           ('invalidate_version_diffs', INVALIDATE_VERSION_DIFFS_SQL)):
+            cursor.execute("SELECT to_regproc(%s) IS NOT NULL", (function_name,))
+            if cursor.fetchone()[0]:
+                cursor.execute(trigger_sql)
+        if not keep_old:
+            cursor.execute("DROP TABLE version_event_bridge_unpartitioned")
+        cursor.execute("ANALYZE version_event_bridge")
+    return moved
+
+
+# Self-contained copy of the version-bridge model (no dimension FKs) for the benchmark schema
+BENCHMARK_SCHEMA_DDL = """
+CREATE TABLE dim_scenario (
+    scenario_id SERIAL PRIMARY KEY, scenario_name VARCHAR(100) NOT NULL, scenario_description TEXT,
+    created_by VARCHAR(50), created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, category VARCHAR(50), priority INTEGER
+);
+CREATE TABLE dim_version (
+    version_id SERIAL PRIMARY KEY, scenario_id INTEGER REFERENCES dim_scenario(scenario_id),
+    version_number INTEGER NOT NULL, version_code VARCHAR(50) NOT NULL, version_name VARCHAR(100),
+    version_description TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, created_by VARCHAR(50),
+    status VARCHAR(20) DEFAULT 'DRAFT', UNIQUE(scenario_id, version_number)
+);
+CREATE TABLE fct_event_base (
+    event_id SERIAL PRIMARY KEY, hash_key VARCHAR(100) NOT NULL UNIQUE,
+    sport_id INTEGER, venue_id INTEGER, subvenue_id INTEGER, region_id INTEGER, zone_id INTEGER,
+    cluster_id INTEGER, day_id INTEGER, session_id INTEGER, competition_type VARCHAR(1), event_type VARCHAR(15),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, created_by VARCHAR(50), last_modified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE fct_event_details (
+    detail_id SERIAL PRIMARY KEY, event_id INTEGER REFERENCES fct_event_base(event_id),
+    date_start DATE NOT NULL, start_time TIME NOT NULL, date_end DATE NOT NULL, end_time TIME NOT NULL,
+    gross_seats INTEGER NOT NULL, seat_kill NUMERIC(5,2) NOT NULL, est_pct_ticksold NUMERIC(5,2) NOT NULL,
+    net_seats INTEGER NOT NULL, est_sold_seats INTEGER NOT NULL, workforce INTEGER NOT NULL, unticketed INTEGER NOT NULL,
+    additional_attributes JSONB, detail_hash VARCHAR(100), first_version INTEGER
+);
+CREATE TABLE version_event_bridge (
+    bridge_id SERIAL PRIMARY KEY, version_id INTEGER REFERENCES dim_version(version_id),
+    event_id INTEGER REFERENCES fct_event_base(event_id), detail_id INTEGER REFERENCES fct_event_details(detail_id),
+    is_active BOOLEAN DEFAULT TRUE, added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, added_by VARCHAR(50),
+    UNIQUE(version_id, event_id)
+);
+"""
+
+# Every version re-links every event; churn_pct percent of events get new details each version
+BENCHMARK_DATA_SQL = """
+INSERT INTO dim_scenario (scenario_name) VALUES ('Benchmark');
+INSERT INTO dim_version (scenario_id, version_number, version_code)
+SELECT 1, v, 'V' || v FROM generate_series(1, %(versions)s) v;
+INSERT INTO fct_event_base (hash_key, sport_id, venue_id, day_id, session_id, competition_type, event_type)
+SELECT md5(e::TEXT), e %% 40, e %% 35, e %% 19, e, 'O', 'Final' FROM generate_series(1, %(events)s) e;
+INSERT INTO fct_event_details (
+    event_id, date_start, start_time, date_end, end_time, gross_seats, seat_kill, est_pct_ticksold,
+    net_seats, est_sold_seats, workforce, unticketed, first_version
+)
+SELECT e, DATE '2032-07-23' + e %% 19, TIME '09:00' + (v %% 8) * INTERVAL '1 hour', DATE '2032-07-23' + e %% 19,
+       TIME '11:00' + (v %% 8) * INTERVAL '1 hour', 1000 + v, 5, 80, 950, 760 + v, 40, 0, v
+FROM generate_series(1, %(events)s) e
+CROSS JOIN generate_series(1, %(versions)s) v
+WHERE v = 1 OR ((e * 7919 + v * 104729) %% 100) < %(churn_pct)s;
+INSERT INTO version_event_bridge (version_id, event_id, detail_id)
+SELECT v.version_id, d.event_id, d.detail_id
+FROM dim_version v
+JOIN LATERAL (
+    SELECT DISTINCT ON (event_id) event_id, detail_id
+    FROM fct_event_details
+    WHERE first_version <= v.version_number
+    ORDER BY event_id, first_version DESC
+) d ON TRUE;
+ANALYZE;
+"""
+
+def _compare_versions_body():
+    # EXPLAIN on the plpgsql function only shows a Function Scan, so also time its query directly
+    body = COMPARE_VERSIONS_SQL.split('RETURN QUERY', 1)[1].rsplit('END;', 1)[0].strip().rstrip(';')
+    return body.replace('p_version_id1', '%(previous)s').replace('p_version_id2', '%(version)s')
+
+
+def _explain(cursor, query, params):
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+    plan = '\n'.join(row[0] for row in cursor.fetchall())
+    execution_ms = float(re.search(r'Execution Time: ([\d.]+) ms', plan).group(1))
+    return execution_ms, plan
+
+
+def run_benchmark(versions=200, events=2000, churn_pct=5, repeats=5, schema='partition_benchmark', strategy=BRIDGE_PARTITION_STRATEGY):
+    """
+    Build a synthetic ``versions`` x ``events`` dataset in its own schema, EXPLAIN ANALYZE the
+    vw_event_by_version and compare_versions access paths, migrate the bridge to the partitioned
+    layout and measure again. Returns {query: (before_ms, after_ms)} using the median of ``repeats``.
+    """
+    queries = {
+        'vw_event_by_version': "SELECT * FROM vw_event_by_version WHERE version_id = %(version)s",
+        'compare_versions': "SELECT * FROM compare_versions(%(previous)s, %(version)s)",
+        'compare_versions_query': _compare_versions_body()
+    }
+    params = {'version': versions // 2, 'previous': versions // 2 - 1}
+    results = {}
+
+    def measure(cursor, label):
+        for name, query in queries.items():
+            timings = sorted(_explain(cursor, query, params)[0] for _ in range(repeats))
+            results.setdefault(name, {})[label] = timings[len(timings) // 2]
+
+    with connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+                cursor.execute(f"SET search_path TO {schema}")
+                cursor.execute(BENCHMARK_SCHEMA_DDL)
+                cursor.execute(BENCHMARK_DATA_SQL, {'versions': versions, 'events': events, 'churn_pct': churn_pct})
+                cursor.execute(DELTA_STORAGE_DDL)
+                cursor.execute(RESOLVE_VERSION_EVENTS_SQL)
+                cursor.execute(VERSION_EVENT_ROWS_SQL)
+                cursor.execute(VW_EVENT_BY_VERSION_SQL)
+                cursor.execute(COMPARE_VERSIONS_SQL)
+                conn.commit()
+
+                measure(cursor, 'before')
+                migrate_version_event_bridge(conn, strategy)
+                conn.commit()
+                cursor.execute("ANALYZE")
+                measure(cursor, 'after')
+
+                cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+                conn.commit()
+        finally:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute("RESET search_path")
+            conn.commit()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition version_event_bridge by version_id.")
+    parser.add_argument('--strategy', choices=['LIST', 'HASH'], default=BRIDGE_PARTITION_STRATEGY)
+    parser.add_argument('--hash-partitions', type=int, default=BRIDGE_HASH_PARTITIONS)
+    parser.add_argument('--keep-old', action='store_true', help="Keep version_event_bridge_unpartitioned after migrating")
+    parser.add_argument('--create-ahead', type=int, metavar='N',
+                        help="Create LIST partitions for the next N versions (and any version missing one), then exit")
+    parser.add_argument('--benchmark', action='store_true', help="Measure before/after on a synthetic dataset instead of migrating")
+    parser.add_argument('--versions', type=int, default=200)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--churn-pct', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        results = run_benchmark(args.versions, args.events, args.churn_pct, strategy=args.strategy)
+        print(f"{args.versions} versions x {args.events} events, {args.churn_pct}% churn per version (median EXPLAIN ANALYZE ms)")
+        for name, timings in results.items():
+            print(f"  {name:<25} before {timings['before']:>9.2f}  after {timings['after']:>9.2f}")
+        return
+
+    if args.create_ahead is not None:
+        with transaction() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT create_version_partitions(%s)", (args.create_ahead,))
+            print(f"Created {cursor.fetchone()[0]} version_event_bridge partitions.")
+        return
+
+    with transaction() as conn:
+        moved = migrate_version_event_bridge(conn, args.strategy, args.hash_partitions, args.keep_old)
+    if moved is None:
+        print("version_event_bridge is already partitioned.")
+    else:
+        print(f"Moved {moved} rows into partitioned version_event_bridge ({args.strategy}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import argparse
+import csv
+import gzip
+import io
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import boto3
+
+from db_connection import print_metrics, table_columns, transaction
+
+# Byte-range size for objects that were not uploaded in parts
+DEFAULT_CHUNK_SIZE = int(os.getenv('S3_CHUNK_SIZE', str(8 * 1024 * 1024)))
+# Size of each read handed to COPY
+STREAM_READ_SIZE = 1024 * 1024
+SUPPORTED_SUFFIXES = ('.csv', '.csv.gz')
+
+
+def get_s3_client():
+    # S3_ENDPOINT_URL points the loader at MinIO or another S3-compatible stand-in
+    return boto3.client('s3', endpoint_url=os.getenv('S3_ENDPOINT_URL') or None)
+
+
+def parse_s3_uri(uri):
+    parsed = urlparse(uri)
+    if parsed.scheme != 's3':
+        raise ValueError(f"Not an s3:// URI: {uri}")
+    return parsed.netloc, parsed.path.lstrip('/')
+
+
+def list_source_objects(client, uris):
+    """Expand s3://bucket/key and s3://bucket/prefix/ URIs into (bucket, key) pairs of CSV objects."""
+    objects = []
+    for uri in uris:
+        bucket, key = parse_s3_uri(uri)
+        if key.endswith(SUPPORTED_SUFFIXES):
+            objects.append((bucket, key))
+            continue
+        for page in client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=key):
+            objects.extend((bucket, item['Key']) for item in page.get('Contents', []) if item['Key'].endswith(SUPPORTED_SUFFIXES))
+    return objects
+
+
+class S3ObjectStream(io.RawIOBase):
+    """
+    Read-only stream over one S3 object. Multipart uploads are fetched part by part
+    (PartNumber), matching the boundaries S3 stored them with; other objects are
+    fetched in ``chunk_size`` byte ranges. Only one read buffer is held in memory.
+    """
+
+    def __init__(self, client, bucket, key, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        head = client.head_object(Bucket=bucket, Key=key)
+        # Multipart uploads have an ETag of the form "<md5>-<number of parts>"
+        etag = head['ETag'].strip('"')
+        self.parts_count = int(etag.rsplit('-', 1)[1]) if '-' in etag else 1
+        self.size = head['ContentLength']
+        if self.parts_count > 1:
+            self.requests = ({'PartNumber': number} for number in range(1, self.parts_count + 1))
+        else:
+            self.requests = ({'Range': f'bytes={start}-{min(start + chunk_size, self.size) - 1}'}
+                             for start in range(0, self.size, chunk_size))
+        self.metadata = head.get('Metadata', {})
+        self.bytes_transferred = 0
+        self.request_count = 0
+        self._body = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self._body is None:
+                request = next(self.requests, None)
+                if request is None:
+                    return 0
+                response = self.client.get_object(Bucket=self.bucket, Key=self.key, **request)
+                self.request_count += 1
+                if 'PartNumber' in request and 'ContentRange' not in response:
+                    # Some S3 stand-ins ignore PartNumber and send the whole object
+                    self.requests = iter(())
+                self._body = response['Body']
+            data = self._body.read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                self.bytes_transferred += len(data)
+                return len(data)
+            self._body.close()
+            self._body = None
+
+
+class RecordCountingReader:
+    """
+    Pass-through reader that counts CSV records in the bytes it hands out.
+    Newlines inside quoted fields are not record ends; doubled quotes toggle twice.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.records = 0
+        self._in_quotes = False
+        self._last_byte = b'\n'
+
+    def _count(self, data):
+        segments = data.split(b'"')
+        for index, segment in enumerate(segments):
+            if not self._in_quotes:
+                self.records += segment.count(b'\n')
+            if index < len(segments) - 1:
+                self._in_quotes = not self._in_quotes
+        if data:
+            self._last_byte = data[-1:]
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self._count(data)
+        return data
+
+    def readline(self):
+        data = self.stream.readline()
+        self._count(data)
+        return data
+
+    def finish(self):
+        # A last record without a trailing newline still counts
+        if self._last_byte != b'\n':
+            self.records += 1
+            self._last_byte = b'\n'
+        return self.records
+
+
+def load_object(client, bucket, key, table='staging_event_session', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream one CSV (optionally gzipped) object into ``table`` with COPY FROM STDIN in its
+    own transaction (load_objects points it at its load table). The header row names the columns. The load is rolled back if COPY's
+    row count differs from the records in the file (or the object's ``row-count`` metadata).
+    """
+    start = time.perf_counter()
+    raw = S3ObjectStream(client, bucket, key, chunk_size)
+    buffered = io.BufferedReader(raw, buffer_size=STREAM_READ_SIZE)
+    source = gzip.GzipFile(fileobj=buffered) if key.endswith('.gz') else buffered
+    reader = RecordCountingReader(source)
+
+    header = next(csv.reader([reader.readline().decode('utf-8-sig')]))
+    columns = [column.strip().lower() for column in header]
+
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            unknown = set(columns) - set(table_columns(cursor, table))
+            if unknown:
+                raise ValueError(f"s3://{bucket}/{key}: columns not in {table}: {', '.join(sorted(unknown))}")
+            cursor.copy_expert(
+                "COPY {} ({}) FROM STDIN WITH (FORMAT csv)".format(table, ', '.join(columns)),
+                reader, size=STREAM_READ_SIZE
+            )
+            rows_loaded = cursor.rowcount
+
+        source_rows = reader.finish() - 1
+        expected_rows = int(raw.metadata['row-count']) if 'row-count' in raw.metadata else source_rows
+        if rows_loaded != source_rows or rows_loaded != expected_rows:
+            raise ValueError(
+                f"s3://{bucket}/{key}: COPY loaded {rows_loaded} rows, the file has {source_rows} records"
+                + (f" and its row-count metadata says {expected_rows}" if expected_rows != source_rows else '')
+            )
+
+    seconds = time.perf_counter() - start
+    return {
+        'key': f's3://{bucket}/{key}',
+        'rows': rows_loaded,
+        'bytes': raw.bytes_transferred,
+        'requests': raw.request_count,
+        'multipart': raw.parts_count > 1,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows_loaded / seconds, 1) if seconds else None,
+        'mb_per_second': round(raw.bytes_transferred / 1024 / 1024 / seconds, 2) if seconds else None
+    }
+
+
+def insertable_columns(cursor, table):
+    """Columns of ``table`` an INSERT can write; generated columns are computed by the table."""
+    cursor.execute("""
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+        ORDER BY attnum
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def load_objects(uris, table='staging_event_session', workers=4, chunk_size=DEFAULT_CHUNK_SIZE, truncate=False):
+    """
+    Load every CSV object under ``uris`` into ``table`` as one unit. Files are COPYed
+    ``workers`` at a time, each on its own pooled connection, into an unlogged load table
+    shaped like ``table``. Only when every file has loaded are the rows moved into
+    ``table``, in one transaction (emptying it first with ``truncate``); if any file fails,
+    ``table`` is left as it was. The load table is dropped either way.
+    Returns (per-file results, failures, summary); summary['loaded'] says whether the
+    rows reached ``table``.
+    """
+    client = get_s3_client()
+    objects = list_source_objects(client, uris)
+    load_table = f"{table}_s3load_{uuid.uuid4().hex[:8]}"
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            # Column defaults and NOT NULL come along; indexes and other constraints don't
+            cursor.execute(f"CREATE UNLOGGED TABLE {load_table} (LIKE {table} INCLUDING DEFAULTS)")
+
+    results, failures = [], []
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(load_object, client, bucket, key, load_table, chunk_size): (bucket, key)
+                       for bucket, key in objects}
+            for future in as_completed(futures):
+                bucket, key = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as error:
+                    failures.append({'key': f's3://{bucket}/{key}', 'error': str(error)})
+
+        rows = sum(result['rows'] for result in results)
+        if not failures:
+            with transaction() as conn:
+                with conn.cursor() as cursor:
+                    if truncate:
+                        cursor.execute(f"TRUNCATE {table}")
+                    columns = ', '.join(insertable_columns(cursor, table))
+                    cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {load_table}")
+                    if cursor.rowcount != rows:
+                        raise ValueError(f"Moved {cursor.rowcount} rows into {table}, the files loaded {rows}")
+    finally:
+        with transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {load_table}")
+    seconds = time.perf_counter() - start
+
+    transferred = sum(result['bytes'] for result in results)
+    summary = {
+        'files': len(results),
+        'failed': len(failures),
+        'loaded': not failures,
+        'rows': rows,
+        'bytes': transferred,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds else None,
+        'mb_per_second': round(transferred / 1024 / 1024 / seconds, 2) if seconds else None
+    }
+    return sorted(results, key=lambda result: result['key']), failures, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream CSV schedule drops from S3 into the staging table with COPY.")
+    parser.add_argument('uris', nargs='+', help="s3://bucket/key.csv[.gz] or s3://bucket/prefix/")
+    parser.add_argument('--table', default='staging_event_session')
+    parser.add_argument('--workers', type=int, default=4, help="Files loaded in parallel")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Range size for non-multipart objects")
+    parser.add_argument('--truncate', action='store_true', help="Replace the table's rows instead of appending to them")
+    args = parser.parse_args()
+
+    try:
+        results, failures, summary = load_objects(args.uris, args.table, args.workers, args.chunk_size, args.truncate)
+        for result in results:
+            print(f"{result['key']}: {result['rows']} rows, {result['bytes'] / 1024 / 1024:.2f} MB in "
+                  f"{result['seconds']}s ({result['rows_per_second']} rows/s, {result['mb_per_second']} MB/s, "
+                  f"{result['requests']} {'part' if result['multipart'] else 'range'} requests)")
+        for failure in failures:
+            print(f"FAILED {failure['key']}: {failure['error']}")
+        if failures:
+            print(f"Nothing loaded into {args.table}: {summary['failed']} of {summary['files'] + summary['failed']} "
+                  f"files failed, so it was left as it was")
+            raise SystemExit(1)
+        print(f"Loaded {summary['rows']} rows from {summary['files']} files in "
+              f"{summary['seconds']}s: {summary['rows_per_second']} rows/s, {summary['mb_per_second']} MB/s")
+    finally:
+        print_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+from bulk_apply import EVENT_VALUE_COLUMNS
+from change_detection import detect_changes
+from db_connection import transaction
+from dimension_cache import discrepancy_report, get_dimension_cache, log_discrepancies
+from hashing import compute_hash_keys
+from instrumentation import get_logger, span
+
+logger = get_logger('staging_diff')
+
+
+def resolve_staging_keys(staging_df):
+    """
+    Names-based drops (the 12_ layout) get their surrogate keys from the in-process dimension cache;
+    unmatched names are logged to discrepancy_log instead of silently becoming NULL.
+    Id-based staging is returned as is.
+    """
+    if 'venue_name' not in staging_df.columns:
+        return staging_df
+    with span('resolve_keys', rows=len(staging_df)) as phase:
+        resolved_df, discrepancies = get_dimension_cache().resolve(staging_df)
+        phase.set(discrepancies=len(discrepancies))
+        if len(discrepancies):
+            with transaction() as conn:
+                log_discrepancies(conn, discrepancies, 'staging_event_session')
+            logger.warning("staging discrepancies logged to discrepancy_log", extra={'fields': {
+                'discrepancies': len(discrepancies),
+                'top': discrepancy_report(discrepancies).head(10).reset_index(name='rows').to_dict('records')
+            }})
+    return resolved_df
+
+
+def add_hash_keys(df):
+    df['hash_key'] = compute_hash_keys(df)
+
+
+def identify_changes(staging_df, current_df):
+    """Split staging against the current facts by hash_key into (inserts, updates, deletes)."""
+    # Suffix every column up front so merged column names don't depend on which side they came from
+    merged_df = staging_df.add_suffix('_new').rename(columns={'hash_key_new': 'hash_key'}).merge(
+        current_df.add_suffix('_old').rename(columns={'hash_key_old': 'hash_key'}),
+        on='hash_key', how='left'
+    )
+    inserts_df = merged_df[merged_df['event_session_id_old'].isna()]
+    updates_df = merged_df[~merged_df['event_session_id_old'].isna()]
+    deletes_df = current_df[~current_df['hash_key'].isin(staging_df['hash_key'])]
+    return inserts_df, updates_df, deletes_df
+
+
+def build_bulk_change_sets(inserts_df, updates_df, deletes_df):
+    """Flatten identify_changes' merged frames into the shapes apply_changes_bulk expects."""
+    bulk_inserts = inserts_df[['hash_key'] + [f'{c}_new' for c in EVENT_VALUE_COLUMNS]]
+    bulk_inserts.columns = ['hash_key'] + EVENT_VALUE_COLUMNS
+
+    # Compare every event column of the whole update set at once; only rows that really changed are kept
+    changes = detect_changes(updates_df, EVENT_VALUE_COLUMNS)
+    changed_df = updates_df.loc[changes.index]
+    bulk_updates = changed_df[['hash_key'] + [f'{c}_new' for c in EVENT_VALUE_COLUMNS]].set_axis(
+        ['hash_key'] + EVENT_VALUE_COLUMNS, axis=1
+    )
+    bulk_updates = bulk_updates.assign(
+        event_session_id=changed_df['event_session_id_old'],
+        schedule_version_id=changed_df['schedule_version_id_old'],
+        version_array=changed_df['version_array_old'],
+        changed_fields=changes['changed_fields'],
+        previous_values=changes['previous_values']
+    ).reset_index(drop=True)
+
+    bulk_deletes = deletes_df[['event_session_id', 'schedule_version_id']].copy()
+    bulk_deletes['previous_values'] = deletes_df[EVENT_VALUE_COLUMNS].to_dict('records')
+    return bulk_inserts, bulk_updates, bulk_deletes
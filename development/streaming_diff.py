@@ -0,0 +1,66 @@
+from db_connection import DEFAULT_ITERSIZE, iter_sql_chunks
+from hashing import HASH_KEY_SQL
+
+# hash_key is hex md5, so byte order (COLLATE "C") is the same order Python's str comparison uses
+SORTED_BY_HASH_KEY_QUERY = """
+SELECT * FROM (
+    SELECT src.*, {hash_sql} AS stream_hash_key
+    FROM {table} src
+    {where}
+) keyed
+WHERE stream_hash_key IS NOT NULL
+ORDER BY stream_hash_key COLLATE "C"
+"""
+
+
+def iter_sorted_by_hash_key(conn, table, where='', chunksize=DEFAULT_ITERSIZE):
+    """
+    Stream ``table`` in canonical hash_key order through a server-side cursor.
+    The key is recomputed with HASH_KEY_SQL and replaces any stored hash_key column;
+    rows whose key is NULL (incomplete natural key) can't be matched and are skipped.
+    """
+    query = SORTED_BY_HASH_KEY_QUERY.format(hash_sql=HASH_KEY_SQL, table=table, where=where)
+    for chunk in iter_sql_chunks(query, chunksize=chunksize, conn=conn):
+        chunk = chunk.drop(columns=['hash_key'], errors='ignore')
+        yield chunk.rename(columns={'stream_hash_key': 'hash_key'})
+
+
+def iter_merge_windows(left_chunks, right_chunks, key='hash_key'):
+    """
+    Sort-merge two key-sorted streams of DataFrame chunks.
+
+    Yields (left_df, right_df) pairs that cover consecutive key ranges: every key in a
+    window appears only in that window, so each pair can be diffed on its own. At most
+    one chunk per side is buffered. Keys must be unique within each side.
+    """
+    left_chunks, right_chunks = iter(left_chunks), iter(right_chunks)
+    # iter_sql_chunks always yields at least one (possibly empty) frame carrying the columns
+    left, right = next(left_chunks), next(right_chunks)
+    left_done = right_done = False
+
+    while True:
+        while len(left) == 0 and not left_done:
+            chunk = next(left_chunks, None)
+            if chunk is None:
+                left_done = True
+            else:
+                left = chunk
+        while len(right) == 0 and not right_done:
+            chunk = next(right_chunks, None)
+            if chunk is None:
+                right_done = True
+            else:
+                right = chunk
+
+        if len(left) == 0 and len(right) == 0:
+            return
+
+        # Everything up to the smaller of the two buffered maxima is complete on both sides
+        boundaries = [frame[key].iloc[-1] for frame in (left, right) if len(frame)]
+        boundary = min(boundaries) if len(left) and len(right) else max(boundaries)
+
+        left_in_window = left[key] <= boundary
+        right_in_window = right[key] <= boundary
+        yield left[left_in_window], right[right_in_window]
+        left = left[~left_in_window]
+        right = right[~right_in_window]
@@ -0,0 +1,363 @@
+import argparse
+import json
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from bulk_apply import copy_dataframe
+from db_connection import table_columns
+from hashing import compute_hash_keys
+
+OPEN_VALID_TO = '9999-12-31 23:59:59'
+
+# Games windows per competition_type: first competition day and number of days
+GAMES_WINDOWS = {'O': (date(2032, 7, 21), 19), 'P': (date(2032, 8, 24), 12)}
+
+REGIONS = ['Brisbane', 'Gold Coast', 'Sunshine Coast', 'Regional Queensland']
+ZONE_SUFFIXES = ['North', 'South']
+CLUSTERS_PER_ZONE = 2
+VENUE_KINDS = ['Stadium', 'Arena', 'Aquatic Centre', 'Convention Centre', 'Showgrounds', 'Sports Centre',
+               'Park', 'Velodrome', 'Beach', 'Marina', 'Indoor Centre', 'Tennis Centre']
+VENUE_STATUSES = ['Existing', 'Upgraded', 'New', 'Temporary']
+
+OLYMPIC_SPORTS = [
+    'Athletics', 'Swimming', 'Diving', 'Artistic Swimming', 'Water Polo', 'Rowing', 'Canoe Sprint', 'Canoe Slalom',
+    'Cycling Track', 'Cycling Road', 'Mountain Bike', 'BMX Racing', 'Artistic Gymnastics', 'Rhythmic Gymnastics',
+    'Trampoline', 'Basketball', '3x3 Basketball', 'Volleyball', 'Beach Volleyball', 'Handball', 'Football', 'Hockey',
+    'Rugby Sevens', 'Tennis', 'Table Tennis', 'Badminton', 'Boxing', 'Judo', 'Taekwondo', 'Wrestling', 'Fencing',
+    'Weightlifting', 'Archery', 'Shooting', 'Equestrian', 'Sailing', 'Surfing', 'Skateboarding', 'Sport Climbing',
+    'Triathlon', 'Modern Pentathlon', 'Golf'
+]
+PARALYMPIC_SPORTS = [
+    'Para Athletics', 'Para Swimming', 'Wheelchair Basketball', 'Boccia', 'Goalball', 'Wheelchair Rugby',
+    'Para Cycling Track', 'Wheelchair Tennis', 'Sitting Volleyball', 'Para Powerlifting', 'Blind Football',
+    'Para Table Tennis'
+]
+EVENT_TYPES = ['Preliminary', 'Heat', 'Quarterfinal', 'Semifinal', 'Final', 'Medal Session']
+SESSION_STARTS = [timedelta(hours=hour, minutes=minute) for hour, minute in
+                  [(9, 0), (10, 30), (13, 0), (15, 0), (17, 30), (19, 0), (20, 30)]]
+
+# Column order of staging_event_session (12_create-event-fact-table.sql)
+STAGING_COLUMNS = [
+    'sport_discipline', 'venue_name', 'subvenue_name', 'region_name', 'zone_name', 'cluster_name', 'event_day',
+    'session_id', 'date_start', 'start_time', 'date_end', 'end_time', 'competition_type', 'event_type',
+    'gross_seats', 'seat_kill', 'est_pct_ticksold', 'net_seats', 'est_sold_seats', 'workforce', 'unticketed',
+    'additional_attributes'
+]
+DETAIL_COLUMNS = [
+    'date_start', 'start_time', 'date_end', 'end_time', 'gross_seats', 'seat_kill', 'est_pct_ticksold',
+    'net_seats', 'est_sold_seats', 'workforce', 'unticketed'
+]
+# Share of the churned rows that are modified; the rest is split evenly between removals and additions
+MODIFIED_SHARE = 0.7
+
+
+def _scd_columns(df):
+    # Every generated dimension row is current, as the 81_-87_ update functions leave them
+    return df.assign(valid_from=datetime(2032, 1, 1), valid_to=OPEN_VALID_TO, is_current=True)
+
+
+def generate_dimensions(venues=40, sports=None, seed=2032):
+    """
+    Build the competition and venue dimensions of 11_create-dimension-tables.sql as DataFrames
+    keyed by table name. Surrogate keys are assigned from 1, so generated staging rows can be
+    resolved to ids without a database. Geometry columns are left out.
+    """
+    rng = np.random.default_rng(seed)
+
+    regions = pd.DataFrame({'region_id': range(1, len(REGIONS) + 1), 'region_name': REGIONS,
+                            'area_sqkm': rng.uniform(500, 20000, len(REGIONS)).round(6),
+                            'length_km': rng.uniform(50, 400, len(REGIONS)).round(6)})
+    zones = pd.DataFrame([
+        {'zone_name': f'{region} {suffix}', 'region_id': region_id}
+        for region_id, region in zip(regions['region_id'], regions['region_name']) for suffix in ZONE_SUFFIXES
+    ])
+    zones.insert(0, 'zone_id', range(1, len(zones) + 1))
+    clusters = pd.DataFrame([
+        {'cluster_name': f'{zone} Cluster {number}', 'region_id': region_id, 'zone_id': zone_id}
+        for zone_id, zone, region_id in zip(zones['zone_id'], zones['zone_name'], zones['region_id'])
+        for number in range(1, CLUSTERS_PER_ZONE + 1)
+    ])
+    clusters.insert(0, 'cluster_id', range(1, len(clusters) + 1))
+    status = pd.DataFrame({'status_id': range(1, len(VENUE_STATUSES) + 1), 'status_name': VENUE_STATUSES})
+
+    venue_clusters = clusters.iloc[np.arange(venues) % len(clusters)].reset_index(drop=True)
+    venue_names = [
+        f"{REGIONS[region_id - 1]} {VENUE_KINDS[index % len(VENUE_KINDS)]}"
+        + (f" {index // len(VENUE_KINDS) + 1}" if index >= len(VENUE_KINDS) else '')
+        for index, region_id in enumerate(venue_clusters['region_id'])
+    ]
+    venue_table = pd.DataFrame({
+        'venue_id': range(1, venues + 1),
+        'venue_name': venue_names,
+        'status_id': rng.integers(1, len(VENUE_STATUSES) + 1, venues),
+        'has_subvenue': rng.random(venues) < 0.4,
+        'region_id': venue_clusters['region_id'],
+        'zone_id': venue_clusters['zone_id'],
+        'cluster_id': venue_clusters['cluster_id'],
+        'latitude': rng.uniform(-28.2, -26.4, venues).round(4),
+        'longitude': rng.uniform(152.5, 153.6, venues).round(4),
+        'capacity': (rng.integers(2, 60, venues) * 1000)
+    })
+    subvenues = pd.DataFrame([
+        {'subvenue_name': f'{venue_name} Court {number}', 'venue_id': venue_id, 'capacity': capacity // 3}
+        for venue_id, venue_name, capacity, has_subvenue in venue_table[
+            ['venue_id', 'venue_name', 'capacity', 'has_subvenue']].itertuples(index=False)
+        if has_subvenue for number in range(1, int(rng.integers(2, 4)) + 1)
+    ], columns=['subvenue_name', 'venue_id', 'capacity'])
+    subvenues.insert(0, 'subvenue_id', range(1, len(subvenues) + 1))
+
+    disciplines = [(name, 'O') for name in OLYMPIC_SPORTS] + [(name, 'P') for name in PARALYMPIC_SPORTS]
+    if sports is not None:
+        disciplines = [
+            disciplines[index % len(disciplines)] if index < len(disciplines)
+            else (f"{disciplines[index % len(disciplines)][0]} {index // len(disciplines) + 1}",
+                  disciplines[index % len(disciplines)][1])
+            for index in range(sports)
+        ]
+    sport_table = pd.DataFrame({
+        'sport_id': range(1, len(disciplines) + 1),
+        'sport_discipline': [name for name, _ in disciplines],
+        'venue_id': rng.integers(1, venues + 1, len(disciplines)),
+        'competition_type': [competition_type for _, competition_type in disciplines]
+    })
+
+    calendar = pd.DataFrame([
+        {'event_day': day, 'actual_date': start + timedelta(days=day - 1), 'competition_type': competition_type}
+        for competition_type, (start, days) in GAMES_WINDOWS.items() for day in range(1, days + 1)
+    ])
+    calendar.insert(0, 'day_id', range(1, len(calendar) + 1))
+    calendar['model_date'] = calendar['actual_date']
+    calendar['day_of_week'] = pd.to_datetime(calendar['actual_date']).dt.strftime('%A')
+
+    return {
+        'dim_regions': _scd_columns(regions),
+        'dim_zones': _scd_columns(zones),
+        'dim_clusters': _scd_columns(clusters),
+        'dim_status': _scd_columns(status),
+        'dim_venues': _scd_columns(venue_table),
+        'dim_subvenues': _scd_columns(subvenues),
+        'dim_sports': _scd_columns(sport_table.drop(columns='competition_type')),
+        'dim_calendar': _scd_columns(calendar),
+        # Not a table: which Games each sport belongs to
+        'sport_competition_types': sport_table[['sport_id', 'competition_type']]
+    }
+
+
+def _timestamps(dates, times):
+    return pd.to_datetime(dates.astype(str) + ' ' + times.astype(str))
+
+
+def _session_details(df, rng):
+    # Capacity metrics follow from gross_seats the way the planning workbook derives them
+    gross = df['gross_seats'].to_numpy()
+    kill = rng.uniform(0, 15, len(df)).round(2)
+    sold_pct = rng.uniform(55, 100, len(df)).round(2)
+    net = np.floor(gross * (1 - kill / 100)).astype(int)
+    df['seat_kill'] = kill
+    df['est_pct_ticksold'] = sold_pct
+    df['net_seats'] = net
+    df['est_sold_seats'] = np.floor(net * sold_pct / 100).astype(int)
+    df['workforce'] = (gross // 25 + rng.integers(20, 200, len(df))).astype(int)
+    return df
+
+
+def generate_schedule(dimensions, sessions=5000, seed=2032, first_session_id=1):
+    """
+    Generate ``sessions`` staging_event_session rows (names, not ids, as the schedule drop
+    arrives) against ``dimensions``. session_id is unique, so every row is a distinct event.
+    """
+    rng = np.random.default_rng(seed)
+    sports = dimensions['dim_sports'].merge(dimensions['sport_competition_types'], on='sport_id')
+    venues = dimensions['dim_venues'].merge(dimensions['dim_regions'][['region_id', 'region_name']], on='region_id') \
+        .merge(dimensions['dim_zones'][['zone_id', 'zone_name']], on='zone_id') \
+        .merge(dimensions['dim_clusters'][['cluster_id', 'cluster_name']], on='cluster_id')
+
+    rows = sports.iloc[rng.integers(0, len(sports), sessions)].reset_index(drop=True)
+    rows = rows.merge(venues[['venue_id', 'venue_name', 'region_name', 'zone_name', 'cluster_name', 'capacity']],
+                      on='venue_id', how='left', sort=False)
+    rows['session_id'] = np.arange(first_session_id, first_session_id + sessions)
+
+    days = rows['competition_type'].map({key: days for key, (_, days) in GAMES_WINDOWS.items()}).to_numpy()
+    rows['event_day'] = (rng.random(sessions) * days).astype(int) + 1
+    starts = rows['competition_type'].map({key: pd.Timestamp(start) for key, (start, _) in GAMES_WINDOWS.items()})
+    rows['date_start'] = (starts + pd.to_timedelta(rows['event_day'] - 1, unit='D')).dt.date
+    starts_at = pd.to_datetime(rows['date_start']) + pd.to_timedelta(
+        np.array(SESSION_STARTS)[rng.integers(0, len(SESSION_STARTS), sessions)]
+    )
+    ends_at = starts_at + pd.to_timedelta(rng.integers(4, 9, sessions) * 30, unit='m')
+    rows['start_time'] = starts_at.dt.time
+    # Late sessions finish after midnight
+    rows['date_end'] = ends_at.dt.date
+    rows['end_time'] = ends_at.dt.time
+
+    subvenues = dimensions['dim_subvenues']
+    subvenue_choice = subvenues.groupby('venue_id')['subvenue_name'].agg(list)
+    rows['subvenue_name'] = [
+        options[int(rng.integers(0, len(options)))] if isinstance(options, list) else 'Not Applicable'
+        for options in rows['venue_id'].map(subvenue_choice)
+    ]
+    rows['event_type'] = rng.choice(EVENT_TYPES, sessions)
+    rows['gross_seats'] = np.maximum(500, (rows['capacity'] * rng.uniform(0.5, 1.0, sessions)).astype(int))
+    rows['unticketed'] = np.where(rng.random(sessions) < 0.05, rng.integers(1000, 20000, sessions), 0)
+    rows = _session_details(rows, rng)
+    rows['additional_attributes'] = [
+        {'session_code': f"{name[:3].upper()}{session_id:05d}", 'broadcast': bool(broadcast)}
+        for name, session_id, broadcast in zip(rows['sport_discipline'], rows['session_id'], rng.random(sessions) < 0.6)
+    ]
+    return rows[STAGING_COLUMNS]
+
+
+def churn_schedule(schedule, dimensions, churn_rate, seed, next_session_id):
+    """
+    Next version of ``schedule``: ``churn_rate`` of its rows change. Most of them get new
+    times or capacity figures (same event, new details); the rest are cancelled or replaced
+    by new sessions. Returns (new schedule, next unused session_id).
+    """
+    rng = np.random.default_rng(seed)
+    churned = int(round(len(schedule) * churn_rate))
+    modified_count = int(round(churned * MODIFIED_SHARE))
+    removed_count = (churned - modified_count) // 2
+    added_count = churned - modified_count - removed_count
+
+    positions = rng.permutation(len(schedule))
+    modified = positions[:modified_count]
+    removed = positions[modified_count:modified_count + removed_count]
+
+    schedule = schedule.copy()
+    if modified_count:
+        changed = schedule.iloc[modified].copy()
+        # Retime about half of them and re-estimate capacity for all of them
+        retime = rng.random(modified_count) < 0.5
+        shift = pd.to_timedelta(np.where(retime, rng.choice([-60, -30, 30, 60], modified_count), 0), unit='m')
+        # Sessions start no earlier than 09:00, so an hour's shift keeps date_start (part of hash_key)
+        starts_at = _timestamps(changed['date_start'], changed['start_time']) + shift
+        ends_at = _timestamps(changed['date_end'], changed['end_time']) + shift
+        changed['start_time'] = starts_at.dt.time
+        changed['date_end'] = ends_at.dt.date
+        changed['end_time'] = ends_at.dt.time
+        changed['gross_seats'] = np.maximum(500, (changed['gross_seats'] * rng.uniform(0.9, 1.1, modified_count)).astype(int))
+        changed = _session_details(changed, rng)
+        schedule.iloc[modified] = changed
+
+    schedule = schedule.drop(schedule.index[removed])
+    if added_count:
+        added = generate_schedule(dimensions, added_count, seed=int(rng.integers(0, 2 ** 31)),
+                                  first_session_id=next_session_id)
+        schedule = pd.concat([schedule, added], ignore_index=True)
+    return schedule.reset_index(drop=True), next_session_id + added_count
+
+
+def iter_schedule_versions(dimensions, sessions=5000, versions=5, churn_rate=0.05, seed=2032):
+    """Yield (version_number, staging DataFrame) for ``versions`` successive schedule drops."""
+    schedule = generate_schedule(dimensions, sessions, seed)
+    next_session_id = sessions + 1
+    yield 1, schedule
+    for version_number in range(2, versions + 1):
+        schedule, next_session_id = churn_schedule(schedule, dimensions, churn_rate, seed + version_number, next_session_id)
+        yield version_number, schedule
+
+
+def resolve_ids(schedule, dimensions):
+    """
+    Staging rows with the surrogate keys process_staging_event_session would look up
+    (subvenue 'Not Applicable' -> 99), plus the canonical hash_key.
+    """
+    lookups = [
+        ('dim_sports', 'sport_discipline', 'sport_id'), ('dim_venues', 'venue_name', 'venue_id'),
+        ('dim_regions', 'region_name', 'region_id'), ('dim_zones', 'zone_name', 'zone_id'),
+        ('dim_clusters', 'cluster_name', 'cluster_id')
+    ]
+    resolved = schedule.copy()
+    for table, name_column, id_column in lookups:
+        resolved[id_column] = resolved[name_column].map(dimensions[table].set_index(name_column)[id_column])
+    subvenue_ids = dimensions['dim_subvenues'].set_index(['venue_id', 'subvenue_name'])['subvenue_id']
+    resolved['subvenue_id'] = pd.Series(
+        list(zip(resolved['venue_id'], resolved['subvenue_name'])), index=resolved.index
+    ).map(subvenue_ids)
+    resolved.loc[resolved['subvenue_name'] == 'Not Applicable', 'subvenue_id'] = 99
+    day_ids = dimensions['dim_calendar'].set_index(['event_day', 'competition_type'])['day_id']
+    resolved['day_id'] = pd.Series(
+        list(zip(resolved['event_day'], resolved['competition_type'])), index=resolved.index
+    ).map(day_ids)
+    resolved['hash_key'] = compute_hash_keys(resolved)
+    return resolved
+
+
+def to_wip_staging(schedule, dimensions):
+    """The id-based staging layout read by wip_process_staging_comp_venue_data.py."""
+    resolved = resolve_ids(schedule, dimensions)
+    return pd.DataFrame({
+        'sport_id': resolved['sport_id'], 'venue_id': resolved['venue_id'], 'day_id': resolved['day_id'],
+        'session_id': resolved['session_id'], 'competition_type': resolved['competition_type'],
+        'event_date': resolved['date_start'], 'start_time': resolved['start_time'], 'end_time': resolved['end_time'],
+        'date_start': resolved['date_start'], 'date_end': resolved['date_end'], 'event_type': resolved['event_type'],
+        'gross_seats': resolved['gross_seats'], 'seat_kill': resolved['seat_kill'],
+        'est_ticket_sold': resolved['est_pct_ticksold'], 'net_seats': resolved['net_seats'],
+        'est_sold_seats': resolved['est_sold_seats'], 'workforce_count': resolved['workforce'],
+        'additional_attributes': resolved['additional_attributes']
+    })
+
+
+def load_dataframe(cursor, df, table):
+    """COPY the columns of ``df`` that ``table`` has into it. Returns the row count."""
+    existing = table_columns(cursor, table)
+    if not existing:
+        raise ValueError(f"Table {table} does not exist")
+    columns = [column for column in df.columns if column in existing]
+    return copy_dataframe(cursor, df, table, columns)
+
+
+def load_dimensions(cursor, dimensions, schema=None):
+    """
+    COPY the generated dimensions into ``schema``'s dim_* tables (columns they lack are
+    skipped) and move each SERIAL sequence past the generated ids.
+    """
+    loaded = {}
+    for table, df in dimensions.items():
+        if not table.startswith('dim_'):
+            continue
+        qualified = f'{schema}.{table}' if schema else table
+        loaded[table] = load_dataframe(cursor, df, qualified)
+        id_column = df.columns[0]
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", (qualified, id_column))
+        sequence = cursor.fetchone()[0]
+        if sequence:
+            cursor.execute("SELECT setval(%s, %s)", (sequence, int(df[id_column].max())))
+    return loaded
+
+
+def write_csv(dimensions, versions, directory):
+    """Write each dimension and each version's staging drop as CSV under ``directory``."""
+    os.makedirs(directory, exist_ok=True)
+    for table, df in dimensions.items():
+        if table.startswith('dim_'):
+            df.to_csv(os.path.join(directory, f'{table}.csv'), index=False)
+    for version_number, schedule in versions:
+        drop = schedule.assign(additional_attributes=schedule['additional_attributes'].map(json.dumps))
+        drop.to_csv(os.path.join(directory, f'staging_event_session_v{version_number}.csv'), index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Games schedule and its dimensions as CSV.")
+    parser.add_argument('--sessions', type=int, default=5000)
+    parser.add_argument('--versions', type=int, default=5)
+    parser.add_argument('--churn-rate', type=float, default=0.05, help="Share of sessions that change per version")
+    parser.add_argument('--venues', type=int, default=40)
+    parser.add_argument('--sports', type=int, help="Number of disciplines (default: the Olympic and Paralympic lists)")
+    parser.add_argument('--seed', type=int, default=2032)
+    parser.add_argument('--out', default='synthetic_schedule', help="Output directory")
+    args = parser.parse_args()
+
+    dimensions = generate_dimensions(args.venues, args.sports, args.seed)
+    versions = list(iter_schedule_versions(dimensions, args.sessions, args.versions, args.churn_rate, args.seed))
+    write_csv(dimensions, versions, args.out)
+    for version_number, schedule in versions:
+        print(f"Version {version_number}: {len(schedule)} sessions")
+    print(f"Wrote {len(versions)} staging drops and {sum(1 for t in dimensions if t.startswith('dim_'))} dimensions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+from db_connection import connection
+from instrumentation import get_logger
+
+logger = get_logger('two_phase')
+
+# Prepared transaction ids are <prefix>_<run id>_<branch>, with a run id free of underscores,
+# so the branches of every run of one job can be found and grouped again after a crash
+
+
+def two_phase_available(branch_count):
+    """True when max_prepared_transactions allows ``branch_count`` prepared branches at once."""
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SHOW max_prepared_transactions")
+            available = int(cursor.fetchone()[0]) >= branch_count
+        conn.rollback()
+    return available
+
+
+def prepared_transactions(prefix, run_id=None):
+    """Prepared transaction ids under ``prefix`` (one run's, or all runs') in this database, oldest first."""
+    pattern = f"{prefix}_{run_id or ''}%"
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT gid FROM pg_prepared_xacts
+                WHERE database = current_database() AND gid LIKE %s
+                ORDER BY prepared
+            """, (pattern.replace('_', r'\_'),))
+            gids = [row[0] for row in cursor.fetchall()]
+        conn.rollback()
+    return gids
+
+
+def finish_prepared(gids, commit):
+    """
+    COMMIT PREPARED (or ROLLBACK PREPARED) each of ``gids`` in order, each on its own.
+    Returns the gids that could not be finished; they stay prepared for recover_prepared.
+    """
+    unfinished = []
+    with connection() as conn:
+        for gid in gids:
+            try:
+                if commit:
+                    conn.tpc_commit(gid)
+                else:
+                    conn.tpc_rollback(gid)
+            except Exception:
+                logger.exception("Could not %s prepared branch %s", 'commit' if commit else 'roll back', gid)
+                conn.rollback()
+                unfinished.append(gid)
+    return unfinished
+
+
+def recover_prepared(prefix, marker):
+    """
+    Finish runs under ``prefix`` that a crashed coordinator left prepared. Each run's
+    ``<prefix>_<run id>_<marker>`` branch is prepared first, committed first and rolled
+    back last, so a run whose marker branch is still prepared never committed anything
+    and is rolled back; without it the commit had started and the remaining branches
+    are committed. Returns {run_id: 'committed' | 'rolled back'}, with the number of
+    branches still prepared appended when some could not be finished.
+    """
+    runs = {}
+    for gid in prepared_transactions(prefix):
+        run_id = gid[len(prefix) + 1:].split('_', 1)[0]
+        runs.setdefault(run_id, []).append(gid)
+    outcome = {}
+    for run_id, gids in runs.items():
+        marker_gid = f'{prefix}_{run_id}_{marker}'
+        others = [gid for gid in gids if gid != marker_gid]
+        if marker_gid in gids:
+            unfinished = finish_prepared(others + [marker_gid], commit=False)
+            outcome[run_id] = 'rolled back'
+        else:
+            unfinished = finish_prepared(others, commit=True)
+            outcome[run_id] = 'committed'
+        if unfinished:
+            outcome[run_id] += f" ({len(unfinished)} of {len(gids)} branches still prepared)"
+    return outcome
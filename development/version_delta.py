@@ -0,0 +1,219 @@
+import argparse
+import os
+import time
+
+from db_connection import connection, print_metrics, read_sql, transaction
+
+# Hops between full snapshots; a version is resolved from at most this many deltas
+DEFAULT_SNAPSHOT_INTERVAL = int(os.getenv('VERSION_SNAPSHOT_INTERVAL', '10'))
+
+UNMIGRATED_VERSIONS_QUERY = """
+SELECT v.version_id, v.scenario_id, v.version_number
+FROM dim_version v
+LEFT JOIN version_lineage l ON v.version_id = l.version_id
+WHERE l.version_id IS NULL {scenario_filter}
+ORDER BY v.scenario_id, v.version_number
+"""
+
+# The previous version of the same scenario, as compare_versions' publish trigger uses
+PARENT_VERSION_QUERY = """
+SELECT version_id FROM dim_version
+WHERE scenario_id = %(scenario_id)s AND version_number < %(version_number)s
+ORDER BY version_number DESC
+LIMIT 1
+"""
+
+STORAGE_QUERY = """
+SELECT
+    (SELECT count(*) FROM version_lineage) AS versions,
+    (SELECT count(*) FROM version_lineage WHERE is_snapshot) AS snapshots,
+    (SELECT count(*) FROM version_event_delta) AS delta_rows,
+    (SELECT count(*) FROM version_event_snapshot) AS snapshot_rows,
+    (SELECT count(*) FROM version_event_bridge b
+     WHERE b.version_id IN (SELECT version_id FROM version_lineage)) AS bridge_rows,
+    pg_total_relation_size('version_event_delta') + pg_total_relation_size('version_event_snapshot') AS delta_bytes
+"""
+
+
+def _split(pairs):
+    event_ids, detail_ids = [], []
+    for event_id, detail_id in pairs:
+        event_ids.append(int(event_id))
+        detail_ids.append(None if detail_id is None else int(detail_id))
+    return event_ids, detail_ids
+
+
+def record_version(conn, version_id, parent_version_id, events, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+    """
+    Store a version from its complete set of (event_id, detail_id) pairs: only what differs
+    from ``parent_version_id`` (None for the first version of a chain) is written. The
+    caller commits. Returns the number of delta rows.
+    """
+    event_ids, detail_ids = _split(events)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT record_version_changes(%s, %s, %s::INTEGER[], %s::INTEGER[], TRUE, %s)",
+            (version_id, parent_version_id, event_ids, detail_ids, snapshot_interval)
+        )
+        return cursor.fetchone()[0]
+
+
+def record_changes(conn, version_id, parent_version_id, changes, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+    """
+    Store a version from just its changes against the parent: ``changes`` maps event_id to
+    the new detail_id, or to None for a removed event. The caller commits. Returns the
+    number of delta rows.
+    """
+    event_ids, detail_ids = _split(changes.items())
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT record_version_changes(%s, %s, %s::INTEGER[], %s::INTEGER[], FALSE, %s)",
+            (version_id, parent_version_id, event_ids, detail_ids, snapshot_interval)
+        )
+        return cursor.fetchone()[0]
+
+
+def ingest_staging(conn, scenario_id, version_id, created_by, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+    """
+    Load staging_event_session into ``version_id`` with process_events_for_version in delta
+    mode: event and detail rows are written as usual but no bridge rows, and the version is
+    recorded against the previous version of its scenario, which must already be in delta
+    storage. The caller commits. Returns the number of staging rows processed.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT process_events_for_version(%s, %s, %s, 'DELTA', %s)",
+            (scenario_id, version_id, created_by, snapshot_interval)
+        )
+        return cursor.fetchone()[0]
+
+
+def get_lineage(conn, version_id):
+    """The chain from ``version_id`` up to and including its nearest snapshot, as a DataFrame."""
+    return read_sql("""
+        WITH RECURSIVE chain AS (
+            SELECT l.*, 0 AS hop FROM version_lineage l WHERE l.version_id = %(version_id)s
+            UNION ALL
+            SELECT l.*, c.hop + 1 FROM chain c
+            JOIN version_lineage l ON l.version_id = c.parent_version_id
+            WHERE NOT c.is_snapshot
+        )
+        SELECT c.version_id, c.parent_version_id, c.depth, c.is_snapshot, c.hop,
+               (SELECT count(*) FROM version_event_delta d WHERE d.version_id = c.version_id) AS delta_rows
+        FROM chain c
+        ORDER BY c.hop
+    """, {'version_id': version_id}, conn=conn)
+
+
+def get_version_events(version_id, conn=None):
+    """A delta-stored version's (event_id, detail_id) set."""
+    return read_sql(
+        "SELECT event_id, detail_id FROM resolve_version_events(%s) ORDER BY event_id", (version_id,), conn=conn
+    )
+
+
+def read_event_by_version(version_id, conn=None):
+    """A delta-stored version's wide rows, as vw_event_by_version returns them."""
+    return read_sql("SELECT * FROM vw_event_by_version_delta WHERE version_id = %s", (version_id,), conn=conn)
+
+
+def migrate_from_bridge(scenario_id=None, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+    """
+    Record every version not yet in delta storage from its version_event_bridge rows (inactive ones included),
+    in version_number order per scenario with the previous version as parent. One
+    transaction per version. Returns {version_id: {'parent', 'delta_rows', 'seconds'}}.
+    """
+    scenario_filter = "AND v.scenario_id = %(scenario_id)s" if scenario_id is not None else ""
+    versions = read_sql(UNMIGRATED_VERSIONS_QUERY.format(scenario_filter=scenario_filter), {'scenario_id': scenario_id})
+
+    report = {}
+    for version in versions.itertuples(index=False):
+        start = time.perf_counter()
+        with transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(PARENT_VERSION_QUERY, {
+                    'scenario_id': int(version.scenario_id), 'version_number': int(version.version_number)
+                })
+                parent = cursor.fetchone()
+                parent_version_id = parent[0] if parent else None
+                # Inactive bridge rows are carried over too, so the delta view returns the same rows
+                cursor.execute("""
+                    SELECT record_version_changes(
+                        %s, %s, COALESCE(array_agg(event_id), '{}'), COALESCE(array_agg(detail_id), '{}'), TRUE, %s,
+                        COALESCE(array_agg(is_active IS NOT FALSE), '{}')
+                    )
+                    FROM version_event_bridge
+                    WHERE version_id = %s
+                """, (int(version.version_id), parent_version_id, snapshot_interval, int(version.version_id)))
+                delta_rows = cursor.fetchone()[0]
+        report[int(version.version_id)] = {
+            'parent': parent_version_id, 'delta_rows': delta_rows, 'seconds': round(time.perf_counter() - start, 3)
+        }
+    return report
+
+
+def verify_version(version_id, conn=None):
+    """
+    Rows of vw_event_by_version and vw_event_by_version_delta that differ, inactive ones included; 0 when they agree.
+    Only versions that still have bridge rows are checked against the bridge; for the others both views read delta storage.
+    """
+    df = read_sql("""
+        SELECT count(*) AS differences FROM (
+            (SELECT * FROM vw_event_by_version WHERE version_id = %(version_id)s
+             EXCEPT ALL
+             SELECT * FROM vw_event_by_version_delta WHERE version_id = %(version_id)s)
+            UNION ALL
+            (SELECT * FROM vw_event_by_version_delta WHERE version_id = %(version_id)s
+             EXCEPT ALL
+             SELECT * FROM vw_event_by_version WHERE version_id = %(version_id)s)
+        ) d
+    """, {'version_id': version_id}, conn=conn)
+    return int(df['differences'].iloc[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delta-only version storage (version_event_delta).")
+    parser.add_argument('command', choices=['ingest', 'migrate', 'verify', 'storage', 'lineage'])
+    parser.add_argument('--scenario-id', type=int)
+    parser.add_argument('--version-id', type=int, action='append', help="Versions to verify or show (repeatable)")
+    parser.add_argument('--snapshot-interval', type=int, default=DEFAULT_SNAPSHOT_INTERVAL)
+    parser.add_argument('--created-by', default='version_delta', help="created_by of new event and detail rows (ingest)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'ingest':
+            if args.scenario_id is None or not args.version_id:
+                parser.error("ingest needs --scenario-id and --version-id")
+            start = time.perf_counter()
+            with transaction() as conn:
+                rows = ingest_staging(conn, args.scenario_id, args.version_id[0], args.created_by, args.snapshot_interval)
+                lineage = get_lineage(conn, args.version_id[0])
+            print(f"Version {args.version_id[0]}: {rows} staging rows, {lineage['delta_rows'].iloc[0]} delta rows "
+                  f"in {time.perf_counter() - start:.3f}s")
+        elif args.command == 'migrate':
+            report = migrate_from_bridge(args.scenario_id, args.snapshot_interval)
+            for version_id, stats in report.items():
+                print(f"Version {version_id} (parent {stats['parent']}): {stats['delta_rows']} delta rows in {stats['seconds']}s")
+            print(f"Recorded {len(report)} versions")
+        elif args.command == 'storage':
+            storage = read_sql(STORAGE_QUERY).iloc[0]
+            print(f"{storage['versions']} versions ({storage['snapshots']} snapshots): "
+                  f"{storage['delta_rows']} delta + {storage['snapshot_rows']} snapshot rows "
+                  f"({storage['delta_bytes'] / 1024 / 1024:.2f} MB) for {storage['bridge_rows']} bridge rows")
+        else:
+            with connection() as conn:
+                version_ids = args.version_id or read_sql(
+                    "SELECT version_id FROM version_lineage ORDER BY version_id", conn=conn
+                )['version_id'].tolist()
+                for version_id in version_ids:
+                    if args.command == 'verify':
+                        print(f"Version {version_id}: {verify_version(version_id, conn=conn)} differing rows")
+                    else:
+                        print(f"Version {version_id}:")
+                        print(get_lineage(conn, version_id).to_string(index=False))
+    finally:
+        print_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import argparse
+import time
+from collections import Counter, namedtuple
+from datetime import date, time as time_of_day
+from decimal import Decimal
+
+from db_connection import connection, print_metrics, transaction
+
+CHANGE_TYPES = ('ADDED', 'REMOVED', 'MODIFIED')
+DEFAULT_PAGE_SIZE = 1000
+
+VersionDiffRow = namedtuple('VersionDiffRow', ['event_id', 'hash_key', 'change_type', 'changed_fields'])
+FieldChange = namedtuple('FieldChange', ['old', 'new'])
+
+# jsonb_build_object renders dates, times and numerics as JSON strings/numbers; convert them back
+FIELD_TYPES = {
+    'date_start': date.fromisoformat,
+    'date_end': date.fromisoformat,
+    'start_time': time_of_day.fromisoformat,
+    'end_time': time_of_day.fromisoformat,
+    'gross_seats': int,
+    'seat_kill': Decimal,
+    'est_pct_ticksold': Decimal,
+    'net_seats': int,
+    'est_sold_seats': int,
+    'workforce': int,
+    'unticketed': int
+}
+
+CACHED_PAGE_QUERY = """
+SELECT event_id, hash_key, change_type, changed_fields
+FROM version_diff_cache
+WHERE from_version_id = %(from_version_id)s AND to_version_id = %(to_version_id)s
+AND event_id > %(after_event_id)s
+{change_type_filter}
+ORDER BY event_id
+LIMIT %(page_size)s
+"""
+
+
+def _convert(field, value):
+    if value is None or field not in FIELD_TYPES:
+        return value
+    return FIELD_TYPES[field](str(value) if FIELD_TYPES[field] is Decimal else value)
+
+
+def to_diff_row(record):
+    """Turn an (event_id, hash_key, change_type, changed_fields) record into a VersionDiffRow."""
+    event_id, hash_key, change_type, changed_fields = record
+    if changed_fields is not None:
+        changed_fields = {
+            field: FieldChange(_convert(field, change['old']), _convert(field, change['new']))
+            for field, change in changed_fields.items()
+        }
+    return VersionDiffRow(event_id, hash_key, change_type, changed_fields)
+
+
+def is_cached(conn, from_version_id, to_version_id):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT 1 FROM version_diff_status WHERE from_version_id = %s AND to_version_id = %s
+        """, (from_version_id, to_version_id))
+        return cursor.fetchone() is not None
+
+
+def cache_version_diff(conn, from_version_id, to_version_id):
+    """Compute the pair's diff into version_diff_cache; the caller commits. Returns the change count."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT cache_version_diff(%s, %s)", (from_version_id, to_version_id))
+        return cursor.fetchone()[0]
+
+
+def get_diff_page(conn, from_version_id, to_version_id, after_event_id=0, page_size=DEFAULT_PAGE_SIZE, change_types=None):
+    """
+    One page of a cached diff in event_id order (keyset pagination).
+    Returns (rows, next_after_event_id); next_after_event_id is None on the last page.
+    """
+    change_type_filter = "AND change_type = ANY(%(change_types)s)" if change_types else ""
+    with conn.cursor() as cursor:
+        cursor.execute(CACHED_PAGE_QUERY.format(change_type_filter=change_type_filter), {
+            'from_version_id': from_version_id, 'to_version_id': to_version_id,
+            'after_event_id': after_event_id, 'page_size': page_size, 'change_types': list(change_types or [])
+        })
+        rows = [to_diff_row(record) for record in cursor.fetchall()]
+    next_after = rows[-1].event_id if len(rows) == page_size else None
+    return rows, next_after
+
+
+def iter_diff_pages(from_version_id, to_version_id, page_size=DEFAULT_PAGE_SIZE, change_types=None, fill_cache=True):
+    """
+    Stream the diff between two versions as lists of up to ``page_size`` VersionDiffRows.
+
+    With ``fill_cache`` an uncached pair is computed into version_diff_cache first (its own
+    transaction), then paged by event_id. Without it, uncached pairs are streamed straight
+    from compare_versions through a server-side cursor.
+    """
+    with connection() as conn:
+        cached = is_cached(conn, from_version_id, to_version_id)
+        if not cached and fill_cache:
+            cache_version_diff(conn, from_version_id, to_version_id)
+            conn.commit()
+            cached = True
+
+        if cached:
+            after_event_id = 0
+            while after_event_id is not None:
+                rows, after_event_id = get_diff_page(
+                    conn, from_version_id, to_version_id, after_event_id, page_size, change_types
+                )
+                if rows:
+                    yield rows
+            return
+
+        query = "SELECT * FROM compare_versions(%s, %s) d"
+        params = [from_version_id, to_version_id]
+        if change_types:
+            query += " WHERE d.change_type = ANY(%s)"
+            params.append(list(change_types))
+        with conn.cursor(name=f'version_diff_{from_version_id}_{to_version_id}') as cursor:
+            cursor.itersize = page_size
+            cursor.execute(query + " ORDER BY d.event_id", params)
+            while True:
+                records = cursor.fetchmany(page_size)
+                if not records:
+                    break
+                yield [to_diff_row(record) for record in records]
+
+
+def iter_version_diff(from_version_id, to_version_id, page_size=DEFAULT_PAGE_SIZE, change_types=None, fill_cache=True):
+    """Row-at-a-time view of iter_diff_pages."""
+    for page in iter_diff_pages(from_version_id, to_version_id, page_size, change_types, fill_cache):
+        yield from page
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two schedule versions (served from version_diff_cache).")
+    parser.add_argument('from_version_id', type=int)
+    parser.add_argument('to_version_id', type=int)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--change-type', choices=CHANGE_TYPES, action='append', help="Only show these change types")
+    parser.add_argument('--no-cache', action='store_true', help="Stream from compare_versions without filling the cache")
+    parser.add_argument('--recompute', action='store_true', help="Recompute the cached diff first")
+    parser.add_argument('--show', type=int, default=20, help="Number of changed events to print")
+    args = parser.parse_args()
+
+    try:
+        if args.recompute:
+            with transaction() as conn:
+                cache_version_diff(conn, args.from_version_id, args.to_version_id)
+
+        start = time.perf_counter()
+        counts = Counter()
+        pages = 0
+        for page in iter_diff_pages(args.from_version_id, args.to_version_id, args.page_size,
+                                    args.change_type, fill_cache=not args.no_cache):
+            pages += 1
+            for row in page:
+                if sum(counts.values()) < args.show:
+                    print(f"{row.change_type:<8} event {row.event_id} {row.hash_key} "
+                          f"{', '.join(row.changed_fields or {})}")
+                counts[row.change_type] += 1
+        elapsed = time.perf_counter() - start
+
+        summary = ', '.join(f"{counts[change_type]} {change_type.lower()}" for change_type in CHANGE_TYPES)
+        print(f"Version {args.from_version_id} -> {args.to_version_id}: {summary} "
+              f"({pages} pages in {elapsed:.3f}s)")
+    finally:
+        print_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.ipc
+
+from db_connection import connection, print_metrics, read_sql
+from s3_loader import get_s3_client, parse_s3_uri
+
+# Where snapshots and their manifest live: a directory, or s3://bucket/prefix
+DEFAULT_STORE = os.getenv('SNAPSHOT_STORE', 'snapshots')
+# Local copies of S3 snapshots, memory-mapped by the loader
+DEFAULT_CACHE_DIR = os.getenv('SNAPSHOT_CACHE_DIR', os.path.join('snapshots', 'cache'))
+# Compressed buffers have to be decompressed into new memory, so only uncompressed files can be
+# read straight from the mapped pages. Local stores default to uncompressed; S3 snapshots are
+# zstd (about a quarter of the size to transfer) and are decompressed once into the local cache.
+# SNAPSHOT_COMPRESSION overrides both.
+DEFAULT_COMPRESSION = os.getenv('SNAPSHOT_COMPRESSION')
+
+MANIFEST_NAME = 'manifest.json'
+
+# Arrow types of the exported vw_event_by_version columns. Surrogate keys and codes are
+# dictionary-encoded, so each distinct value is stored once and pandas gets categoricals.
+ID_TYPE = pa.dictionary(pa.int32(), pa.int32())
+CODE_TYPE = pa.dictionary(pa.int32(), pa.string())
+SNAPSHOT_SCHEMA = pa.schema([
+    ('scenario_id', pa.int32()),
+    ('version_id', pa.int32()),
+    ('version_code', CODE_TYPE),
+    ('scenario_name', CODE_TYPE),
+    ('event_id', pa.int32()),
+    ('hash_key', pa.string()),
+    ('sport_id', ID_TYPE),
+    ('venue_id', ID_TYPE),
+    ('subvenue_id', ID_TYPE),
+    ('region_id', ID_TYPE),
+    ('zone_id', ID_TYPE),
+    ('cluster_id', ID_TYPE),
+    ('day_id', ID_TYPE),
+    ('session_id', pa.int32()),
+    ('competition_type', CODE_TYPE),
+    ('event_type', CODE_TYPE),
+    ('date_start', pa.date32()),
+    ('start_time', pa.time64('us')),
+    ('date_end', pa.date32()),
+    ('end_time', pa.time64('us')),
+    ('gross_seats', pa.int32()),
+    # NUMERIC(5,2) in the model; psycopg2 returns Decimals, kept exact
+    ('seat_kill', pa.decimal128(5, 2)),
+    ('est_pct_ticksold', pa.decimal128(5, 2)),
+    ('net_seats', pa.int32()),
+    ('est_sold_seats', pa.int32()),
+    ('workforce', pa.int32()),
+    ('unticketed', pa.int32()),
+    # Serialized once by PostgreSQL at export; json.loads it only where it is needed
+    ('additional_attributes', pa.string())
+])
+
+# Active rows of one version; JSONB comes back as text so Python never re-serializes it
+EXPORT_QUERY = """
+SELECT {columns}
+FROM vw_event_by_version
+WHERE version_id = %(version_id)s AND is_active
+ORDER BY event_id
+""".format(columns=', '.join(
+    f'{field.name}::TEXT AS {field.name}' if field.name == 'additional_attributes' else field.name
+    for field in SNAPSHOT_SCHEMA
+))
+
+PUBLISHED_VERSIONS_QUERY = """
+SELECT version_id FROM dim_version WHERE status = 'PUBLISHED' ORDER BY version_id
+"""
+
+
+def _is_s3(store):
+    return store.startswith('s3://')
+
+
+def store_compression(store, compression=DEFAULT_COMPRESSION):
+    """``compression`` if given, else zstd for an S3 store and uncompressed for a local one."""
+    return compression or ('zstd' if _is_s3(store) else 'uncompressed')
+
+
+def _s3_key(store, name):
+    bucket, prefix = parse_s3_uri(store)
+    return bucket, f"{prefix.rstrip('/')}/{name}" if prefix else name
+
+
+def read_manifest(store=DEFAULT_STORE, client=None):
+    """{version_id (str): entry} for every snapshot in ``store``; empty if there is none yet."""
+    if _is_s3(store):
+        client = client or get_s3_client()
+        bucket, key = _s3_key(store, MANIFEST_NAME)
+        try:
+            return json.loads(client.get_object(Bucket=bucket, Key=key)['Body'].read())
+        except client.exceptions.NoSuchKey:
+            return {}
+    path = os.path.join(store, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def _write_manifest(manifest, store, client=None):
+    body = json.dumps(manifest, indent=2, sort_keys=True).encode()
+    if _is_s3(store):
+        bucket, key = _s3_key(store, MANIFEST_NAME)
+        (client or get_s3_client()).put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/json')
+        return
+    # Replace atomically so a concurrent loader never reads half a manifest
+    path = os.path.join(store, MANIFEST_NAME)
+    with open(path + '.tmp', 'wb') as manifest_file:
+        manifest_file.write(body)
+    os.replace(path + '.tmp', path)
+
+
+def to_arrow(df):
+    """A vw_event_by_version DataFrame as a table of SNAPSHOT_SCHEMA."""
+    arrays = []
+    for field in SNAPSHOT_SCHEMA:
+        values = df[field.name]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=field.type.value_type).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=SNAPSHOT_SCHEMA)
+
+
+def snapshot_bytes(table, compression='uncompressed'):
+    """``table`` as an Arrow IPC file, in memory."""
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression=None if compression == 'uncompressed' else compression)
+    with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def export_version(version_id, store=DEFAULT_STORE, compression=DEFAULT_COMPRESSION, conn=None, client=None):
+    """
+    Write one version's active rows to ``store`` as an Arrow IPC file named after its content
+    hash, and record it in the store's manifest. ``compression`` defaults per store (see
+    store_compression). Returns the manifest entry.
+    """
+    start = time.perf_counter()
+    compression = store_compression(store, compression)
+    df = read_sql(EXPORT_QUERY, {'version_id': version_id}, conn=conn)
+    data = snapshot_bytes(to_arrow(df), compression)
+    sha256 = hashlib.sha256(data).hexdigest()
+    name = f'version_{version_id}_{sha256[:12]}.arrow'
+
+    if _is_s3(store):
+        client = client or get_s3_client()
+        bucket, key = _s3_key(store, name)
+        client.put_object(Bucket=bucket, Key=key, Body=data, Metadata={'row-count': str(len(df))})
+    else:
+        os.makedirs(store, exist_ok=True)
+        with open(os.path.join(store, name), 'wb') as snapshot_file:
+            snapshot_file.write(data)
+
+    entry = {
+        'file': name,
+        'rows': len(df),
+        'bytes': len(data),
+        'sha256': sha256,
+        'compression': compression,
+        'scenario_id': int(df['scenario_id'].iloc[0]) if len(df) else None,
+        'version_code': df['version_code'].iloc[0] if len(df) else None,
+        'exported_at': datetime.now().isoformat(timespec='seconds'),
+        'export_seconds': round(time.perf_counter() - start, 3)
+    }
+    manifest = read_manifest(store, client)
+    manifest[str(version_id)] = entry
+    _write_manifest(manifest, store, client)
+    return entry
+
+
+def export_published(store=DEFAULT_STORE, compression=DEFAULT_COMPRESSION, force=False):
+    """Export every PUBLISHED version not yet in the manifest (all of them with ``force``)."""
+    client = get_s3_client() if _is_s3(store) else None
+    exported = set() if force else set(read_manifest(store, client))
+    entries = {}
+    with connection() as conn:
+        version_ids = read_sql(PUBLISHED_VERSIONS_QUERY, conn=conn)['version_id'].tolist()
+        for version_id in version_ids:
+            if str(version_id) not in exported:
+                entries[int(version_id)] = export_version(int(version_id), store, compression, conn, client)
+        conn.rollback()
+    return entries
+
+
+def _local_path(entry, store, cache_dir, client=None):
+    """
+    Path of a snapshot on local disk. S3 snapshots are downloaded into ``cache_dir`` once,
+    checked against the manifest checksum and stored uncompressed, so they can be mapped.
+    """
+    if not _is_s3(store):
+        return os.path.join(store, entry['file'])
+    path = os.path.join(cache_dir, entry['file'])
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        bucket, key = _s3_key(store, entry['file'])
+        data = (client or get_s3_client()).get_object(Bucket=bucket, Key=key)['Body'].read()
+        if hashlib.sha256(data).hexdigest() != entry['sha256']:
+            raise ValueError(f"s3://{bucket}/{key} does not match its manifest checksum")
+        if entry.get('compression', 'zstd') != 'uncompressed':
+            data = snapshot_bytes(pa.ipc.open_file(pa.BufferReader(data)).read_all())
+        with open(path + '.tmp', 'wb') as snapshot_file:
+            snapshot_file.write(data)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def load_version(version_id, store=DEFAULT_STORE, cache_dir=DEFAULT_CACHE_DIR, columns=None, as_arrow=False, manifest=None):
+    """
+    A version's exported rows, read by memory-mapping its snapshot: a DataFrame with
+    categorical ids and codes, or the Arrow table with ``as_arrow``. No database access;
+    S3 snapshots are fetched into ``cache_dir`` on first use. Pass ``manifest`` (from
+    read_manifest) to skip reading it again for every version.
+    """
+    client = get_s3_client() if _is_s3(store) else None
+    manifest = manifest if manifest is not None else read_manifest(store, client)
+    entry = manifest.get(str(version_id))
+    if entry is None:
+        raise KeyError(f"Version {version_id} has no snapshot in {store}; export it first")
+    with pa.memory_map(_local_path(entry, store, cache_dir, client)) as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return table if as_arrow else table.to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar snapshots of vw_event_by_version per version.")
+    parser.add_argument('--store', default=DEFAULT_STORE, help="Directory or s3://bucket/prefix (default: SNAPSHOT_STORE)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help="Export versions (default: PUBLISHED versions without a snapshot)")
+    export.add_argument('--version-id', type=int, action='append')
+    export.add_argument('--force', action='store_true', help="Re-export versions that already have a snapshot")
+    export.add_argument('--compression', default=DEFAULT_COMPRESSION, choices=['zstd', 'lz4', 'uncompressed'],
+                        help="Default: zstd for an S3 store, uncompressed for a directory (or SNAPSHOT_COMPRESSION)")
+    load = subparsers.add_parser('load', help="Load snapshots and compare with reading the view")
+    load.add_argument('--version-id', type=int, action='append', required=True)
+    load.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    load.add_argument('--compare', action='store_true', help="Also time reading vw_event_by_version")
+    subparsers.add_parser('manifest', help="List the snapshots in the store")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'export':
+            if args.version_id:
+                client = get_s3_client() if _is_s3(args.store) else None
+                entries = {version_id: export_version(version_id, args.store, args.compression, client=client)
+                           for version_id in args.version_id}
+            else:
+                entries = export_published(args.store, args.compression, args.force)
+            for version_id, entry in entries.items():
+                print(f"Version {version_id}: {entry['rows']} rows, {entry['bytes'] / 1024:.1f} KB "
+                      f"({entry['compression']}) in {entry['export_seconds']}s -> {entry['file']}")
+            print(f"Exported {len(entries)} version(s) to {args.store}")
+        elif args.command == 'load':
+            manifest = read_manifest(args.store)
+            for version_id in args.version_id:
+                start = time.perf_counter()
+                df = load_version(version_id, args.store, args.cache_dir, manifest=manifest)
+                line = f"Version {version_id}: {len(df)} rows from snapshot in {(time.perf_counter() - start) * 1000:.1f} ms"
+                if args.compare:
+                    start = time.perf_counter()
+                    view_df = read_sql("SELECT * FROM vw_event_by_version WHERE version_id = %s AND is_active", (version_id,))
+                    line += f", {len(view_df)} rows from vw_event_by_version in {(time.perf_counter() - start) * 1000:.1f} ms"
+                print(line)
+        else:
+            for version_id, entry in sorted(read_manifest(args.store).items(), key=lambda item: int(item[0])):
+                print(f"Version {version_id} ({entry['version_code']}): {entry['rows']} rows, "
+                      f"{entry['bytes'] / 1024:.1f} KB, exported {entry['exported_at']} -> {entry['file']}")
+    finally:
+        print_metrics()
+
+
+if __name__ == "__main__":
+    main()